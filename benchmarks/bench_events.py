@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    Benchmark of the event readers on the test event files. See help usage for details:
+    >> python -m benchmarks.bench_events -h
+"""
+
+import pathlib
+import time
+from argparse import ArgumentParser
+
+from matsim import Events
+
+TESTS = pathlib.Path(__file__).parent.parent / "tests"
+
+FILES = ["output_events.xml.gz", "output_events.ndjson.gz", "output_events.pb.gz"]
+
+
+def _unfiltered(filepath, types):
+    """ Filter after the events have been fully parsed, as event_reader did before the pre-parse filter """
+    keep = Events._event_filter(types)
+    for event in Events._select_reader(filepath)(filepath):
+        if event["type"] in keep:
+            yield event
+
+
+def measure(func, repeat):
+    """ Return the best time of several runs, and the number of events returned """
+    best = float("inf")
+    n = 0
+    for _ in range(repeat):
+        t = time.perf_counter()
+        n = sum(1 for _ in func())
+        best = min(best, time.perf_counter() - t)
+
+    return best, n
+
+
+def bench_type_filter(files, types, repeat):
+    print("Type filter: %s" % types)
+    for f in files:
+        f = str(f)
+        base, n = measure(lambda: _unfiltered(f, types), repeat)
+        pre, m = measure(lambda: Events.event_reader(f, types=types), repeat)
+        assert n == m
+
+        print("  %-28s %6d events  post-filter %8.2f ms  pre-filter %8.2f ms  speedup %5.2fx" % (
+            pathlib.Path(f).name, n, base * 1000, pre * 1000, base / pre))
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark event readers")
+    parser.add_argument("files", nargs="*", default=[TESTS / f for f in FILES], help="Event files to read")
+    parser.add_argument("--types", default="actend,departure", help="Event types to keep")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs, the best is reported")
+
+    args = parser.parse_args()
+
+    bench_type_filter(args.files, args.types, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
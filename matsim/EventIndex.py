@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+import json
+import os
+import re
+from collections import defaultdict
+from html import unescape
+
+from .Events import _event_filter, _read_blocks, _parse_xml_event, _convert_pb_event, _EVENT_TAG, MAPPING
+from .pb.Events_pb2 import EventBatch
+from .utils import read_frames, open_file, events_format
+
+# Version of the index format, older indices are rebuilt
+INDEX_VERSION = 1
+
+# Suffix of the sidecar file, which is stored next to the events file
+INDEX_SUFFIX = '.index.json'
+
+# Default length of the time intervals between checkpoints in seconds
+DEFAULT_INTERVAL = 900
+
+_CHUNK_SIZE = 1 << 20
+
+_XML_EVENT = re.compile(rb'<event\s[^>]*>')
+_XML_TIME = re.compile(rb'\stime="([^"]*)"')
+_XML_TYPE = re.compile(rb'\stype="([^"]*)"')
+_JSON_TIME = re.compile(rb'"time"\s*:\s*"?([^",}\s]+)')
+_JSON_TYPE = re.compile(rb'"type"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+class EventIndex:
+    """ Sidecar index of an events file.
+
+        Checkpoints map the start of each time interval to the offset in the uncompressed file,
+        where the first event at or after this time is located. For protobuf files, the offset points to the
+        batch containing this event. Additionally, the number of events per type is stored.
+    """
+
+    def __init__(self, fmt, size, mtime, interval, checkpoints, counts, time_range, ordered):
+        self.format = fmt
+        self.size = size
+        self.mtime = mtime
+        self.interval = interval
+        self.checkpoints = checkpoints
+        self.counts = counts
+        self.time_range = time_range
+        self.ordered = ordered
+
+    def __str__(self):
+        return 'EventIndex: {n} events, {c} checkpoints, time {t}'.format(
+            n=sum(self.counts.values()), c=len(self.checkpoints), t=self.time_range)
+
+    def offset(self, time):
+        """ Offset from which to read all events at or after the given time. """
+        if not self.ordered or not self.checkpoints:
+            return 0
+
+        i = bisect.bisect_right([t for t, _ in self.checkpoints], time) - 1
+        return self.checkpoints[i][1] if i >= 0 else 0
+
+    def matches(self, filepath):
+        """ Whether this index still belongs to the given file. """
+        stat = os.stat(filepath)
+        return stat.st_size == self.size and int(stat.st_mtime) == self.mtime
+
+    def to_dict(self):
+        return {
+            'version': INDEX_VERSION, 'format': self.format, 'size': self.size, 'mtime': self.mtime,
+            'interval': self.interval, 'checkpoints': self.checkpoints, 'counts': self.counts,
+            'time_range': self.time_range, 'ordered': self.ordered
+        }
+
+    @staticmethod
+    def from_dict(d):
+        return EventIndex(d['format'], d['size'], d['mtime'], d['interval'], [tuple(c) for c in d['checkpoints']],
+                          d['counts'], tuple(d['time_range']) if d['time_range'] else None, d['ordered'])
+
+
+def event_index(filepath, interval=DEFAULT_INTERVAL, rebuild=False, write=False):
+    """ Load the sidecar index of an events file, or build it if it does not exist or is outdated.
+
+    :param filepath path to the events file
+    :param interval length of the time intervals between checkpoints in seconds, only used when building
+    :param rebuild always build a new index
+    :param write store a newly built index next to the events file, so that it can be reused.
+        Failures to write are ignored.
+    :rtype EventIndex
+    """
+    filepath = str(filepath)
+    path = filepath + INDEX_SUFFIX
+
+    if not rebuild and os.path.exists(path):
+        try:
+            with open(path) as f:
+                d = json.load(f)
+
+            if d.get('version') == INDEX_VERSION:
+                index = EventIndex.from_dict(d)
+                if index.matches(filepath):
+                    return index
+
+        except (OSError, ValueError, KeyError):
+            # unreadable indices are rebuilt
+            pass
+
+    index = build_index(filepath, interval)
+
+    if write:
+        try:
+            with open(path, 'w') as f:
+                json.dump(index.to_dict(), f)
+        except OSError:
+            pass
+
+    return index
+
+
+def build_index(filepath, interval=DEFAULT_INTERVAL, io_options=None):
+    """ Scan an events file and build its index, without storing it. """
+    filepath = str(filepath)
+    stat = os.stat(filepath)
+    fmt = events_format(filepath)
+
+    checkpoints = []
+    counts = defaultdict(int)
+    first = last = None
+    ordered = True
+    bucket = None
+
+    with open_file(filepath, io_options) as f:
+        for offset, time, ev_type in _SCANNERS[fmt](f):
+            counts[ev_type] += 1
+
+            if last is not None and time < last:
+                ordered = False
+
+            if first is None:
+                first = time
+            last = max(last, time) if last is not None else time
+
+            b = int(time // interval)
+            if bucket is None or b > bucket:
+                checkpoints.append((b * interval, offset))
+                bucket = b
+
+    return EventIndex(fmt, stat.st_size, int(stat.st_mtime), interval, checkpoints, dict(counts),
+                      (first, last) if first is not None else None, ordered)
+
+
+def event_window_reader(filepath, start=None, end=None, types=None, index=False, io_options=None):
+    """ Reads the events within [start, end) from an events file.
+        Events are assumed to be ordered by time, reading stops at the first event after the end.
+
+    :param filepath path to the file
+    :param start first time to include, default None starts at the beginning
+    :param end first time to exclude, default None reads until the end
+    :param types event types to return. Can be an iterable, or comma-separated string.
+    :param index use the sidecar index to seek directly to the start. If it does not exist, it is built and
+        written next to the events file.
+    :param io_options options of the decompression, see :func:`matsim.utils.open_file`
+    :returns generator of events
+    :rtype Iterable[dict]
+    """
+    keep = _event_filter(types)
+    filepath = str(filepath)
+    fmt = events_format(filepath)
+
+    offset = 0
+    if index and start is not None:
+        offset = event_index(filepath, write=True).offset(start)
+
+    if offset > 0 and _seekable(filepath):
+        # the background reader is a stream and can not seek
+        io_options = dict(io_options or {}, background=False)
+
+    with open_file(filepath, io_options) as f:
+        _skip(f, filepath, offset)
+
+        for event in _WINDOW_READERS[fmt](f, offset, keep):
+            # ndjson times are strings, as returned by the other readers
+            t = float(event['time'])
+            if start is not None and t < start:
+                continue
+            if end is not None and t >= end:
+                return
+
+            yield event
+
+
+def _seekable(filepath):
+    """ Uncompressed files can be positioned directly """
+    return filepath.endswith('.xml') or filepath.endswith('.ndjson') or filepath.endswith('.pb')
+
+
+def _skip(f, filepath, offset):
+    """ Move an opened file to the uncompressed offset. Compressed streams are decompressed up to this point,
+        which is still much faster than parsing the skipped events. """
+    if offset == 0:
+        return
+
+    if not _seekable(filepath):
+        while offset > 0:
+            data = f.read(min(offset, _CHUNK_SIZE))
+            if not data:
+                break
+            offset -= len(data)
+    else:
+        f.seek(offset)
+
+
+def _scan_xml(f):
+    pos = 0
+    for block in _read_blocks(f, _EVENT_TAG, _CHUNK_SIZE):
+        for m in _XML_EVENT.finditer(block):
+            elem = m.group(0)
+            ev_type = _XML_TYPE.search(elem).group(1).decode('utf-8')
+            yield pos + m.start(), float(_XML_TIME.search(elem).group(1)), unescape(ev_type)
+
+        pos += len(block)
+
+
+def _scan_ndjson(f):
+    pos = 0
+    for line in f:
+        m = _JSON_TYPE.search(line)
+        if m is not None:
+            yield pos, float(_JSON_TIME.search(line).group(1)), json.loads(b'"' + m.group(1) + b'"')
+
+        pos += len(line)
+
+
+def _scan_pb(f):
+    frames = read_frames(f, offsets=True)
+    # the file header
+    next(frames, None)
+
+    batch = EventBatch()
+    for offset, frame in frames:
+        batch.ParseFromString(frame)
+        for ev in batch.events:
+            case = ev.WhichOneof("type")
+            yield offset, ev.time, ev.generic.type if case == 'generic' else MAPPING.get(case, case)
+
+
+_SCANNERS = {'xml': _scan_xml, 'ndjson': _scan_ndjson, 'pb': _scan_pb}
+
+
+def _read_xml(f, offset, keep):
+    for block in _read_blocks(f, _EVENT_TAG, _CHUNK_SIZE):
+        for m in _XML_EVENT.finditer(block):
+            elem = m.group(0)
+            if keep and not unescape(_XML_TYPE.search(elem).group(1).decode('utf-8')) in keep:
+                continue
+
+            yield _parse_xml_event(elem)
+
+
+def _read_ndjson(f, offset, keep):
+    for line in f:
+        event = json.loads(line)
+        if keep and not event['type'] in keep:
+            continue
+
+        yield event
+
+
+def _read_pb(f, offset, keep):
+    frames = read_frames(f)
+    if offset == 0:
+        # skip the file header
+        next(frames, None)
+
+    for frame in frames:
+        batch = EventBatch()
+        batch.ParseFromString(frame)
+        for ev in batch.events:
+            event = _convert_pb_event(ev)
+            if keep and not event['type'] in keep:
+                continue
+
+            yield event
+
+
+_WINDOW_READERS = {'xml': _read_xml, 'ndjson': _read_ndjson, 'pb': _read_pb}
@@ -1,60 +1,369 @@
 # -*- coding: utf-8 -*-
 
-from pathlib import Path
 from collections.abc import Iterable
+from array import array
+from html import unescape
+from xml.sax.saxutils import escape
 import xml.etree.ElementTree as ET
 import json
+import re
 
-from xopen import xopen
+import numpy as np
+import pandas as pd
+from matsim.utils import read_pb, open_file, events_format, bounded_map
 
-from .pb.Ids_pb2 import ProtoId
-from .pb.Model_pb2 import Coordinate
 
-from matsim.utils import read_pb
-
-
-def event_reader(filepath, types=None):
+def event_reader(filepath, types=None, workers=None, start=None, end=None, index=False, area=None, network=None,
+                 io_options=None):
     """ Reads an events file in any of the supported formats (xml, json, pb) and yields each contained event.
         Each event will be generated as a dictionary of attribute key/value pairs.
 
     :param filepath path to the file
     :param types event types to return. Can be an iterable, or comma-separated string. Default None returns all events.
+    :param workers number of processes parsing xml files in parallel. Events are still returned in file order.
+        Default None parses in the calling process. Has no effect on other formats or when reading a time window.
+    :param start only return events at or after this time (in seconds)
+    :param end only return events before this time (in seconds). Reading stops at the first later event.
+    :param index when start is given, use a sidecar index to seek directly to the start. If it does not exist,
+        it is built and written next to the events file. See :mod:`matsim.EventIndex`.
+    :param area only return events on links inside this area, events without a link are always returned.
+        Bounding box (minx, miny, maxx, maxy), polygon vertices or shapely geometry, see
+        :meth:`matsim.Network.Network.links_in_area`. Can also be a set of link ids, then no network is needed.
+    :param network :class:`matsim.Network.Network` providing the node coordinates for the area
+    :param io_options options of the decompression, see :func:`matsim.utils.open_file`
     :returns generator of events from the specified file
     :rtype Iterable[dict]
     """
+    links = _area_links(area, network)
+
+    if start is not None or end is not None:
+        from .EventIndex import event_window_reader
+        yield from _link_filter(event_window_reader(filepath, start, end, types, index, io_options), links)
+        return
+
     # set up event filter - so that we only yield useful events
+    keep = _event_filter(types)
+
+    filepath = str(filepath)
+    reader = _select_reader(filepath)
+
+    if workers and workers > 1 and reader == _event_reader_xml:
+        yield from _link_filter(_event_reader_xml_parallel(filepath, keep, workers, io_options=io_options), links)
+        return
+
+    if links is not None and reader == _event_reader_xml:
+        # links are checked on the raw attribute, before events are parsed
+        yield from _event_reader_xml_filtered(filepath, keep, links, io_options)
+        return
+
+    # the readers skip events we don't care about, if possible before parsing them
+    yield from _link_filter(reader(filepath, keep, io_options), links)
+
+
+def _area_links(area, network):
+    """ Set of link ids inside the area, or None if there is no area """
+    if area is None:
+        return None
+    elif isinstance(area, (set, frozenset)):
+        return area
+    elif network is None:
+        raise ValueError("Filtering by area requires a network")
+
+    return network.links_in_area(area)
+
+
+def _link_filter(events, links):
+    """ Filter events on links outside the set of links, events without a link are kept """
+    if links is None:
+        return events
+
+    return (e for e in events if e.get('link') is None or e['link'] in links)
+
+
+def _event_filter(types):
+    """ Normalize the types argument of the readers into a set of event types, or None if all are accepted. """
     if types is None:
-        keep = None
+        return None
     elif isinstance(types, str):
-        keep = set(string.strip() for string in types.split(','))
+        return set(string.strip() for string in types.split(','))
     elif isinstance(types, Iterable):
-        keep = set(types)
+        return set(types)
     else:
         raise ValueError("Invalid argument for types: %s" % type(types))
 
-    if isinstance(filepath, Path):
-        filepath = str(filepath)
 
-    if '.xml' in filepath:
-        reader = _event_reader_xml
-    elif '.pb' in filepath:
-        reader = _event_reader_pb
-    elif '.ndjson' in filepath:
-        reader = _event_reader_json
+def _select_reader(filepath):
+    return {'xml': _event_reader_xml, 'pb': _event_reader_pb, 'ndjson': _event_reader_json}[events_format(filepath)]
+
+
+# Columns contained in every batch, unless others are requested
+DEFAULT_COLUMNS = ('time', 'type', 'link', 'person', 'vehicle')
+
+
+class Dictionary:
+    """ Append-only mapping between string values and dense integer codes.
+        Codes never change once assigned, so they are valid across all batches of one reader. """
+
+    __slots__ = ('values', 'index', '_array', '_filled', '_categories')
+
+    def __init__(self):
+        self.values = []
+        self.index = {}
+        # object array of the values, followed by at least one None for the missing value code -1
+        self._array = np.full(1, None, dtype=object)
+        self._filled = 0
+        self._categories = None
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, value):
+        """ Return the code of value, assigning a new one if needed. None is encoded as -1. """
+        code = self.index.get(value)
+        if code is None:
+            if value is None:
+                return -1
+            code = len(self.values)
+            self.index[value] = code
+            self.values.append(value)
+        return code
+
+    def decode(self, codes):
+        """ Map an array of codes back to their values, missing values become None. """
+        return self._decoded()[codes]
+
+    def categories(self):
+        """ Index of all current values, which is reused until new values are added """
+        if self._categories is None or len(self._categories) != len(self.values):
+            self._categories = pd.Index(self._decoded()[:len(self.values)], dtype=object, copy=False)
+        return self._categories
+
+    def _decoded(self):
+        """ The values as object array. It grows with the dictionary, so that each value is only copied once. """
+        n = len(self.values)
+        if n >= len(self._array):
+            array = np.full(max(n + 1, 2 * len(self._array)), None, dtype=object)
+            array[:self._filled] = self._array[:self._filled]
+            self._array = array
+
+        if n > self._filled:
+            self._array[self._filled:n] = self.values[self._filled:n]
+            self._filled = n
+
+        return self._array
+
+
+class EventColumns:
+    """ A batch of events in columnar form.
+
+        Time is stored as float64 array, all other columns as int32 codes into a :class:`Dictionary`
+        that is shared by all batches of one reader. A code of -1 marks an attribute the event does not have.
+    """
+
+    __slots__ = ('time', 'codes', 'dictionaries')
+
+    def __init__(self, time, codes, dictionaries):
+        self.time = time
+        self.codes = codes
+        self.dictionaries = dictionaries
+
+    def __len__(self):
+        return len(self.time)
+
+    def __getitem__(self, column):
+        if column == 'time':
+            return self.time
+        return self.codes[column]
+
+    @property
+    def columns(self):
+        return ['time'] + list(self.codes)
+
+    def values(self, column):
+        """ Decoded values of a column as numpy object array. """
+        if column == 'time':
+            return self.time
+        return self.dictionaries[column].decode(self.codes[column])
+
+    def to_pandas(self):
+        """ Convert to a DataFrame with categorical columns. The categories are the values of the dictionary at the time
+            of conversion, batches converted without new values in between share them. """
+        data = {'time': self.time}
+        for column, codes in self.codes.items():
+            data[column] = pd.Categorical.from_codes(codes, categories=self.dictionaries[column].categories())
+        return pd.DataFrame(data)
+
+    def to_arrow(self):
+        """ Convert to a pyarrow RecordBatch with dictionary encoded columns. Requires pyarrow. """
+        import pyarrow as pa
+
+        arrays = [pa.array(self.time, type=pa.float64())]
+        for column, codes in self.codes.items():
+            indices = pa.array(codes, mask=codes < 0, type=pa.int32())
+            arrays.append(pa.DictionaryArray.from_arrays(indices, pa.array(self.dictionaries[column].values,
+                                                                           type=pa.string())))
+
+        return pa.RecordBatch.from_arrays(arrays, names=self.columns)
+
+
+def event_reader_batches(filepath, types=None, columns=None, batch_size=65536, io_options=None):
+    """ Reads an events file in any of the supported formats (xml, json, pb) and yields the events in columnar batches.
+
+    :param filepath path to the file
+    :param types event types to return. Can be an iterable, or comma-separated string. Default None returns all events.
+    :param columns event attributes to include. 'time' and 'type' are always included. Default :data:`DEFAULT_COLUMNS`.
+    :param batch_size maximum number of events per batch
+    :param io_options options of the decompression, see :func:`matsim.utils.open_file`
+    :returns generator of batches from the specified file
+    :rtype Iterable[EventColumns]
+    """
+    keep = _event_filter(types)
+    builder = BatchBuilder(columns, batch_size)
+    columns = builder.columns
+
+    filepath = str(filepath)
+    if events_format(filepath) == 'pb':
+        rows = _pb_rows(filepath, keep, columns, io_options)
     else:
-        raise ValueError('Format of %s unknown or not supported' % filepath)
+        rows = _dict_rows(_select_reader(filepath)(filepath, keep, io_options), keep, columns)
+
+    for t, values in rows:
+        batch = builder.append(t, values)
+        if batch is not None:
+            yield batch
+
+    batch = builder.flush()
+    if batch is not None:
+        yield batch
+
+
+class BatchBuilder:
+    """ Collects events row by row and creates :class:`EventColumns` batches of them. """
+
+    def __init__(self, columns=None, batch_size=65536):
+        if columns is None:
+            columns = DEFAULT_COLUMNS
+        elif isinstance(columns, str):
+            columns = [string.strip() for string in columns.split(',')]
+
+        self.columns = ['type'] + [c for c in dict.fromkeys(columns) if c not in ('time', 'type')]
+        self.dictionaries = {c: Dictionary() for c in self.columns}
+        self.batch_size = batch_size
+        self._encoders = [self.dictionaries[c].encode for c in self.columns]
+        self._reset()
+
+    def _reset(self):
+        self._time = array('d')
+        self._codes = [array('i') for _ in self.columns]
 
-    for event in reader(filepath):
-        # skip events we don't care about
+    def append(self, time, values):
+        """ Add one event, values are given in the order of the columns.
+            Returns a full batch or None if the batch size has not been reached yet. """
+        self._time.append(time)
+        for encode, target, v in zip(self._encoders, self._codes, values):
+            target.append(encode(v))
+
+        if len(self._time) >= self.batch_size:
+            return self.flush()
+
+        return None
+
+    def append_event(self, event):
+        """ Add one event dictionary """
+        return self.append(float(event['time']), [event.get(c) for c in self.columns])
+
+    def flush(self):
+        """ Return a batch of all collected events, or None if there are none. """
+        if not self._time:
+            return None
+
+        batch = EventColumns(np.frombuffer(self._time, dtype=np.float64),
+                             {c: np.frombuffer(a, dtype=np.int32) for c, a in zip(self.columns, self._codes)},
+                             self.dictionaries)
+        self._reset()
+        return batch
+
+
+def _dict_rows(events, keep, columns):
+    """ Turn event dictionaries into (time, values) rows """
+    for event in events:
         if keep and not event['type'] in keep:
             continue
 
-        yield event
+        yield float(event['time']), [event.get(c) for c in columns]
+
 
+def _pb_rows(filepath, keep, columns, io_options=None):
+    """ Extract (time, values) rows directly from protobuf events, without creating dictionaries """
+    getters = {}
+    for event in read_pb(filepath, io_options=io_options):
+        case = event.WhichOneof("type")
+        g = getters.get(case)
+        if g is None:
+            g = getters[case] = _pb_getters(case, columns)
 
-def _event_reader_xml(filepath):
+        ev_type, fields = g
+        if case == 'generic':
+            generic = event.generic
+            ev_type = generic.type
+            if keep and not ev_type in keep:
+                continue
+            yield event.time, [ev_type] + [generic.attrs.get(c) for c in columns[1:]]
+            continue
+
+        if keep and not ev_type in keep:
+            continue
+
+        values = [ev_type]
+        for f in fields:
+            values.append(f(event) if f else None)
+
+        yield event.time, values
+
+
+def _pb_getters(case, columns):
+    """ Create the type name and a list of accessors for the requested columns of one oneof case """
+    ev_type = MAPPING.get(case, case)
+    attrs = PB_ATTRIBUTES.get(case, {})
+
+    fields = []
+    for c in columns[1:]:
+        if c in ('x', 'y'):
+            fields.append(_pb_coord_getter(c))
+        elif c in attrs:
+            fields.append(_pb_getter(case, attrs[c]))
+        else:
+            fields.append(None)
+
+    return ev_type, fields
+
+
+def _pb_getter(case, field):
+    is_id = field.endswith('Id')
+
+    def get(event):
+        v = getattr(getattr(event, case), field)
+        if is_id:
+            return v.id or None
+        return str(v)
+
+    return get
+
+
+def _pb_coord_getter(c):
+    def get(event):
+        return str(getattr(event.coords, c)) if event.HasField('coords') else None
+
+    return get
+
+
+def _event_reader_xml(filepath, keep=None, io_options=None):
     """ Any content text of the XML element itself is dropped, as MATSim events are attribute-only. """
-    with xopen(filepath) as f:
+    if keep:
+        yield from _event_reader_xml_filtered(filepath, keep, io_options=io_options)
+        return
+
+    with open_file(filepath, io_options) as f:
         tree = ET.iterparse(f, events=['start', 'end'])
         _, root = next(tree)
         try:
@@ -77,41 +386,409 @@ def _event_reader_xml(filepath):
             print('*** XML ERROR:', e)
 
 
-def _event_reader_pb(filepath, convert=True):
-    for event in read_pb(filepath):
-        # the conversion nullifies protobufs performance advantage
+_XML_ATTR = re.compile(rb'([^\s=<>]+)\s*=\s*"([^"]*)"')
+_XML_LINK = re.compile(rb'\slink="([^"]*)"')
+
+# Size of the blocks the pre-parse filters are applied on
+FILTER_CHUNK_SIZE = 1 << 20
+
+
+def _event_reader_xml_filtered(filepath, keep, links=None, io_options=None):
+    """ Matches the raw type attribute on whole blocks of the file before parsing.
+        Events of other types are skipped by the regex engine, without creating any element or dictionary.
+        This relies on '>' being escaped in attribute values, as MATSim does.
+
+        If links are given, the raw link attribute of the matching events is checked before they are parsed.
+    """
+    if keep:
+        # types are compared in their escaped form, as they appear in the file
+        raw_keep = b'|'.join(re.escape(escape(t, {'"': '&quot;'}).encode('utf-8')) for t in keep)
+        # a pattern starting with a literal is much faster to search, the event bounds are determined afterwards
+        pattern = re.compile(rb'type="(?:' + raw_keep + rb')"')
+    else:
+        pattern = re.compile(rb'type="')
+
+    raw_links = None
+    if links is not None:
+        raw_links = set(escape(str(link), {'"': '&quot;'}).encode('utf-8') for link in links)
+
+    with open_file(filepath, io_options) as f:
+        for block in _read_blocks(f, _EVENT_TAG, FILTER_CHUNK_SIZE):
+            for m in pattern.finditer(block):
+                start = m.start()
+                # must be the type attribute, and not e.g. subtype
+                if not block[start - 1:start].isspace():
+                    continue
+
+                begin = block.rfind(b'<', 0, start)
+                if not block.startswith(_EVENT_TAG, begin):
+                    continue
+
+                elem = block[begin:block.find(b'>', m.end()) + 1]
+                if raw_links is not None:
+                    link = _XML_LINK.search(elem)
+                    if link is not None and link.group(1) not in raw_links:
+                        continue
+
+                yield _parse_xml_event(elem)
+
+
+def _read_blocks(f, sep, chunk_size):
+    """ Read blocks of roughly chunk_size, which are split right before the last occurrence of sep """
+    rest = b''
+    while 1:
+        data = f.read(chunk_size)
+        if not data:
+            break
+
+        data = rest + data if rest else data
+        cut = data.rfind(sep)
+        if cut <= 0:
+            rest = data
+            continue
+
+        yield data[:cut]
+        rest = data[cut:]
+
+    if rest:
+        yield rest
+
+
+def _parse_xml_event(elem):
+    """ Parse the attributes of a single event element """
+    attributes = {}
+    for k, v in _XML_ATTR.findall(elem, len(_EVENT_TAG)):
+        v = v.decode('utf-8')
+        attributes[k.decode('utf-8')] = unescape(v) if '&' in v else v
+
+    attributes['time'] = float(attributes['time'])
+    return attributes
+
+
+# Size of the byte ranges parsed by one worker
+PARALLEL_CHUNK_SIZE = 1 << 24
+
+_EVENT_TAG = b'<event '
+
+
+def event_partitions(filepath, func, types=None, workers=None, chunk_size=PARALLEL_CHUNK_SIZE):
+    """ Parses an xml events file in parallel and applies func to each partition of the events.
+        The results are yielded in the order the partitions finish, which is not the file order.
+        Use this for commutative aggregations, e.g. counting, where the order of the events does not matter.
+
+    :param filepath path to the xml file
+    :param func function receiving a list of event dictionaries. Needs to be picklable, i.e. defined at module level.
+    :param types event types to pass to func. Can be an iterable, or comma-separated string.
+    :param workers number of processes, default is the number of cpus
+    :param chunk_size approximate number of uncompressed bytes per partition
+    :returns generator of the results of func
+    """
+    import os
+    from concurrent.futures import ProcessPoolExecutor
+
+    keep = _event_filter(types)
+    filepath = str(filepath)
+    workers = workers or os.cpu_count()
+
+    if events_format(filepath) != 'xml':
+        raise ValueError('Only xml events files can be partitioned: %s' % filepath)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        tasks = ((None, (func, chunk, keep)) for chunk in _xml_chunks(filepath, chunk_size))
+        for _, result in bounded_map(pool, _apply_xml_chunk, tasks, workers):
+            yield result
+
+
+def _event_reader_xml_parallel(filepath, keep, workers, chunk_size=PARALLEL_CHUNK_SIZE, io_options=None):
+    """ Parses xml chunks in a process pool and yields the events in file order """
+    from concurrent.futures import ProcessPoolExecutor
+    from collections import deque
+
+    pool = ProcessPoolExecutor(max_workers=workers)
+    pending = deque()
+    try:
+        for chunk in _xml_chunks(filepath, chunk_size, io_options):
+            pending.append(pool.submit(_parse_xml_chunk, chunk, keep))
+
+            # limit the number of chunks in flight to bound memory usage
+            while len(pending) > 2 * workers:
+                yield from pending.popleft().result()
+
+        while pending:
+            yield from pending.popleft().result()
+
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _xml_chunks(filepath, chunk_size, io_options=None):
+    """ Split an xml events file at event boundaries.
+        Uncompressed files are split into (path, start, end) byte ranges that are read by the workers,
+        compressed files are decompressed here and the chunks are passed as bytes. """
+    if filepath.endswith('.xml'):
+        yield from _xml_ranges(filepath, chunk_size)
+        return
+
+    with open_file(filepath, io_options) as f:
+        yield from _read_blocks(f, _EVENT_TAG, chunk_size)
+
+
+def _xml_ranges(filepath, chunk_size):
+    import os
+
+    size = os.path.getsize(filepath)
+    start = 0
+    with open(filepath, 'rb') as f:
+        while start < size:
+            end = _next_event_offset(f, start + chunk_size, size)
+            yield filepath, start, end
+            start = end
+
+
+def _next_event_offset(f, pos, size):
+    """ Find the first event tag at or after pos """
+    window = 1 << 16
+    while pos < size:
+        f.seek(pos)
+        # overlap the windows so that tags across the border are found
+        data = f.read(window + len(_EVENT_TAG))
+        i = data.find(_EVENT_TAG)
+        if i >= 0:
+            return pos + i
+        pos += window
+
+    return size
+
+
+def _parse_xml_chunk(chunk, keep):
+    """ Parse one chunk of events, which is either bytes or a byte range of a file """
+    if isinstance(chunk, tuple):
+        path, start, end = chunk
+        with open(path, 'rb') as f:
+            f.seek(start)
+            chunk = f.read(end - start)
+
+    # Strip xml declaration, root element and closing tag
+    begin = chunk.find(_EVENT_TAG)
+    if begin < 0:
+        return []
+
+    end = chunk.rfind(b'</events>')
+    if end < begin:
+        end = len(chunk)
+
+    root = ET.fromstring(b'<events>' + chunk[begin:end] + b'</events>')
+    result = []
+    for elem in root.iter('event'):
+        attributes = elem.attrib
+        if keep and not attributes['type'] in keep:
+            continue
+
+        attributes['time'] = float(attributes['time'])
+        result.append(attributes)
+
+    return result
+
+
+def _apply_xml_chunk(func, chunk, keep):
+    return func(_parse_xml_chunk(chunk, keep))
+
+
+def _event_reader_pb(filepath, keep=None, io_options=None, convert=True):
+    cases = None
+    if keep:
+        # oneof cases that can match, generic events need to be checked individually
+        cases = {k for k, v in MAPPING.items() if v in keep} | {'generic'}
+
+    for event in read_pb(filepath, io_options=io_options):
+        if cases is not None:
+            case = event.WhichOneof("type")
+            if case not in cases or (case == 'generic' and not event.generic.type in keep):
+                continue
+
+        # the conversion is precompiled per event type, but still costs a dict per event.
+        # use pb_event_dispatch to work on the protobuf messages directly
         if convert:
             yield _convert_pb_event(event)
         else:
             yield event
 
+
+def pb_event_dispatch(filepath, handlers, raw=True, io_options=None):
+    """ Reads a protobuf events file and dispatches each event to the handler registered for its type.
+        Events without a handler are skipped without being converted or accessed.
+
+    :param filepath path to the .pb file
+    :param handlers mapping of event type to handler. Keys are either the protobuf oneof case (e.g. 'linkEnter')
+        or the MATSim event type (e.g. 'entered link'). Each handler is called with (time, event).
+    :param raw if true, handlers receive the protobuf submessage of the event (e.g. a LinkEnterEvent),
+        otherwise the converted event dictionary as returned by :func:`event_reader`.
+    :param io_options options of the decompression, see :func:`matsim.utils.open_file`
+    :returns number of dispatched events
+    """
+    cases = {v: k for k, v in MAPPING.items()}
+    dispatch = {cases.get(k, k): h for k, h in handlers.items()}
+
+    unknown = set(dispatch) - set(PB_CASES)
+    if unknown:
+        raise ValueError("Unknown event types: %s" % unknown)
+
+    n = 0
+    for event in read_pb(filepath, io_options=io_options):
+        case = event.WhichOneof("type")
+        handler = dispatch.get(case)
+        if handler is None:
+            continue
+
+        if raw:
+            handler(event.time, getattr(event, case))
+        else:
+            handler(event.time, _convert_pb_event(event))
+
+        n += 1
+
+    return n
+
+
 # Mapping of protobuf types to names
 MAPPING = {'activityEnd': 'actend', 'personDeparture': 'departure', 'personEntersVehicle': 'PersonEntersVehicle',
            'vehicleEntersTraffic': 'vehicle enters traffic', 'linkLeave': 'left link', 'linkEnter': 'entered link',
            'vehicleLeavesTraffic': 'vehicle leaves traffic', 'personLeavesVehicle': 'PersonLeavesVehicle',
-           'personalArrival': 'arrival', 'activityStart': 'actstart'}
+           'personalArrival': 'arrival', 'activityStart': 'actstart', 'personMoney': 'personMoney',
+           'personStuck': 'stuck', 'transitDriverStarts': 'TransitDriverStarts', 'vehicleAborts': 'vehicle aborts'}
+
+# Mapping of MATSim event types to the protobuf oneof cases
+PB_TYPES = {v: k for k, v in MAPPING.items()}
+
+# Mapping of MATSim event attribute names to the protobuf fields of each event type
+PB_ATTRIBUTES = {
+    'activityEnd': {'link': 'linkId', 'facility': 'facilityId', 'person': 'personId', 'actType': 'acttype'},
+    'activityStart': {'link': 'linkId', 'facility': 'facilityId', 'person': 'personId', 'actType': 'acttype'},
+    'linkEnter': {'link': 'linkId', 'vehicle': 'vehicleId'},
+    'linkLeave': {'link': 'linkId', 'vehicle': 'vehicleId'},
+    'personalArrival': {'link': 'linkId', 'legMode': 'legMode', 'person': 'personId'},
+    'personDeparture': {'link': 'linkId', 'legMode': 'legMode', 'person': 'personId'},
+    'personEntersVehicle': {'person': 'personId', 'vehicle': 'vehicleId'},
+    'personLeavesVehicle': {'person': 'personId', 'vehicle': 'vehicleId'},
+    'personMoney': {'person': 'personId', 'amount': 'amount', 'purpose': 'purpose',
+                    'transactionPartner': 'transactionPartner'},
+    'personStuck': {'person': 'personId', 'link': 'linkId', 'legMode': 'legMode'},
+    'transitDriverStarts': {'driverId': 'driverId', 'vehicleId': 'vehicleId', 'transitRouteId': 'transitRouteId',
+                            'transitLineId': 'transitLineId', 'departureId': 'departureId'},
+    'vehicleAborts': {'vehicle': 'vehicleId', 'link': 'linkId'},
+    'vehicleEntersTraffic': {'person': 'driverId', 'link': 'linkId', 'vehicle': 'vehicleId',
+                             'networkMode': 'networkMode', 'relativePosition': 'relativePositionOnLink'},
+    'vehicleLeavesTraffic': {'person': 'driverId', 'link': 'linkId', 'vehicle': 'vehicleId',
+                             'networkMode': 'networkMode', 'relativePosition': 'relativePositionOnLink'},
+}
 
 
 def _convert_pb_event(event):
-    entry = {}
-    ev_type = event.WhichOneof("type")
-    entry["type"] = MAPPING.get(ev_type, ev_type)
-    for (desc, v) in event.ListFields():
-        if ev_type == desc.name:
-            for (attr, evValue) in v.ListFields():
-                if type(evValue) == ProtoId:
-                    entry[attr.name] = evValue.id
-
-        elif type(v) == Coordinate:
-            entry["x"] = v.x
-            entry["y"] = v.y
+    """ Convert a protobuf event into a dictionary with the same keys as MATSim xml events. """
+    case = event.WhichOneof("type")
+    converter = _PB_CONVERTERS.get(case)
+    if converter is None:
+        converter = _PB_CONVERTERS[case] = _compile_pb_converter(case)
+
+    return converter(event)
+
+
+def _compile_pb_converter(case):
+    """ Create a function converting protobuf events of one oneof case into dictionaries """
+    if case == 'generic':
+        def convert(event):
+            entry = dict(event.generic.attrs)
+            entry['time'] = event.time
+            entry['type'] = event.generic.type
+            if event.HasField('coords'):
+                entry['x'] = event.coords.x
+                entry['y'] = event.coords.y
+            return entry
+
+        return convert
+
+    ev_type = MAPPING.get(case, case)
+    ids = []
+    scalars = []
+    for attr, field in PB_ATTRIBUTES.get(case, {}).items():
+        if field.endswith('Id'):
+            ids.append((attr, field))
         else:
-            entry[desc.name] = v
+            scalars.append((attr, field))
+
+    def convert(event):
+        v = getattr(event, case)
+        entry = {'time': event.time, 'type': ev_type}
+        for attr, field in ids:
+            # empty ids are not set in the original event
+            pid = getattr(v, field).id
+            if pid:
+                entry[attr] = pid
+
+        for attr, field in scalars:
+            entry[attr] = getattr(v, field)
+
+        if event.HasField('coords'):
+            entry['x'] = event.coords.x
+            entry['y'] = event.coords.y
+
+        return entry
+
+    return convert
+
+
+# All oneof cases of the protobuf events
+PB_CASES = ['generic'] + list(PB_ATTRIBUTES)
+
+# Cache of compiled converters
+_PB_CONVERTERS = {}
+
+
+def _event_reader_json(filepath, keep=None, io_options=None):
+    """ Decodes whole blocks of lines with one call of the JSON decoder, see :func:`_json_decoder` """
+    if keep:
+        yield from _event_reader_json_filtered(filepath, keep, io_options)
+        return
+
+    loads = _json_decoder()
+    with open_file(filepath, io_options) as f:
+        for block in _read_blocks(f, b'\n', FILTER_CHUNK_SIZE):
+            yield from _decode_lines(loads, block.strip().split(b'\n'))
+
+
+def _event_reader_json_filtered(filepath, keep, io_options=None):
+    """ Matches the raw type field on whole blocks of lines, only the matching lines are decoded """
+    raw_keep = set(json.dumps(t, ensure_ascii=a)[1:-1].encode('utf-8') for t in keep for a in (True, False))
+    pattern = re.compile(rb'"type"\s*:\s*"(?:' + b'|'.join(re.escape(t) for t in raw_keep) + rb')"')
+
+    loads = _json_decoder()
+    with open_file(filepath, io_options) as f:
+        for block in _read_blocks(f, b'\n', FILTER_CHUNK_SIZE):
+            lines = []
+            for m in pattern.finditer(block):
+                start = block.rfind(b'\n', 0, m.start()) + 1
+                end = block.find(b'\n', m.end())
+                lines.append(block[start:end if end >= 0 else len(block)])
+
+            yield from _decode_lines(loads, lines)
+
+
+def _json_decoder():
+    """ Use orjson if it is installed, which decodes several times faster than the json module """
+    try:
+        import orjson
+        return orjson.loads
+    except ImportError:
+        return json.loads
 
-    return entry
 
+def _decode_lines(loads, lines):
+    """ Decode a list of JSON lines as one array. If this fails, e.g. because of empty lines,
+        the lines are decoded one by one, so that errors point to the offending line. """
+    if not lines:
+        return []
 
-def _event_reader_json(filepath):
-    with xopen(filepath) as f:
-        for line in f:
-            yield json.loads(line)
+    try:
+        return loads(b'[' + b','.join(lines) + b']')
+    except ValueError:
+        return [loads(line) for line in lines if line.strip()]
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+from collections import defaultdict
+
+from .Events import event_reader, event_reader_batches, BatchBuilder, _event_filter
+
+
+class EventsManager:
+    """ Reads an events file once and passes the events to any number of registered handlers.
+
+        Handlers can be registered in the following forms:
+
+        - objects with a ``handlers`` dictionary mapping event types to functions ``f(time, event)``,
+          as :class:`matsim.TripEventHandler.TripEventHandler` does
+        - objects with a ``handle_event(event)`` method, and an optional ``types`` attribute
+        - functions ``f(event)``, together with the types they are interested in
+
+        Batched handlers receive :class:`matsim.Events.EventColumns` instead of single events,
+        see :meth:`add_batch_handler`.
+    """
+
+    def __init__(self):
+        # event type -> list of functions called with (time, event)
+        self.dispatch = defaultdict(list)
+        # functions called with (time, event) for all events
+        self.catch_all = []
+        # (handler function, types, columns)
+        self.batch_handlers = []
+        self._handlers = []
+
+    def add_handler(self, handler, types=None):
+        """ Register a handler for single events.
+
+        :param handler handler object or function, see class documentation
+        :param types event types the handler is called for. Can be an iterable, or comma-separated string.
+            Default None uses the types of the handler, or all events if it does not declare any.
+        """
+        self._handlers.append(handler)
+
+        if hasattr(handler, 'handlers') and isinstance(handler.handlers, dict):
+            keep = _event_filter(types)
+            for t, f in handler.handlers.items():
+                if keep is None or t in keep:
+                    self.dispatch[t].append(f)
+            return self
+
+        if hasattr(handler, 'handle_event'):
+            func = handler.handle_event
+            if types is None:
+                types = getattr(handler, 'types', None)
+        elif callable(handler):
+            func = handler
+        else:
+            raise ValueError("Invalid handler: %s" % handler)
+
+        keep = _event_filter(types)
+        f = _drop_time(func)
+        if keep is None:
+            self.catch_all.append(f)
+        else:
+            for t in keep:
+                self.dispatch[t].append(f)
+
+        return self
+
+    def add_batch_handler(self, handler, types=None, columns=None):
+        """ Register a handler receiving columnar batches of events.
+
+        :param handler object with a ``handle_batch(batch)`` method or function ``f(batch)``
+        :param types event types contained in the batches. Default None uses the ``types`` attribute
+            of the handler, or all events.
+        :param columns event attributes contained in the batches. Default None uses the ``columns`` attribute
+            of the handler, or :data:`matsim.Events.DEFAULT_COLUMNS`.
+        """
+        self._handlers.append(handler)
+
+        func = handler.handle_batch if hasattr(handler, 'handle_batch') else handler
+        if not callable(func):
+            raise ValueError("Invalid batch handler: %s" % handler)
+
+        if types is None:
+            types = getattr(handler, 'types', None)
+        if columns is None:
+            columns = getattr(handler, 'columns', None)
+
+        self.batch_handlers.append((func, _event_filter(types), columns))
+        return self
+
+    def types(self):
+        """ Event types required by all handlers, or None if all events are needed. """
+        if self.catch_all:
+            return None
+
+        types = set(self.dispatch)
+        for _, keep, _ in self.batch_handlers:
+            if keep is None:
+                return None
+            types |= keep
+
+        return types
+
+    def run(self, filepath, batch_size=65536, **kwargs):
+        """ Read the events file and pass all events to the handlers. Afterwards, ``finish()`` is called on
+            all handlers that provide it.
+
+        :param filepath path to the events file
+        :param batch_size number of events per batch for the batch handlers
+        :param kwargs further arguments passed to :func:`matsim.Events.event_reader`, e.g. start, end or io_options
+        :returns number of events read
+        """
+        types = self.types()
+        io_options = kwargs.pop('io_options', None)
+
+        if not self.dispatch and not self.catch_all and len(self.batch_handlers) == 1 and not kwargs:
+            # only one batched consumer, which can use the columnar reader directly
+            n = self._run_batches(filepath, types, batch_size, io_options)
+        else:
+            n = self._run_events(filepath, types, batch_size, dict(kwargs, io_options=io_options))
+
+        for handler in self._handlers:
+            if hasattr(handler, 'finish'):
+                handler.finish()
+
+        return n
+
+    def _run_batches(self, filepath, types, batch_size, io_options):
+        func, _, columns = self.batch_handlers[0]
+        n = 0
+        for batch in event_reader_batches(filepath, types=types, columns=columns, batch_size=batch_size,
+                                          io_options=io_options):
+            func(batch)
+            n += len(batch)
+
+        return n
+
+    def _run_events(self, filepath, types, batch_size, kwargs):
+        dispatch = dict(self.dispatch)
+        catch_all = self.catch_all
+        builders = [(func, keep, BatchBuilder(columns, batch_size)) for func, keep, columns in self.batch_handlers]
+
+        n = 0
+        for event in event_reader(filepath, types=types, **kwargs):
+            n += 1
+            ev_type = event['type']
+            # ndjson events carry the time as string
+            time = float(event['time'])
+
+            for f in dispatch.get(ev_type, ()):
+                f(time, event)
+
+            for f in catch_all:
+                f(time, event)
+
+            for func, keep, builder in builders:
+                if keep is None or ev_type in keep:
+                    batch = builder.append_event(event)
+                    if batch is not None:
+                        func(batch)
+
+        for func, _, builder in builders:
+            batch = builder.flush()
+            if batch is not None:
+                func(batch)
+
+        return n
+
+
+def _drop_time(func):
+    def call(time, event):
+        func(event)
+
+    return call
@@ -1,4 +1,3 @@
-import xopen
 import xml.etree.ElementTree as ET
 import pandas as pd
 from matsim import utils
@@ -8,25 +7,25 @@ class Facility:
         self.facilities = facilities
 
 # Returns facilities as a dataframe
-def facility_reader(filename, convert_dataframes_types=True):
-    tree = ET.iterparse(xopen.xopen(filename, 'r'), events=['start','end'])
-    
+def facility_reader(filename, convert_dataframes_types=True, io_options=None):
     facilities = []
     current_facility = {}
     
-    for xml_event, elem in tree:
-        # FACILITY
-        if elem.tag == 'facility':
-            if xml_event == 'start':
-                utils.parse_attributes(elem, current_facility)
-            else:
-                facilities.append(current_facility)
-                current_facility = {}
-                elem.clear()
+    with utils.open_file(filename, io_options) as f:
+        tree = ET.iterparse(f, events=['start','end'])
+        for xml_event, elem in tree:
+            # FACILITY
+            if elem.tag == 'facility':
+                if xml_event == 'start':
+                    utils.parse_attributes(elem, current_facility)
+                else:
+                    facilities.append(current_facility)
+                    current_facility = {}
+                    elem.clear()
 
-        # EVERYTHING ELSE
-        else:
-            utils.parse_attributes(elem, current_facility)
+            # EVERYTHING ELSE
+            else:
+                utils.parse_attributes(elem, current_facility)
             
     # Convert to dataframe and converts columns types
     facilities = pd.DataFrame.from_records(facilities)
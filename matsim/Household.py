@@ -1,4 +1,3 @@
-import xopen
 import xml.etree.ElementTree as ET
 import pandas as pd
 from matsim import utils
@@ -8,34 +7,34 @@ class Household:
         self.households = households
 
 # Returns households as a dataframe
-def houshold_reader(filename, convert_dataframes_types=True):
-    tree = ET.iterparse(xopen.xopen(filename, 'r'), events=['start','end'])
-    
+def houshold_reader(filename, convert_dataframes_types=True, io_options=None):
     households = []
     current_persons = []
     current_household = {}
     
-    for xml_event, elem in tree:
-        _, _, elem_tag = elem.tag.partition('}')     # Removing xmlns tag from tag name
+    with utils.open_file(filename, io_options) as f:
+        tree = ET.iterparse(f, events=['start','end'])
+        for xml_event, elem in tree:
+            _, _, elem_tag = elem.tag.partition('}')     # Removing xmlns tag from tag name
         
-        # HOUSEHOLDS
-        if elem_tag == 'household':
-            if xml_event == 'start':
-                utils.parse_attributes(elem, current_household)
-            else:
-                current_household['members'] = current_persons
-                households.append(current_household)
-                current_household = {}
-                current_persons = []
-                elem.clear()
+            # HOUSEHOLDS
+            if elem_tag == 'household':
+                if xml_event == 'start':
+                    utils.parse_attributes(elem, current_household)
+                else:
+                    current_household['members'] = current_persons
+                    households.append(current_household)
+                    current_household = {}
+                    current_persons = []
+                    elem.clear()
 
-        # ATTRIBUTES
-        elif elem_tag == 'attribute':
-            current_household[elem.attrib['name']] = elem.text
+            # ATTRIBUTES
+            elif elem_tag == 'attribute':
+                current_household[elem.attrib['name']] = elem.text
         
-        # MEMBERS
-        elif elem_tag == 'personId' and xml_event == 'start':
-            current_persons.append(int(elem.attrib['refId']))
+            # MEMBERS
+            elif elem_tag == 'personId' and xml_event == 'start':
+                current_persons.append(int(elem.attrib['refId']))
     
     
     # Convert to dataframe and converts columns types
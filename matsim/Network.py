@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 
-import xopen
 import xml.etree.ElementTree as ET
+import numpy as np
 import pandas as pd
 
+from . import utils
+
 
 class Network:
 
@@ -18,6 +20,8 @@ class Network:
         self.network_attrs = {}
         if net_attrs: self.network_attrs = net_attrs
 
+        self._graph = None
+
     def __str__(self):
         return 'Network: {nodes} nodes, {links} links, {crs}'.format(
             nodes=len(self.nodes),
@@ -61,11 +65,111 @@ class Network:
 
         return geo_net
 
-def read_network(filename, skip_attributes=False):
+    def nodes_in_area(self, area):
+        """Return a boolean array, whether each node lies inside the area.
+
+        :param area bounding box (minx, miny, maxx, maxy), polygon as sequence of (x, y) vertices,
+            or a shapely (Multi)Polygon, or a GeoDataFrame/GeoSeries whose geometries are combined
+        """
+        x = self.nodes.x.to_numpy()
+        y = self.nodes.y.to_numpy()
+        return points_in_area(x, y, area)
+
+    def links_in_area(self, area, how='any'):
+        """Return the set of link ids inside the area, which is given as in :meth:`nodes_in_area`.
+
+        :param how 'any' includes links with at least one node inside, 'all' only links with both nodes inside
+        """
+        inside = pd.Series(self.nodes_in_area(area), index=self.nodes.node_id)
+        from_inside = inside.reindex(self.links.from_node).to_numpy(dtype=bool)
+        to_inside = inside.reindex(self.links.to_node).to_numpy(dtype=bool)
+
+        if how == 'any':
+            mask = from_inside | to_inside
+        elif how == 'all':
+            mask = from_inside & to_inside
+        else:
+            raise ValueError("how must be 'any' or 'all'")
+
+        return set(self.links.link_id[mask])
+
+    def to_graph(self):
+        """Return the network as compact graph with dense indices and links in compressed sparse row format,
+        see :class:`matsim.routing.Graph`. The graph is cached, it is rebuilt if nodes or links are replaced,
+        but not if the data frames are modified in place."""
+        from .routing import Graph
+
+        if self._graph is None or self._graph[0] is not self.nodes or self._graph[1] is not self.links:
+            self._graph = self.nodes, self.links, Graph.from_network(self)
+
+        return self._graph[2]
+
+
+def points_in_area(x, y, area):
+    """Vectorized test whether points lie inside a bounding box or polygon, see :meth:`Network.nodes_in_area`.
+    Polygons are evaluated with the even-odd rule, so holes and multiple parts are supported."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    if hasattr(area, 'union_all'):
+        area = area.union_all()
+    elif hasattr(area, 'unary_union'):
+        area = area.unary_union
+
+    if hasattr(area, 'geom_type'):
+        polygons = area.geoms if hasattr(area, 'geoms') else [area]
+        rings = [np.asarray(r.coords) for p in polygons for r in [p.exterior, *p.interiors]]
+    elif len(area) == 4 and np.isscalar(area[0]):
+        minx, miny, maxx, maxy = area
+        return (x >= minx) & (x <= maxx) & (y >= miny) & (y <= maxy)
+    else:
+        rings = [np.asarray(area, dtype=np.float64)]
+
+    inside = np.zeros(len(x), dtype=bool)
+
+    # only points within the bounding box need to be tested against the edges
+    points = np.concatenate(rings)
+    candidates = np.flatnonzero((x >= points[:, 0].min()) & (x <= points[:, 0].max()) &
+                                (y >= points[:, 1].min()) & (y <= points[:, 1].max()))
+    px, py = x[candidates], y[candidates]
+    result = np.zeros(len(candidates), dtype=bool)
+
+    for ring in rings:
+        x1, y1 = ring[:, 0], ring[:, 1]
+        x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+        for ax, ay, bx, by in zip(x1, y1, x2, y2):
+            if ay == by:
+                continue
+            crosses = (ay > py) != (by > py)
+            result ^= crosses & (px < (bx - ax) * (py - ay) / (by - ay) + ax)
+
+    inside[candidates] = result
+    return inside
+
+
+def read_network(filename, skip_attributes=False, io_options=None, cache=None):
     """Read a MATSim network.xml.gz file. Returns a Network object with dataframes
     for nodes, links, node_attributes, and link_attributes. If the network has a CRS
-    projection set, it will be available in network_attrs."""
-    tree = ET.iterparse(xopen.xopen(filename, 'r'), events=['start', 'end'])
+    projection set, it will be available in network_attrs.
+    io_options are passed to :func:`matsim.utils.open_file`, e.g. to enable background decompression.
+
+    :param cache opt-in cache of the parsed network in a binary format, which is much faster to read.
+        True uses the default location, a path the given directory, or a :class:`matsim.NetworkCache.NetworkCache`
+        to configure location and eviction. Requires pyarrow.
+    """
+    if cache is not None and cache is not False:
+        from .NetworkCache import NetworkCache
+
+        if not isinstance(cache, NetworkCache):
+            cache = NetworkCache(None if cache is True else cache)
+
+        network = cache.load(filename, skip_attributes)
+        if network is None:
+            network = read_network(filename, skip_attributes, io_options)
+            cache.store(filename, network, skip_attributes)
+
+        return network
+
     nodes = []
     links = []
     node_attrs = []
@@ -77,65 +181,67 @@ def read_network(filename, skip_attributes=False):
     attr_label = 'node_id'
     current_id = None
 
-    for xml_event, elem in tree:
-        # the nodes element CLOSES at the end of the nodes, followed by links:
-        if elem.tag == 'links' and xml_event == 'start':
-            attributes = link_attrs
-            attr_label = 'link_id'
+    with utils.open_file(filename, io_options) as f:
+        tree = ET.iterparse(f, events=['start', 'end'])
+        for xml_event, elem in tree:
+            # the nodes element CLOSES at the end of the nodes, followed by links:
+            if elem.tag == 'links' and xml_event == 'start':
+                attributes = link_attrs
+                attr_label = 'link_id'
 
-        elif elem.tag == 'node' and xml_event == 'start':
-            atts = elem.attrib
-            current_id = atts['id']
+            elif elem.tag == 'node' and xml_event == 'start':
+                atts = elem.attrib
+                current_id = atts['id']
 
-            atts['node_id'] = atts.pop('id')
-            atts['x'] = float(atts['x'])
-            atts['y'] = float(atts['y'])
-            if 'z' in atts: atts['z'] = float(atts['z'])
+                atts['node_id'] = atts.pop('id')
+                atts['x'] = float(atts['x'])
+                atts['y'] = float(atts['y'])
+                if 'z' in atts: atts['z'] = float(atts['z'])
 
-            nodes.append(atts)
+                nodes.append(atts)
 
-        elif elem.tag == 'link' and xml_event == 'start':
-            atts = elem.attrib
-            current_id = atts['id']
+            elif elem.tag == 'link' and xml_event == 'start':
+                atts = elem.attrib
+                current_id = atts['id']
 
-            atts['link_id'] = atts.pop('id')
-            atts['from_node'] = atts.pop('from')
-            atts['to_node'] = atts.pop('to')
+                atts['link_id'] = atts.pop('id')
+                atts['from_node'] = atts.pop('from')
+                atts['to_node'] = atts.pop('to')
 
-            atts['length'] = float(atts['length'])
-            atts['freespeed'] = float(atts['freespeed'])
-            atts['capacity'] = float(atts['capacity'])
-            atts['permlanes'] = float(atts['permlanes'])
+                atts['length'] = float(atts['length'])
+                atts['freespeed'] = float(atts['freespeed'])
+                atts['capacity'] = float(atts['capacity'])
+                atts['permlanes'] = float(atts['permlanes'])
 
-            if 'volume' in atts: atts['volume'] = float(atts['volume'])
+                if 'volume' in atts: atts['volume'] = float(atts['volume'])
 
-            links.append(atts)
+                links.append(atts)
 
 
-        elif elem.tag == 'attribute' and xml_event == 'end':
-            if elem.attrib['name'] == Network._crsTag:
-                network_attrs[Network._crsTag] = elem.text
+            elif elem.tag == 'attribute' and xml_event == 'end':
+                if elem.attrib['name'] == Network._crsTag:
+                    network_attrs[Network._crsTag] = elem.text
 
-            elif not skip_attributes:
-                atts = {}
-                atts[attr_label] = current_id
-                atts['name'] = elem.attrib['name']
-                atts['value'] = elem.text
+                elif not skip_attributes:
+                    atts = {}
+                    atts[attr_label] = current_id
+                    atts['name'] = elem.attrib['name']
+                    atts['value'] = elem.text
 
-                # TODO: pandas will make the value column "object" since we're mixing types
-                if 'class' in elem.attrib:
-                    if elem.attrib['class'] == 'java.lang.Long':
-                        atts['value'] = int(elem.text)
-                    if elem.attrib['class'] == 'java.lang.Double':
-                        atts['value'] = float(elem.text)
-                    if elem.attrib['class'] == 'java.lang.Integer':
-                        atts['value'] = int(elem.text)
+                    # TODO: pandas will make the value column "object" since we're mixing types
+                    if 'class' in elem.attrib:
+                        if elem.attrib['class'] == 'java.lang.Long':
+                            atts['value'] = int(elem.text)
+                        if elem.attrib['class'] == 'java.lang.Double':
+                            atts['value'] = float(elem.text)
+                        if elem.attrib['class'] == 'java.lang.Integer':
+                            atts['value'] = int(elem.text)
 
-                attributes.append(atts)
+                    attributes.append(atts)
 
-        # clear the element when we're done, to keep memory usage low
-        if elem.tag in ['node', 'link'] and xml_event == 'end':
-            elem.clear()
+            # clear the element when we're done, to keep memory usage low
+            if elem.tag in ['node', 'link'] and xml_event == 'end':
+                elem.clear()
 
     nodes = pd.DataFrame.from_records(nodes)
     links = pd.DataFrame.from_records(links)
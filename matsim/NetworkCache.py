@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import tempfile
+from hashlib import blake2b
+
+import numpy as np
+import pandas as pd
+
+# Version of the cache format, entries of other versions are parsed again
+CACHE_VERSION = 2
+
+# Default limit of the total size of a cache directory in bytes
+DEFAULT_MAX_SIZE = 8 << 30
+
+# Data frames of a network, each is stored as Feather file
+FRAMES = ('nodes', 'links', 'node_attrs', 'link_attrs')
+
+_META = 'meta.json'
+_CHUNK_SIZE = 1 << 20
+
+# Types of the values in object columns, which can not be stored in one Arrow column
+_KINDS = (str, int, float)
+
+# Prefix of the columns these are split into. XML names can not contain it, so it does not collide with attributes.
+_SPLIT = '\0'
+
+
+def default_directory():
+    """ Default location of the cache, ``$MATSIM_CACHE_DIR`` or ``matsim-tools/networks`` in the user cache directory """
+    if os.environ.get('MATSIM_CACHE_DIR'):
+        return os.environ['MATSIM_CACHE_DIR']
+
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'matsim-tools', 'networks')
+
+
+class NetworkCache:
+    """ Cache of parsed networks in a binary columnar format, see :func:`matsim.Network.read_network`.
+
+        Each entry stores the data frames of one network file as Feather files, which requires pyarrow.
+        An entry is valid as long as size and modification time of the network file are unchanged.
+        If only the modification time differs, e.g. for copied files, the content hash is compared instead.
+        When the cache grows beyond its limits, the least recently used entries are evicted.
+
+    :param directory location of the cache, default see :func:`default_directory`
+    :param max_size maximum total size of all entries in bytes, None for no limit
+    :param max_entries maximum number of entries, None for no limit
+    """
+
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE, max_entries=None):
+        self.directory = str(directory) if directory is not None else default_directory()
+        self.max_size = max_size
+        self.max_entries = max_entries
+
+    def __str__(self):
+        entries = self.entries()
+        return 'NetworkCache: {dir}, {n} entries, {size:.1f} MB'.format(
+            dir=self.directory, n=len(entries), size=sum(e['bytes'] for e in entries) / 1e6)
+
+    def load(self, filepath, skip_attributes=False):
+        """ Network of a file stored in the cache, or None if there is no valid entry.
+
+        :rtype matsim.Network.Network
+        """
+        from .Network import Network
+
+        path = self._entry(filepath, skip_attributes)
+        try:
+            with open(os.path.join(path, _META)) as f:
+                meta = json.load(f)
+
+            if meta.get('version') != CACHE_VERSION or not self._matches(filepath, meta, path):
+                return None
+
+            import pyarrow.feather as feather
+            frames = {name: _decode(feather.read_table(os.path.join(path, name + '.feather')).to_pandas(),
+                                    meta['kinds'].get(name, ())) for name in FRAMES}
+
+        except (OSError, ValueError, KeyError):
+            # missing, unreadable or concurrently evicted entries are parsed again
+            return None
+
+        # the modification time of the meta file marks the last use, for eviction
+        try:
+            os.utime(os.path.join(path, _META))
+        except OSError:
+            pass
+
+        return Network(frames['nodes'], frames['links'], frames['node_attrs'], frames['link_attrs'],
+                       meta['network_attrs'])
+
+    def store(self, filepath, network, skip_attributes=False):
+        """ Store the network parsed from a file and evict old entries if needed. Failures to write are ignored. """
+        import pyarrow as pa
+        import pyarrow.feather as feather
+
+        stat = os.stat(filepath)
+        meta = {
+            'version': CACHE_VERSION, 'path': os.path.abspath(filepath), 'skip_attributes': skip_attributes,
+            'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': file_hash(filepath),
+            'network_attrs': network.network_attrs, 'kinds': {}
+        }
+
+        path = self._entry(filepath, skip_attributes)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = tempfile.mkdtemp(prefix='.tmp-', dir=self.directory)
+        except OSError:
+            return
+
+        try:
+            for name in FRAMES:
+                df, kinds = _encode(getattr(network, name))
+                if kinds:
+                    meta['kinds'][name] = kinds
+                feather.write_feather(pa.Table.from_pandas(df, preserve_index=False),
+                                      os.path.join(tmp, name + '.feather'))
+
+            with open(os.path.join(tmp, _META), 'w') as f:
+                json.dump(meta, f)
+
+            # replace the entry at once, so that readers never see partial entries
+            if os.path.exists(path):
+                shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp, path)
+
+        except OSError:
+            pass
+
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        self.evict(keep=path)
+
+    def entries(self):
+        """ List of the cached entries, least recently used first. Each is a dictionary with its directory ('entry'),
+            the network file ('path'), the size in bytes ('bytes') and the time of the last use ('used'). """
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return entries
+
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                with open(os.path.join(path, _META)) as f:
+                    meta = json.load(f)
+
+                files = [os.path.join(path, f) for f in os.listdir(path)]
+                entries.append({'entry': path, 'path': meta.get('path'),
+                                'used': os.path.getmtime(os.path.join(path, _META)),
+                                'bytes': sum(os.path.getsize(f) for f in files)})
+            except (OSError, ValueError):
+                # temporary directories and foreign files are ignored
+                continue
+
+        entries.sort(key=lambda e: e['used'])
+        return entries
+
+    def evict(self, keep=None):
+        """ Remove the least recently used entries, until the cache is within its limits
+
+        :param keep entry directory that is never removed, e.g. the one just stored
+        """
+        if self.max_size is None and self.max_entries is None:
+            return
+
+        entries = self.entries()
+        total = sum(e['bytes'] for e in entries)
+        count = len(entries)
+
+        for e in entries:
+            if (self.max_size is None or total <= self.max_size) and \
+                    (self.max_entries is None or count <= self.max_entries):
+                break
+            if e['entry'] == keep:
+                continue
+
+            shutil.rmtree(e['entry'], ignore_errors=True)
+            total -= e['bytes']
+            count -= 1
+
+    def clear(self):
+        """ Remove all entries """
+        for e in self.entries():
+            shutil.rmtree(e['entry'], ignore_errors=True)
+
+    def _entry(self, filepath, skip_attributes):
+        """ Directory of the entry of a network file """
+        key = os.path.abspath(filepath) + ('\0skip' if skip_attributes else '')
+        return os.path.join(self.directory, blake2b(key.encode('utf8'), digest_size=16).hexdigest())
+
+    def _matches(self, filepath, meta, path):
+        """ Whether an entry belongs to the current content of the file. Entries of files with only a new
+            modification time are updated, so that the hash is not computed again. """
+        stat = os.stat(filepath)
+        if stat.st_size != meta['size']:
+            return False
+        if stat.st_mtime_ns == meta['mtime']:
+            return True
+        if file_hash(filepath) != meta['hash']:
+            return False
+
+        meta['mtime'] = stat.st_mtime_ns
+        try:
+            with open(os.path.join(path, _META), 'w') as f:
+                json.dump(meta, f)
+        except OSError:
+            pass
+
+        return True
+
+
+def file_hash(filepath):
+    """ Hash of the content of a file """
+    h = blake2b(digest_size=16)
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _encode(df):
+    """ Split object columns with values of mixed type into one column per type, which Arrow can store.
+
+    :returns data frame and dictionary of the split columns to the types present
+    """
+    kinds = {}
+    columns = {}
+    for name in df.columns:
+        values = df[name]
+        if values.dtype != object:
+            columns[name] = values
+            continue
+
+        types = values.map(type).to_numpy()
+        kind = np.full(len(values), -1, dtype=np.int8)
+        present = []
+        for i, t in enumerate(_KINDS):
+            mask = types == t
+            if mask.any():
+                kind[mask] = i
+                present.append(t.__name__)
+                columns[_split(name, t.__name__)] = values.where(mask, None).astype('Int64' if t is int else t.__name__)
+
+        # other values, e.g. None, are restored as None
+        columns[_split(name, 'kind')] = kind
+        kinds[name] = present
+
+    return pd.DataFrame(columns, index=pd.RangeIndex(len(df))) if kinds else df, kinds
+
+
+def _decode(df, kinds):
+    """ Restore the object columns split by :func:`_encode`, the original column order is kept """
+    if not kinds:
+        return df
+
+    columns = {}
+    for name in df.columns:
+        if not name.startswith(_SPLIT):
+            columns[name] = df[name]
+            continue
+
+        part, column = name[1:].split(_SPLIT, 1)
+        if part != 'kind':
+            continue
+
+        kind = df[name].to_numpy()
+        values = np.full(len(df), None, dtype=object)
+        for i, t in enumerate(_KINDS):
+            if t.__name__ in kinds[column]:
+                mask = kind == i
+                part = df[_split(column, t.__name__)]
+                if t is str:
+                    values[mask] = part.to_numpy(dtype=object)[mask]
+                else:
+                    # tolist converts to python numbers, as produced by the parser
+                    values[mask] = part.to_numpy(dtype=np.int64 if t is int else np.float64, na_value=0)[mask].tolist()
+
+        columns[column] = pd.Series(values, dtype=object)
+
+    return pd.DataFrame(columns, index=df.index)
+
+
+def _split(name, part):
+    """ Name of a column an object column is split into """
+    return _SPLIT + part + _SPLIT + name
@@ -1,41 +1,265 @@
+import pandas as pd
+
+
+# Modes that only connect other legs and do not determine the main mode on their own
+WALK_MODES = {'walk', 'non_network_walk', 'transit_walk', 'access_walk', 'egress_walk'}
+
+
+def default_main_mode(modes):
+    """ Identify the main mode of a trip as the first mode that is not a walk mode, or walk if there is none. """
+    for mode in modes:
+        if mode not in WALK_MODES:
+            return mode
+
+    return 'walk'
+
+
+class _Trip:
+    """ State of one agent, while a trip is in progress """
+
+    __slots__ = ('trip_number', 'dep_time', 'start_activity', 'start_link', 'modes', 'leg_dep_time', 'leg_times',
+                 'distance')
+
+    def __init__(self, trip_number, dep_time, start_activity, start_link):
+        self.trip_number = trip_number
+        self.dep_time = dep_time
+        self.start_activity = start_activity
+        self.start_link = start_link
+        self.modes = []
+        self.leg_dep_time = None
+        self.leg_times = []
+        self.distance = 0.0
+
+
 class TripEventHandler:
+    """ Reconstructs trips and legs from activity and departure/arrival events.
+
+        A trip starts at the end of an activity that is not a stage activity and ends with the start of the next one.
+        Only agents that are currently travelling are kept in memory, the state of an agent is removed as soon as
+        its trip is complete. Finished trips are collected and emitted as DataFrame batches, either to the given
+        sink functions or kept in memory until :meth:`trips` is called.
 
-    def __init__(self, main_mode_identifier, person_filter):
+        The traveled distance of a trip sums the distances of teleported legs, which MATSim reports by 'travelled'
+        events. Legs on the network are only included if a network is given, then the lengths of the links entered
+        by the vehicles of the person are added up. Otherwise, network legs have a distance of 0.
+
+    :param main_mode_identifier function determining the main mode from the list of leg modes of a trip
+    :param person_filter function returning whether the trips of a person should be recorded
+    :param batch_size number of finished trips (or legs) per emitted DataFrame
+    :param trip_sink function receiving each DataFrame of trips, see also :class:`ParquetSink`
+    :param leg_sink function receiving each DataFrame of legs
+    :param network :class:`matsim.Network.Network` or mapping of link id to length, used for the distance of
+        network legs
+    """
+
+    def __init__(self, main_mode_identifier=default_main_mode, person_filter=None, batch_size=100000,
+                 trip_sink=None, leg_sink=None, network=None):
         self.drivers = set()
         self.persons = {}
         self.stuck = set()
-        self.main_mode_identifier = main_mode_identifier
+        self.trip_counts = {}
+        self.main_mode_identifier = main_mode_identifier or default_main_mode
         self.person_filter = person_filter
+        self.batch_size = batch_size
+        self.trip_sink = trip_sink
+        self.leg_sink = leg_sink
+
+        self.trip_batches = []
+        self.leg_batches = []
+        self._trips = []
+        self._legs = []
+
         self.handlers = {
             'actstart': self.on_activity_start, 'actend': self.on_activity_end, 'departure': self.on_person_departure,
-            'arrival': self.on_person_arrival, 'stuck': self.on_person_stuck
+            'arrival': self.on_person_arrival, 'stuck': self.on_person_stuck, 'travelled': self.on_travelled,
+            'TransitDriverStarts': self.on_transit_driver_starts
         }
 
+        self.link_lengths = None
+        # vehicle -> trips of the persons inside
+        self.vehicles = {}
+        if network is not None:
+            self.link_lengths = dict(zip(network.links.link_id, network.links.length)) \
+                if hasattr(network, 'links') else dict(network)
+
+            self.handlers.update({
+                'PersonEntersVehicle': self.on_person_enters_vehicle,
+                'PersonLeavesVehicle': self.on_person_leaves_vehicle, 'entered link': self.on_link_enter
+            })
+
     def on_event(self, time, type, attrs):
         if (type in self.handlers):
             self.handlers[type](time, attrs)
 
     def on_transit_driver_starts(self, time, attrs):
-        self.drivers.add(attrs['id'])
+        self.drivers.add(attrs['driverId'])
 
     def on_activity_end(self, time, attrs):
-        if self.is_stage_activity(attrs['acttype']) or attrs['id'] in self.drivers or not self.person_filter(
-                attrs['id']):
+        person = attrs['person']
+        if self.is_stage_activity(attrs['actType']) or person in self.drivers:
             return
 
+        if self.person_filter is not None and not self.person_filter(person):
+            return
+
+        n = self.trip_counts.get(person, 0) + 1
+        self.trip_counts[person] = n
+        self.persons[person] = _Trip(n, time, attrs['actType'], attrs.get('link'))
+
     def on_activity_start(self, time, attrs):
-        pass
+        if self.is_stage_activity(attrs['actType']):
+            return
+
+        trip = self.persons.pop(attrs['person'], None)
+        if trip is None:
+            return
+
+        self._finish_trip(attrs['person'], trip, time, attrs)
 
     def on_person_arrival(self, time, attrs):
-        pass
+        trip = self.persons.get(attrs['person'])
+        if trip is None or trip.leg_dep_time is None:
+            return
+
+        trip.leg_times.append((trip.leg_dep_time, time))
+        trip.leg_dep_time = None
 
     def on_person_departure(self, time, attrs):
-        pass
+        trip = self.persons.get(attrs['person'])
+        if trip is None:
+            return
+
+        trip.modes.append(attrs['legMode'])
+        trip.leg_dep_time = time
 
     def on_person_stuck(self, time, attrs):
-        pass
+        # trips of stuck agents are incomplete and dropped
+        person = attrs['person']
+        self.stuck.add(person)
+        self.persons.pop(person, None)
+
+        # the vehicle may keep moving, e.g. if the driver gets stuck, and must not add to the dropped trip
+        for vehicle, inside in list(self.vehicles.items()):
+            if inside.pop(person, None) is not None and not inside:
+                del self.vehicles[vehicle]
+
+    def on_travelled(self, time, attrs):
+        trip = self.persons.get(attrs['person'])
+        if trip is not None:
+            trip.distance += float(attrs['distance'])
+
+    def on_person_enters_vehicle(self, time, attrs):
+        trip = self.persons.get(attrs['person'])
+        if trip is not None:
+            self.vehicles.setdefault(attrs['vehicle'], {})[attrs['person']] = trip
+
+    def on_person_leaves_vehicle(self, time, attrs):
+        inside = self.vehicles.get(attrs['vehicle'])
+        if inside is not None:
+            inside.pop(attrs['person'], None)
+            if not inside:
+                del self.vehicles[attrs['vehicle']]
+
+    def on_link_enter(self, time, attrs):
+        # as for MATSim routes, the departure link is not included, but the arrival link is
+        inside = self.vehicles.get(attrs['vehicle'])
+        if inside:
+            length = self.link_lengths[attrs['link']]
+            for trip in inside.values():
+                trip.distance += length
 
     def is_stage_activity(self, type):
         return type.endswith("interaction")
 
+    def _finish_trip(self, person, trip, time, attrs):
+        trip_id = "%s_%d" % (person, trip.trip_number)
+
+        self._trips.append((person, trip.trip_number, trip_id, trip.dep_time, time - trip.dep_time,
+                            self.main_mode_identifier(trip.modes), "-".join(trip.modes), len(trip.modes),
+                            trip.start_activity, attrs['actType'], trip.start_link, attrs.get('link'),
+                            trip.distance))
+
+        for i, (mode, (dep, arr)) in enumerate(zip(trip.modes, trip.leg_times)):
+            self._legs.append((person, trip_id, i + 1, mode, dep, arr - dep))
+
+        if len(self._trips) >= self.batch_size:
+            self._emit_trips()
+        if len(self._legs) >= self.batch_size:
+            self._emit_legs()
+
+    _TRIP_COLUMNS = ['person', 'trip_number', 'trip_id', 'dep_time', 'trav_time', 'main_mode', 'modes', 'n_legs',
+                     'start_activity_type', 'end_activity_type', 'start_link', 'end_link', 'traveled_distance']
+
+    _LEG_COLUMNS = ['person', 'trip_id', 'leg_number', 'mode', 'dep_time', 'trav_time']
+
+    def _emit_trips(self):
+        if not self._trips:
+            return
+
+        df = pd.DataFrame.from_records(self._trips, columns=self._TRIP_COLUMNS)
+        self._trips = []
+        if self.trip_sink is not None:
+            self.trip_sink(df)
+        else:
+            self.trip_batches.append(df)
+
+    def _emit_legs(self):
+        if not self._legs:
+            return
+
+        df = pd.DataFrame.from_records(self._legs, columns=self._LEG_COLUMNS)
+        self._legs = []
+        if self.leg_sink is not None:
+            self.leg_sink(df)
+        else:
+            self.leg_batches.append(df)
+
+    def finish(self):
+        """ Emit all remaining finished trips and legs. Trips that are still in progress are dropped. """
+        self._emit_trips()
+        self._emit_legs()
+
+    def trips(self):
+        """ All trips that have not been passed to a sink as one DataFrame. """
+        self._emit_trips()
+        if not self.trip_batches:
+            return pd.DataFrame(columns=self._TRIP_COLUMNS)
+
+        return pd.concat(self.trip_batches, ignore_index=True)
+
+    def legs(self):
+        """ All legs that have not been passed to a sink as one DataFrame. """
+        self._emit_legs()
+        if not self.leg_batches:
+            return pd.DataFrame(columns=self._LEG_COLUMNS)
+
+        return pd.concat(self.leg_batches, ignore_index=True)
+
+
+class ParquetSink:
+    """ Appends DataFrame batches to one Parquet file. Requires pyarrow. Needs to be closed after use. """
+
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+
+    def __call__(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def __enter__(self):
+        return self
 
+    def __exit__(self, *args):
+        self.close()
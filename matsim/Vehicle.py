@@ -1,4 +1,3 @@
-import xopen
 import xml.etree.ElementTree as ET
 import pandas as pd
 from matsim import utils
@@ -10,9 +9,7 @@ class Vehicle:
 
 # Returns vehicle_types and vehicles dataframes
 # <vehicleType> attributes and children attributes are récursively added to the dataframe
-def vehicle_reader(filename, convert_dataframes_types=True):
-    tree = ET.iterparse(xopen.xopen(filename, 'r'), events=['start','end'])
-    
+def vehicle_reader(filename, convert_dataframes_types=True, io_options=None):
     vehicle_types = []
     vehicles = []
     
@@ -21,41 +18,43 @@ def vehicle_reader(filename, convert_dataframes_types=True):
     
     is_parsing_vehicle_type = False
     
-    for xml_event, elem in tree:
-        _, _, elem_tag = elem.tag.partition('}')     # Removing xmlns tag from tag name
+    with utils.open_file(filename, io_options) as f:
+        tree = ET.iterparse(f, events=['start','end'])
+        for xml_event, elem in tree:
+            _, _, elem_tag = elem.tag.partition('}')     # Removing xmlns tag from tag name
         
-        # VEHICLES
-        if elem_tag == 'vehicle' and xml_event == 'start':
-            utils.parse_attributes(elem, current_vehicle)
+            # VEHICLES
+            if elem_tag == 'vehicle' and xml_event == 'start':
+                utils.parse_attributes(elem, current_vehicle)
         
-        elif elem_tag == 'vehicle' and xml_event == 'end':
-            vehicles.append(current_vehicle)
-            current_vehicle = {}
-            elem.clear()
+            elif elem_tag == 'vehicle' and xml_event == 'end':
+                vehicles.append(current_vehicle)
+                current_vehicle = {}
+                elem.clear()
             
-        # VEHICLETYPES
-        elif elem_tag == 'vehicleType' and xml_event == 'start':
-            utils.parse_attributes(elem, current_vehicle_type)
-            is_parsing_vehicle_type = True
+            # VEHICLETYPES
+            elif elem_tag == 'vehicleType' and xml_event == 'start':
+                utils.parse_attributes(elem, current_vehicle_type)
+                is_parsing_vehicle_type = True
         
-        # ATTRIBUTES
-        elif elem_tag == 'attribute' and xml_event == 'start':
-            current_vehicle_type[elem.attrib['name']] = elem.text
+            # ATTRIBUTES
+            elif elem_tag == 'attribute' and xml_event == 'start':
+                current_vehicle_type[elem.attrib['name']] = elem.text
         
-        # LENGTH / WIDTH
-        elif elem_tag in ['length', 'width'] and xml_event == 'start':
-            current_vehicle_type[elem_tag] = elem.attrib['meter']
+            # LENGTH / WIDTH
+            elif elem_tag in ['length', 'width'] and xml_event == 'start':
+                current_vehicle_type[elem_tag] = elem.attrib['meter']
         
-        # VEHICLETYPES
-        elif elem_tag == 'vehicleType' and xml_event == 'end':
-            vehicle_types.append(current_vehicle_type)
-            current_vehicle_type = {}
-            elem.clear()
-            is_parsing_vehicle_type = False
+            # VEHICLETYPES
+            elif elem_tag == 'vehicleType' and xml_event == 'end':
+                vehicle_types.append(current_vehicle_type)
+                current_vehicle_type = {}
+                elem.clear()
+                is_parsing_vehicle_type = False
         
-        # EVERYTHING ELSE
-        elif is_parsing_vehicle_type and elem_tag not in ['attribute', 'length', 'width']:
-            utils.parse_attributes(elem, current_vehicle_type)
+            # EVERYTHING ELSE
+            elif is_parsing_vehicle_type and elem_tag not in ['attribute', 'length', 'width']:
+                utils.parse_attributes(elem, current_vehicle_type)
 
     
     vehicle_types = pd.DataFrame.from_records(vehicle_types)
@@ -1,7 +1,10 @@
-from . import Events, Network, Plans, Vehicle, Facility, Household, TripEventHandler, writers
+from . import Events, EventIndex, EventsManager, Network, NetworkCache, Plans, Vehicle, Facility, Household, TripEventHandler, writers
 
 read_network = Network.read_network
 event_reader = Events.event_reader
+event_reader_batches = Events.event_reader_batches
+pb_event_dispatch = Events.pb_event_dispatch
+event_index = EventIndex.event_index
 plan_reader = Plans.plan_reader
 plan_reader_dataframe = Plans.plan_reader_dataframe
 vehicle_reader = Vehicle.vehicle_reader
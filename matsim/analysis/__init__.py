@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+
+from .volumes import LinkVolumes, link_volumes
+from .travel_times import LinkTravelTimes, link_travel_times
+from .compare import EventsComparison, compare_events, merge_events
+from .persons import group_events_by_person
+from .timeseries import TimeSeries, time_series
+from .iterations import iteration_event_files, scan_iterations, iteration_aggregates
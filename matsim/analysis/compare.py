@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+import heapq
+from collections import Counter, defaultdict
+
+import pandas as pd
+
+
+def merge_events(*filepaths, types=None, **kwargs):
+    """ Merge several time-sorted event files into one stream ordered by time, using a heap-based k-way merge.
+        Files are read lazily, only one event per file is held at a time.
+        Events with the same time are returned in the order of the files.
+
+    :param filepaths paths to the event files, in any of the supported formats
+    :param types event types to read. Can be an iterable, or comma-separated string.
+    :param kwargs further arguments passed to :func:`matsim.Events.event_reader`
+    :returns generator of (file index, time, event)
+    :rtype Iterable[tuple[int, float, dict]]
+    """
+    from ..Events import event_reader
+
+    def stream(i, filepath):
+        for event in event_reader(filepath, types=types, **kwargs):
+            yield float(event['time']), i, event
+
+    # ties are broken by the order of the iterables, events themselves are never compared
+    for time, i, event in heapq.merge(*(stream(i, f) for i, f in enumerate(filepaths)), key=lambda x: x[0]):
+        yield i, time, event
+
+
+class EventsComparison:
+    """ Differences between the events of two runs, computed incrementally while both files are merged.
+
+        Memory is bounded by the number of links and persons, and the number of events at the same time step,
+        but not by the size of the files.
+
+    :param max_examples number of differing events that are kept as examples
+    """
+
+    def __init__(self, max_examples=10):
+        self.max_examples = max_examples
+
+        self.events = [0, 0]
+        self.n_different = 0
+        self.first_difference = None
+        self.examples = []
+
+        self.link_volumes = defaultdict(lambda: [0, 0])
+        # person -> [trips, travel time, money, stuck] for both runs
+        self.person_stats = defaultdict(lambda: [[0, 0.0, 0.0, 0], [0, 0.0, 0.0, 0]])
+
+        self._departures = ({}, {})
+        self._time = None
+        self._current = ([], [])
+
+    @property
+    def identical(self):
+        """ Whether both runs contained the same events at the same times """
+        return self.n_different == 0 and self.events[0] == self.events[1]
+
+    def handle_event(self, source, time, event):
+        """ Process one event of the base (source 0) or policy (source 1) run. Events must be ordered by time. """
+        if time != self._time:
+            self._compare()
+            self._time = time
+
+        self.events[source] += 1
+        self._current[source].append(event)
+
+        ev_type = event['type']
+        if ev_type == 'entered link':
+            self.link_volumes[event['link']][source] += 1
+        elif ev_type == 'departure':
+            self._departures[source][event['person']] = time
+        elif ev_type == 'arrival':
+            dep = self._departures[source].pop(event['person'], None)
+            if dep is not None:
+                stats = self.person_stats[event['person']][source]
+                stats[0] += 1
+                stats[1] += time - dep
+        elif ev_type == 'personMoney':
+            self.person_stats[event['person']][source][2] += float(event['amount'])
+        elif ev_type == 'stuck':
+            self.person_stats[event['person']][source][3] += 1
+            self._departures[source].pop(event['person'], None)
+
+    def finish(self):
+        self._compare()
+        self._time = None
+
+    def _compare(self):
+        """ Compare the events of both runs at the current time step """
+        base, policy = self._current
+        # fast path for identical runs, events are only normalized if they differ
+        if base != policy:
+            base, policy = Counter(map(_normalize, base)), Counter(map(_normalize, policy))
+            diff = [(0, e, n) for e, n in (base - policy).items()] + [(1, e, n) for e, n in (policy - base).items()]
+            self.n_different += sum(n for _, _, n in diff)
+
+            # events differing only in their order are not counted
+            if diff and self.first_difference is None:
+                self.first_difference = self._time
+
+            for source, e, _ in diff[:self.max_examples - len(self.examples)]:
+                self.examples.append((source, dict(e)))
+
+        self._current[0].clear()
+        self._current[1].clear()
+
+    def links(self):
+        """ DataFrame with the number of vehicles entering each link in both runs, and their difference """
+        df = pd.DataFrame([(k, b, p) for k, (b, p) in self.link_volumes.items()],
+                          columns=['link_id', 'base', 'policy'])
+        df['diff'] = df.policy - df.base
+        return df
+
+    def persons(self):
+        """ DataFrame with number of trips, travel time, money and stuck events per person in both runs """
+        columns = ['trips', 'trav_time', 'money', 'stuck']
+        df = pd.DataFrame([(k, *b, *p) for k, (b, p) in self.person_stats.items()],
+                          columns=['person'] + ['base_' + c for c in columns] + ['policy_' + c for c in columns])
+
+        for c in columns:
+            df['diff_' + c] = df['policy_' + c] - df['base_' + c]
+
+        return df
+
+    def summary(self):
+        """ Overview of the comparison as dictionary """
+        return {
+            'base_events': self.events[0], 'policy_events': self.events[1], 'different_events': self.n_different,
+            'first_difference': self.first_difference, 'identical': self.identical
+        }
+
+
+def _normalize(event):
+    """ Hashable representation of an event, independent of the file format it was read from """
+    return tuple(sorted((k, str(v)) for k, v in event.items() if k != 'time' and v != ''))
+
+
+def compare_events(base, policy, types=None, max_examples=10, **kwargs):
+    """ Stream two event files of different runs, e.g. base and policy case, and compare them.
+
+    :param base path to the events of the first run
+    :param policy path to the events of the second run
+    :param types event types to compare, default None compares all events
+    :param max_examples number of differing events that are kept as examples
+    :param kwargs further arguments passed to :func:`matsim.Events.event_reader`
+    :rtype EventsComparison
+    """
+    comparison = EventsComparison(max_examples)
+    for source, time, event in merge_events(base, policy, types=types, **kwargs):
+        comparison.handle_event(source, time, event)
+
+    comparison.finish()
+    return comparison
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from .utils import type_mask
+
+# Preferred event file formats, if an iteration contains several
+FORMATS = ('pb', 'xml', 'ndjson')
+
+_ITERATION_DIR = re.compile(r'^it\.(\d+)$')
+_EVENTS_FILE = re.compile(r'(^|\.)events\.(pb|xml|ndjson)(\.[a-z0-9]+)?$')
+
+
+def iteration_event_files(run_dir, iterations=None):
+    """ Discover the event files of all iterations in ITERS/it.N of a run directory.
+
+    :param run_dir output directory of a MATSim run
+    :param iterations only return these iteration numbers, default None returns all
+    :returns dictionary of iteration number to path of the events file, ordered by iteration
+    """
+    iters = os.path.join(run_dir, "ITERS")
+    if not os.path.isdir(iters):
+        raise ValueError("No ITERS directory in %s, the iterations may have been removed" % run_dir)
+
+    files = {}
+    for name in os.listdir(iters):
+        m = _ITERATION_DIR.match(name)
+        if m is None:
+            continue
+
+        it = int(m.group(1))
+        if iterations is not None and it not in iterations:
+            continue
+
+        candidates = {}
+        for f in os.listdir(os.path.join(iters, name)):
+            e = _EVENTS_FILE.search(f)
+            if e is not None:
+                candidates[e.group(2)] = os.path.join(iters, name, f)
+
+        for fmt in FORMATS:
+            if fmt in candidates:
+                files[it] = candidates[fmt]
+                break
+
+    return dict(sorted(files.items()))
+
+
+def summarize_iteration(filepath, batch_size=65536):
+    """ Departures per leg mode and vehicles entering each link of one events file.
+
+    :returns dictionary with 'modes' and 'links', each a Series of counts
+    """
+    from ..Events import event_reader_batches
+
+    modes = {}
+    links = {}
+    for batch in event_reader_batches(filepath, types=('departure', 'entered link'), columns=('legMode', 'link'),
+                                      batch_size=batch_size):
+        for column, target, ev_type in (('legMode', modes, 'departure'), ('link', links, 'entered link')):
+            codes = batch[column][type_mask(batch, [ev_type])]
+            values, counts = np.unique(codes[codes >= 0], return_counts=True)
+            for v, n in zip(batch.dictionaries[column].decode(values).tolist(), counts.tolist()):
+                target[v] = target.get(v, 0) + n
+
+    return {'modes': pd.Series(modes, dtype=np.int64), 'links': pd.Series(links, dtype=np.int64)}
+
+
+def scan_iterations(run_dir, func=summarize_iteration, iterations=None, workers=None):
+    """ Apply a function to the events of each iteration, one iteration per worker process.
+
+    :param run_dir output directory of a MATSim run
+    :param func function receiving the path of the events file. Needs to be picklable, i.e. defined at module level.
+    :param iterations only process these iteration numbers, default None processes all
+    :param workers number of processes, default None uses the number of CPUs. 1 processes sequentially.
+    :returns dictionary of iteration number to result of func, ordered by iteration
+    """
+    files = iteration_event_files(run_dir, iterations)
+
+    if workers == 1 or len(files) <= 1:
+        return {it: func(f) for it, f in files.items()}
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(func, files.values())
+        return dict(zip(files.keys(), results))
+
+
+def iteration_aggregates(run_dir, iterations=None, workers=None):
+    """ Mode shares and link volumes over the iterations of a run, e.g. to check convergence.
+
+    :returns tuple of DataFrames (mode shares, link volumes), with one row per iteration
+    """
+    results = scan_iterations(run_dir, summarize_iteration, iterations, workers)
+
+    modes = pd.DataFrame({it: r['modes'] for it, r in results.items()}).T.fillna(0)
+    shares = modes.div(modes.sum(axis=1), axis=0)
+    shares.index.name = 'iteration'
+
+    links = pd.DataFrame({it: r['links'] for it, r in results.items()}).T.fillna(0).astype(np.int64)
+    links.index.name = 'iteration'
+
+    return shares, links
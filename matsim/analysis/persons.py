@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+import os
+import pickle
+import tempfile
+import zlib
+
+# Rough size of one event dictionary in memory, used to translate the memory budget into a number of events
+EVENT_SIZE_ESTIMATE = 500
+
+
+def group_events_by_person(filepath, types=None, key='person', memory_budget=1 << 30, n_shards=64, tmpdir=None,
+                           func=None, workers=None, **kwargs):
+    """ Group the events of a file by person, so that each agent's complete event sequence can be analysed.
+
+        Events are distributed into shards by the hash of the person id. As long as all events fit into the memory
+        budget they are grouped in memory. Otherwise, the buffered events are spilled to temporary files, one per
+        shard, which are afterwards read and grouped one shard at a time.
+
+        Events without the key attribute, e.g. link events, are skipped.
+
+    :param filepath path to the events file
+    :param types event types to read. Can be an iterable, or comma-separated string.
+    :param key attribute identifying the person
+    :param memory_budget approximate number of bytes used to buffer events, see :data:`EVENT_SIZE_ESTIMATE`
+    :param n_shards number of shards. One shard needs to fit into memory when it is grouped.
+    :param tmpdir directory for the temporary files, default uses the system's temporary directory
+    :param func optional function f(person_id, events) applied to each group, its result replaces the events
+    :param workers apply func in a process pool with this many processes, each processing whole shards.
+        func needs to be picklable, i.e. defined at module level.
+    :param kwargs further arguments passed to :func:`matsim.Events.event_reader`
+    :returns generator of (person_id, events) in time order, or (person_id, func result)
+    :rtype Iterable[tuple[str, list]]
+    """
+    from ..Events import event_reader
+
+    if workers is not None and workers > 1 and func is None:
+        raise ValueError("A process pool requires a function to apply")
+
+    max_events = max(1, memory_budget // EVENT_SIZE_ESTIMATE)
+
+    with tempfile.TemporaryDirectory(prefix="matsim-groups-", dir=tmpdir) as directory:
+        shards = [[] for _ in range(n_shards)]
+        paths = [os.path.join(directory, "shard-%05d.pkl" % i) for i in range(n_shards)]
+        buffered = 0
+        spilled = False
+
+        for event in event_reader(filepath, types=types, **kwargs):
+            person = event.get(key)
+            if person is None:
+                continue
+
+            shards[_shard(person, n_shards)].append(event)
+            buffered += 1
+
+            if buffered >= max_events:
+                _spill(shards, paths)
+                buffered = 0
+                spilled = True
+
+        if spilled:
+            _spill(shards, paths)
+            sources = [p for p in paths if os.path.exists(p)]
+            load = _load_shard
+        else:
+            # everything fitted into memory
+            sources = [s for s in shards if s]
+            load = _group
+
+        if workers is not None and workers > 1:
+            yield from _apply_parallel(sources, load, key, func, workers)
+            return
+
+        for source in sources:
+            yield from _apply(load(source, key), func)
+            if not spilled:
+                source.clear()
+
+
+def _shard(person, n_shards):
+    """ Stable shard of a person, independent of the hash seed of the interpreter """
+    return zlib.crc32(person.encode('utf-8')) % n_shards
+
+
+def _spill(shards, paths):
+    """ Append the buffered events of each shard as one run to its file """
+    for events, path in zip(shards, paths):
+        if events:
+            with open(path, 'ab') as f:
+                pickle.dump(events, f, protocol=pickle.HIGHEST_PROTOCOL)
+            events.clear()
+
+
+def _group(events, key):
+    """ Group events by person, keeping their order """
+    groups = {}
+    for event in events:
+        person = event[key]
+        group = groups.get(person)
+        if group is None:
+            groups[person] = [event]
+        else:
+            group.append(event)
+
+    return groups
+
+
+def _load_shard(path, key):
+    """ Read all runs of a shard. Runs were written in file order, so reading them in sequence keeps the order. """
+    groups = {}
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                events = pickle.load(f)
+            except EOFError:
+                break
+
+            for person, group in _group(events, key).items():
+                existing = groups.get(person)
+                if existing is None:
+                    groups[person] = group
+                else:
+                    existing.extend(group)
+
+    return groups
+
+
+def _apply(groups, func):
+    if func is None:
+        yield from groups.items()
+    else:
+        for person, events in groups.items():
+            yield person, func(person, events)
+
+
+def _process_shard(source, load, key, func):
+    return list(_apply(load(source, key), func))
+
+
+def _apply_parallel(sources, load, key, func, workers):
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(_process_shard, sources, [load] * len(sources), [key] * len(sources),
+                               [func] * len(sources)):
+            yield from result
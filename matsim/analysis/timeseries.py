@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+from .utils import CodeMap, time_bins, type_mask
+
+
+class _Series:
+    """ Definition and accumulated values of one time series """
+
+    def __init__(self, types, by, value):
+        from ..Events import _event_filter
+
+        self.types = _event_filter(types)
+        self.by = [by] if isinstance(by, str) else list(by or [])
+        self.value = value
+        self.value_map = CodeMap(_to_float, dtype=np.float64, missing=np.nan) if value else None
+
+        # (bin, *group values) -> [count, sum]
+        self.totals = {}
+
+
+def _to_float(v):
+    try:
+        return float(v)
+    except ValueError:
+        return np.nan
+
+
+class TimeSeries:
+    """ Aggregates events into time series of counts, and optionally sums of an attribute, per time bin and group.
+        Any number of series is computed in one pass, each with its own event types and grouping attributes.
+
+        Register it as batch handler at :class:`matsim.EventsManager.EventsManager`, or use :func:`time_series`::
+
+            ts = TimeSeries(bin_size=900)
+            ts.add('departures', types='departure', by='legMode')
+            ts.add('activities', types='actstart', by='actType')
+            ts.add('money', types='personMoney', by='purpose', value='amount')
+
+    :param bin_size size of the time bins in seconds
+    :param n_bins number of time bins, later events are counted in the last bin
+    """
+
+    def __init__(self, bin_size=900, n_bins=120):
+        self.bin_size = bin_size
+        self.n_bins = n_bins
+        self.series = {}
+
+    def add(self, name, types=None, by=None, value=None):
+        """ Define a time series.
+
+        :param name name of the series
+        :param types event types counted. Can be an iterable, or comma-separated string. Default None counts all.
+        :param by attribute or list of attributes to group by, e.g. 'legMode'
+        :param value numeric attribute that is summed up per group, e.g. 'amount'
+        """
+        self.series[name] = _Series(types, by, value)
+        return self
+
+    @property
+    def types(self):
+        types = set()
+        for s in self.series.values():
+            if s.types is None:
+                return None
+            types |= s.types
+        return types
+
+    @property
+    def columns(self):
+        columns = {}
+        for s in self.series.values():
+            columns.update(dict.fromkeys(s.by))
+            if s.value:
+                columns[s.value] = None
+        return list(columns)
+
+    def handle_batch(self, batch):
+        bins = time_bins(batch.time, self.bin_size, self.n_bins)
+
+        for s in self.series.values():
+            mask = type_mask(batch, s.types) if s.types is not None else np.ones(len(batch), dtype=bool)
+            if not mask.any():
+                continue
+
+            keys = np.stack([bins[mask]] + [batch[c][mask] for c in s.by])
+            unique, inverse = np.unique(keys, axis=1, return_inverse=True)
+            inverse = inverse.reshape(-1)
+
+            counts = np.bincount(inverse, minlength=unique.shape[1])
+            if s.value:
+                values = s.value_map(batch[s.value][mask], batch.dictionaries[s.value])
+                sums = np.bincount(inverse, weights=np.nan_to_num(values), minlength=unique.shape[1])
+            else:
+                sums = np.zeros(len(counts))
+
+            # only the distinct groups of this batch are handled individually
+            decoded = [unique[0].tolist()] + [batch.dictionaries[c].decode(unique[i + 1]).tolist()
+                                              for i, c in enumerate(s.by)]
+            for key, n, v in zip(zip(*decoded), counts.tolist(), sums.tolist()):
+                total = s.totals.get(key)
+                if total is None:
+                    s.totals[key] = [n, v]
+                else:
+                    total[0] += n
+                    total[1] += v
+
+    def to_dataframe(self, name):
+        """ Tidy DataFrame of one series with columns time, the grouping attributes, count and the value sum """
+        s = self.series[name]
+        columns = ['time'] + s.by + ['count'] + ([s.value] if s.value else [])
+
+        rows = [(b * self.bin_size, *key, n) + ((v,) if s.value else ()) for (b, *key), (n, v) in s.totals.items()]
+        df = pd.DataFrame(rows, columns=columns)
+        return df.sort_values(['time'] + s.by, na_position='last', ignore_index=True)
+
+    def to_dataframes(self):
+        """ All series as dictionary of tidy DataFrames """
+        return {name: self.to_dataframe(name) for name in self.series}
+
+
+def time_series(filepath, series, bin_size=900, n_bins=120, batch_size=65536):
+    """ Read an events file and aggregate time series, see :class:`TimeSeries`.
+
+    :param series dictionary of series names to keyword arguments of :meth:`TimeSeries.add`,
+        e.g. ``{'departures': {'types': 'departure', 'by': 'legMode'}}``
+    :returns dictionary of series names to tidy DataFrames
+    """
+    from ..Events import event_reader_batches
+
+    ts = TimeSeries(bin_size, n_bins)
+    for name, kwargs in series.items():
+        ts.add(name, **kwargs)
+
+    for batch in event_reader_batches(filepath, types=ts.types, columns=ts.columns, batch_size=batch_size):
+        ts.handle_batch(batch)
+
+    return ts.to_dataframes()
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+from .utils import CodeMap, IdIndex, time_bins, scatter_add
+
+_ENTER, _LEAVE, _OTHER = 0, 1, 2
+
+
+class LinkTravelTimes:
+    """ Pairs 'entered link' and 'left link' events of each vehicle and aggregates the link travel times
+        per link and time bin of entering. Vehicles that leave traffic on a link do not produce a travel time.
+
+        Only one open entry per vehicle is held, in arrays indexed by the vehicle dictionary code.
+        Register it as batch handler at :class:`matsim.EventsManager.EventsManager`, or use :func:`link_travel_times`.
+
+    :param network :class:`matsim.Network.Network` defining the link index, needed for freespeed and congestion
+    :param bin_size size of the time bins in seconds
+    :param n_bins number of time bins, later events are counted in the last bin
+    :param percentiles travel time percentiles to compute. This requires to keep every travel time
+        (12 bytes per link traversal) until the results are computed.
+    """
+
+    types = {'entered link', 'left link', 'vehicle leaves traffic', 'vehicle aborts'}
+    columns = ['link', 'vehicle']
+
+    def __init__(self, network=None, bin_size=900, n_bins=120, percentiles=None):
+        self.network = network
+        self.bin_size = bin_size
+        self.n_bins = n_bins
+        self.percentiles = list(percentiles) if percentiles else []
+
+        self.links = IdIndex(network.links.link_id if network is not None else None)
+        self.count = np.zeros((len(self.links), n_bins), dtype=np.int64)
+        self.sum = np.zeros((len(self.links), n_bins), dtype=np.float64)
+        self.min = np.full((len(self.links), n_bins), np.inf)
+        self.max = np.full((len(self.links), n_bins), -np.inf)
+
+        # open entries, indexed by vehicle code
+        self.open_link = np.full(0, -1, dtype=np.int32)
+        self.open_time = np.zeros(0, dtype=np.float64)
+
+        self._samples = []
+        self._link_map = CodeMap(self.links)
+        self._type_map = CodeMap(lambda t: _ENTER if t == 'entered link' else _LEAVE if t == 'left link' else _OTHER)
+        self._vehicles = None
+
+    def handle_batch(self, batch):
+        vehicles = batch.dictionaries['vehicle']
+        if vehicles is not self._vehicles:
+            self._vehicles = vehicles
+            self.open_link = np.full(0, -1, dtype=np.int32)
+            self.open_time = np.zeros(0, dtype=np.float64)
+
+        kind = self._type_map(batch['type'], batch.dictionaries['type'])
+        veh = batch['vehicle']
+
+        keep = veh >= 0
+        veh = veh[keep]
+        kind = kind[keep]
+        time = batch.time[keep]
+        link = self._link_map(batch['link'], batch.dictionaries['link'])[keep]
+
+        self._grow(len(vehicles))
+
+        # group events by vehicle, keeping their order
+        order = np.lexsort((np.arange(len(veh)), veh))
+        v, k, t, li = veh[order], kind[order], time[order], link[order]
+
+        first = np.r_[True, v[1:] != v[:-1]] if len(v) else np.zeros(0, dtype=bool)
+        last = np.r_[v[1:] != v[:-1], True] if len(v) else np.zeros(0, dtype=bool)
+
+        # previous event of the same vehicle, the first one of each vehicle comes from the open entries
+        prev_kind = np.r_[_OTHER, k[:-1]] if len(k) else k
+        prev_link = np.r_[-1, li[:-1]] if len(li) else li
+        prev_time = np.r_[0.0, t[:-1]] if len(t) else t
+
+        opened = self.open_link[v[first]]
+        prev_kind[first] = np.where(opened >= 0, _ENTER, _OTHER)
+        prev_link[first] = opened
+        prev_time[first] = self.open_time[v[first]]
+
+        pair = (k == _LEAVE) & (prev_kind == _ENTER) & (prev_link == li) & (li >= 0)
+        self._add(li[pair], prev_time[pair], t[pair] - prev_time[pair])
+
+        # remember the last event of each vehicle, if it entered a link
+        vl = v[last]
+        self.open_link[vl] = np.where(k[last] == _ENTER, li[last], -1)
+        self.open_time[vl] = t[last]
+
+    def _grow(self, n):
+        if n > len(self.open_link):
+            size = max(n, 2 * len(self.open_link))
+            self.open_link = np.concatenate((self.open_link, np.full(size - len(self.open_link), -1, dtype=np.int32)))
+            self.open_time = np.concatenate((self.open_time, np.zeros(size - len(self.open_time))))
+
+        if len(self.links) > len(self.count):
+            pad = ((0, len(self.links) - len(self.count)), (0, 0))
+            self.count = np.pad(self.count, pad)
+            self.sum = np.pad(self.sum, pad)
+            self.min = np.pad(self.min, pad, constant_values=np.inf)
+            self.max = np.pad(self.max, pad, constant_values=-np.inf)
+
+    def _add(self, links, enter_time, tt):
+        if len(links) == 0:
+            return
+
+        bins = time_bins(enter_time, self.bin_size, self.n_bins)
+        flat = links.astype(np.int64) * self.n_bins + bins
+
+        scatter_add(self.count, flat)
+        scatter_add(self.sum, flat, tt)
+        np.minimum.at(self.min.reshape(-1), flat, tt)
+        np.maximum.at(self.max.reshape(-1), flat, tt)
+
+        if self.percentiles:
+            self._samples.append((flat, tt.astype(np.float32)))
+
+    def mean(self):
+        """ Mean travel time as links x bins matrix, NaN where no vehicle traversed the link """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 0, self.sum / self.count, np.nan)
+
+    def freespeed_travel_time(self):
+        """ Freespeed travel time of each link, requires the network """
+        if self.network is None:
+            raise ValueError("Freespeed travel times require a network")
+
+        links = self.network.links
+        return (links.length / links.freespeed).to_numpy()
+
+    def travel_time_matrix(self, min_count=1, dtype=np.float32):
+        """ Mean travel times as dense links x bins matrix, usable as time-dependent link costs.
+            Cells with less than min_count observations are filled with the freespeed travel time. """
+        tt = self.mean()
+        free = np.broadcast_to(self.freespeed_travel_time()[:, None], tt.shape)
+        return np.where(self.count >= min_count, np.maximum(tt, free), free).astype(dtype)
+
+    def to_dataframe(self):
+        """ Tidy DataFrame with one row per link and time bin with observations.
+            With network, freespeed travel time, speed and congestion ratio (mean / freespeed travel time) are added.
+        """
+        link, b = np.nonzero(self.count)
+        flat = link * self.n_bins + b
+
+        df = pd.DataFrame({
+            'link_id': np.asarray(self.links.ids, dtype=object)[link],
+            'time': b * self.bin_size,
+            'count': self.count[link, b],
+            'mean': self.sum[link, b] / self.count[link, b],
+            'min': self.min[link, b],
+            'max': self.max[link, b],
+        })
+
+        if self.percentiles:
+            values = self._percentiles(flat)
+            for i, p in enumerate(self.percentiles):
+                df['p%g' % p] = values[:, i]
+
+        if self.network is not None:
+            length = self.network.links.length.to_numpy()[link]
+            df['freespeed_tt'] = self.freespeed_travel_time()[link]
+            df['speed'] = length / df['mean']
+            df['congestion'] = df['mean'] / df['freespeed_tt']
+
+        return df
+
+    def _percentiles(self, cells):
+        """ Percentiles of the given cells, which need to be sorted """
+        flat = np.concatenate([f for f, _ in self._samples])
+        tt = np.concatenate([t for _, t in self._samples])
+
+        order = np.lexsort((tt, flat))
+        flat, tt = flat[order], tt[order]
+
+        start = np.searchsorted(flat, cells, side='left')
+        end = np.searchsorted(flat, cells, side='right')
+
+        result = np.empty((len(cells), len(self.percentiles)))
+        for i, p in enumerate(self.percentiles):
+            # linear interpolation between the closest ranks, same as numpy's default
+            pos = start + (end - start - 1) * (p / 100)
+            lo = np.floor(pos).astype(np.int64)
+            hi = np.minimum(lo + 1, end - 1)
+            result[:, i] = tt[lo] + (tt[hi] - tt[lo]) * (pos - lo)
+
+        return result
+
+
+def link_travel_times(filepath, network=None, bin_size=900, n_bins=120, percentiles=None, batch_size=65536):
+    """ Read an events file and compute link travel times per time bin, see :class:`LinkTravelTimes`.
+
+    :returns the analyzer, use :meth:`LinkTravelTimes.to_dataframe` or :meth:`LinkTravelTimes.travel_time_matrix`
+    """
+    from ..Events import event_reader_batches
+
+    tt = LinkTravelTimes(network, bin_size, n_bins, percentiles)
+    for batch in event_reader_batches(filepath, types=tt.types, columns=tt.columns, batch_size=batch_size):
+        tt.handle_batch(batch)
+
+    return tt
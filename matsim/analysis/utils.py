@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+
+class CodeMap:
+    """ Maps the codes of a growing :class:`matsim.Events.Dictionary` to another integer index.
+        The mapping of new dictionary entries is computed lazily, each value is only looked up once.
+
+    :param func function mapping a dictionary value to the target index, or -1 if it has none
+    :param dtype type of the target values, e.g. float64 to parse numeric attributes
+    :param missing target value of missing attributes
+    """
+
+    def __init__(self, func, dtype=np.int32, missing=-1):
+        self.func = func
+        self.dtype = dtype
+        self.missing = missing
+        self.dictionary = None
+        # the last element maps the missing value code -1
+        self.mapping = np.full(1, missing, dtype=dtype)
+
+    def __call__(self, codes, dictionary):
+        if dictionary is not self.dictionary:
+            self.dictionary = dictionary
+            self.mapping = np.full(1, self.missing, dtype=self.dtype)
+
+        n = len(self.mapping) - 1
+        if len(dictionary) > n:
+            new = np.fromiter((self.func(v) for v in dictionary.values[n:]), dtype=self.dtype,
+                              count=len(dictionary) - n)
+            self.mapping = np.concatenate((self.mapping[:-1], new, self.mapping[-1:]))
+
+        return self.mapping[codes]
+
+
+class IdIndex:
+    """ Dense integer index of string ids. Ids are either given in advance, or added as they are seen. """
+
+    def __init__(self, ids=None):
+        self.fixed = ids is not None
+        self.ids = list(ids) if ids is not None else []
+        self.index = {v: i for i, v in enumerate(self.ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __call__(self, value):
+        i = self.index.get(value)
+        if i is None:
+            if self.fixed:
+                return -1
+            i = self.index[value] = len(self.ids)
+            self.ids.append(value)
+        return i
+
+
+def vehicle_filter(vehicles, vehicle_types=None, modes=None):
+    """ Create a function returning whether a vehicle id passes the type and mode filter, or None if no filter is set.
+
+    :param vehicles :class:`matsim.Vehicle.Vehicle` or mapping of vehicle id to vehicle type id
+    :param vehicle_types vehicle type ids to keep
+    :param modes network modes to keep, requires vehicle types with networkMode
+    """
+    if vehicle_types is None and modes is None:
+        return None
+
+    if vehicles is None:
+        raise ValueError("Filtering by vehicle type or mode requires the vehicles")
+
+    if hasattr(vehicles, 'vehicles'):
+        types = dict(zip(vehicles.vehicles['id'], vehicles.vehicles['type']))
+        type_modes = dict(zip(vehicles.vehicle_types['id'], vehicles.vehicle_types.get('networkMode', [])))
+    else:
+        types = dict(vehicles)
+        type_modes = {}
+
+    allowed = set(types.values()) if vehicle_types is None else set(vehicle_types)
+    if modes is not None:
+        modes = set(modes)
+        allowed = {t for t in allowed if type_modes.get(t) in modes}
+
+    return lambda v: types.get(v) in allowed
+
+
+def time_bins(time, bin_size, n_bins):
+    """ Bin index of each time, times after the last bin are counted in it """
+    return np.clip((time // bin_size).astype(np.int64), 0, n_bins - 1)
+
+
+def scatter_add(matrix, flat, weights=None):
+    """ Add the number of occurrences of each flat cell index, or the sum of their weights, to a matrix.
+        Only these cells are touched, the cost does not depend on the size of the matrix. """
+    if len(flat) == 0:
+        return
+
+    cells, inverse = np.unique(flat, return_inverse=True)
+    matrix.reshape(-1)[cells] += np.bincount(inverse, weights=weights, minlength=len(cells))
+
+
+def type_mask(batch, types):
+    """ Boolean mask of the batch rows that have one of the given types """
+    index = batch.dictionaries['type'].index
+    codes = [index[t] for t in types if t in index]
+    return np.isin(batch['type'], codes)
+
+
+class HyperLogLog:
+    """ Approximate distinct counter with a relative error of about 1.04 / sqrt(2^precision).
+        Values are hashed with blake2b, so estimates are reproducible across processes and runs.
+        Counters with the same precision can be merged, e.g. after counting partitions in parallel.
+
+    :param precision number of bits used to select a register, 2^precision registers of one byte are used
+    """
+
+    def __init__(self, precision=14):
+        if not 4 <= precision <= 18:
+            raise ValueError("Precision must be between 4 and 18")
+
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, values):
+        """ Add an iterable of str or bytes values. Passing each distinct value only once is the fastest. """
+        from hashlib import blake2b
+
+        p = self.precision
+        bits = 64 - p
+        mask = (1 << bits) - 1
+
+        index = []
+        rank = []
+        for v in values:
+            if isinstance(v, str):
+                v = v.encode('utf-8')
+            h = int.from_bytes(blake2b(v, digest_size=8).digest(), 'little')
+            index.append(h >> bits)
+            # position of the first set bit in the remaining bits
+            rank.append(bits - (h & mask).bit_length() + 1)
+
+        if index:
+            np.maximum.at(self.registers, np.array(index, dtype=np.int64), np.array(rank, dtype=np.uint8))
+
+    def merge(self, other):
+        """ Merge the counts of another counter into this one """
+        if other.precision != self.precision:
+            raise ValueError("Can only merge counters with the same precision")
+
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def __len__(self):
+        return int(round(self.estimate()))
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        e = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int32)))
+
+        zeros = np.count_nonzero(self.registers == 0)
+        if e <= 2.5 * m and zeros > 0:
+            # linear counting is more accurate for small cardinalities
+            e = m * np.log(m / zeros)
+
+        return float(e)
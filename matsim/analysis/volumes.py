@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+from .utils import CodeMap, IdIndex, vehicle_filter, time_bins, type_mask, scatter_add
+
+
+class LinkVolumes:
+    """ Counts 'entered link' events per link and time bin into a dense links x bins matrix.
+        Register it as batch handler at :class:`matsim.EventsManager.EventsManager`, or use :func:`link_volumes`.
+
+    :param network :class:`matsim.Network.Network` defining the link index. Without network, links are indexed
+        in the order they are seen.
+    :param bin_size size of the time bins in seconds
+    :param n_bins number of time bins, later events are counted in the last bin
+    :param vehicles :class:`matsim.Vehicle.Vehicle` or mapping of vehicle id to type, needed for the filters
+    :param vehicle_types only count vehicles of these types
+    :param modes only count vehicles whose type has one of these network modes
+    """
+
+    types = {'entered link'}
+    columns = ['link', 'vehicle']
+
+    def __init__(self, network=None, bin_size=3600, n_bins=30, vehicles=None, vehicle_types=None, modes=None):
+        self.bin_size = bin_size
+        self.n_bins = n_bins
+        self.links = IdIndex(network.links.link_id if network is not None else None)
+        self.counts = np.zeros((len(self.links), n_bins), dtype=np.int64)
+
+        self._link_map = CodeMap(self.links)
+
+        accept = vehicle_filter(vehicles, vehicle_types, modes)
+        self._vehicle_map = CodeMap(lambda v: 1 if accept(v) else -1) if accept else None
+
+    def handle_batch(self, batch):
+        mask = type_mask(batch, self.types)
+
+        links = self._link_map(batch['link'], batch.dictionaries['link'])
+        mask &= links >= 0
+
+        if self._vehicle_map is not None:
+            mask &= self._vehicle_map(batch['vehicle'], batch.dictionaries['vehicle']) >= 0
+
+        if len(self.links) > len(self.counts):
+            self.counts = np.pad(self.counts, ((0, len(self.links) - len(self.counts)), (0, 0)))
+
+        bins = time_bins(batch.time[mask], self.bin_size, self.n_bins)
+        flat = links[mask].astype(np.int64) * self.n_bins + bins
+        scatter_add(self.counts, flat)
+
+    def to_dataframe(self):
+        """ Volumes as DataFrame with link ids as index and the start time of each bin as columns """
+        return pd.DataFrame(self.counts, index=pd.Index(self.links.ids, name='link_id'),
+                            columns=np.arange(self.n_bins) * self.bin_size)
+
+    def tidy(self):
+        """ Volumes in long format with columns link_id, time, count. Only non-zero counts are included. """
+        link, b = np.nonzero(self.counts)
+        return pd.DataFrame({'link_id': np.asarray(self.links.ids, dtype=object)[link], 'time': b * self.bin_size,
+                             'count': self.counts[link, b]})
+
+
+def link_volumes(filepath, network=None, bin_size=3600, n_bins=30, vehicles=None, vehicle_types=None, modes=None,
+                 batch_size=65536):
+    """ Read an events file and compute link volumes per time bin, see :class:`LinkVolumes`.
+
+    :returns DataFrame with link ids as index and the start time of each bin as columns
+    """
+    from ..Events import event_reader_batches
+
+    volumes = LinkVolumes(network, bin_size, n_bins, vehicles, vehicle_types, modes)
+    for batch in event_reader_batches(filepath, types=volumes.types, columns=volumes.columns, batch_size=batch_size):
+        volumes.handle_batch(batch)
+
+    return volumes.to_dataframe()
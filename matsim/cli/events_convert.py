@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    Command line tool to convert events into Parquet files. See help usage for details:
+    >> python3 -m matsim.cli.events_convert -h
+"""
+
+import json
+import os
+from argparse import ArgumentParser
+from urllib.parse import quote
+
+import numpy as np
+
+METADATA = "events-convert", "Convert events into Parquet files partitioned by event type and hour"
+
+# Name of the file storing the conversion progress
+PROGRESS_FILE = "_progress.json"
+
+
+def setup(parser: ArgumentParser):
+    parser.add_argument("input", help="Events file (xml, pb or ndjson)")
+    parser.add_argument("output", help="Output directory")
+    parser.add_argument("--types", default=None, help="Comma-separated event types to convert, default is all")
+    parser.add_argument("--columns", default="link,person,vehicle",
+                        help="Comma-separated event attributes to store, time is always included")
+    parser.add_argument("--buffer-rows", type=int, default=5_000_000,
+                        help="Number of events kept in memory before all partitions are written")
+    parser.add_argument("--resume", action='store_true', default=False,
+                        help="Continue an interrupted conversion into the same output directory")
+
+
+def main(args):
+    n = convert(args.input, args.output, types=args.types, columns=args.columns,
+                buffer_rows=args.buffer_rows, resume=args.resume)
+
+    print("Converted %d events into %s" % (n, args.output))
+    print("Read with e.g. pyarrow.dataset.dataset('%s', partitioning='hive')" % args.output)
+
+
+def convert(input, output, types=None, columns="link,person,vehicle", buffer_rows=5_000_000, resume=False):
+    """ Convert an events file into a Parquet dataset, which is partitioned as type=<type>/hour=<hour>.
+        Attribute columns are stored dictionary encoded, the type and hour are given by the partition.
+
+        Events are buffered up to buffer_rows, then all partitions are written as one checkpoint.
+        After each checkpoint the progress is stored, so that an interrupted conversion can be resumed.
+
+    :returns number of converted events
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    from ..Events import event_reader_batches
+
+    os.makedirs(output, exist_ok=True)
+
+    stat = os.stat(input)
+    source = {"input": os.path.abspath(input), "size": stat.st_size, "mtime": int(stat.st_mtime),
+              "types": types, "columns": columns}
+
+    progress = {"source": source, "events": 0, "checkpoint": 0, "files": []}
+    if resume:
+        progress = _load_progress(output, source) or progress
+
+    _remove_uncommitted(output, progress["files"])
+
+    skip = progress["events"]
+    buffers = {}
+    buffered = 0
+    n = 0
+
+    def checkpoint():
+        files = []
+        for (ev_type, hour), parts in sorted(buffers.items()):
+            directory = os.path.join(output, "type=" + quote(ev_type, safe=""), "hour=%d" % hour)
+            os.makedirs(directory, exist_ok=True)
+
+            path = os.path.join(directory, "part-%05d.parquet" % progress["checkpoint"])
+            pq.write_table(_to_table(pa, parts, dictionaries), path + ".tmp")
+            os.replace(path + ".tmp", path)
+            files.append(os.path.relpath(path, output))
+
+        buffers.clear()
+        progress["files"].extend(files)
+        progress["events"] = n
+        progress["checkpoint"] += 1
+        _store_progress(output, progress)
+
+    dictionaries = None
+    for batch in event_reader_batches(input, types=types, columns=columns, batch_size=min(65536, buffer_rows)):
+        dictionaries = batch.dictionaries
+
+        # events that have already been written before the interruption
+        if n + len(batch) <= skip:
+            n += len(batch)
+            continue
+
+        offset = max(0, skip - n)
+        n += len(batch)
+
+        time = batch.time[offset:]
+        codes = {c: v[offset:] for c, v in batch.codes.items()}
+        hours = (time // 3600).astype(np.int32)
+
+        # sort by partition, so that each partition is one contiguous slice
+        order = np.lexsort((hours, codes["type"]))
+        keys = np.stack((codes["type"][order], hours[order]))
+        bounds = np.flatnonzero(np.any(keys[:, 1:] != keys[:, :-1], axis=0)) + 1
+
+        type_values = dictionaries["type"].values
+        for s, e in zip(np.r_[0, bounds], np.r_[bounds, len(order)]):
+            idx = order[s:e]
+            key = (type_values[keys[0, s]], int(keys[1, s]))
+            buffers.setdefault(key, []).append((time[idx], {c: v[idx] for c, v in codes.items() if c != "type"}))
+
+        buffered += len(time)
+        if buffered >= buffer_rows:
+            checkpoint()
+            buffered = 0
+
+    if buffers or n > progress["events"]:
+        checkpoint()
+
+    return n
+
+
+def _to_table(pa, parts, dictionaries):
+    """ Create a table with dictionary encoded columns, only containing the values used in this part """
+    time = np.concatenate([t for t, _ in parts])
+    arrays = [pa.array(time, type=pa.float64())]
+    names = ["time"]
+
+    for c in parts[0][1]:
+        codes = np.concatenate([p[c] for _, p in parts])
+        used, indices = np.unique(codes, return_inverse=True)
+
+        missing = used < 0
+        if missing.any():
+            # -1 is sorted first and marks missing values
+            indices = indices - 1
+            used = used[1:]
+
+        values = dictionaries[c].decode(used)
+        indices = pa.array(indices.astype(np.int32), mask=indices < 0, type=pa.int32())
+        arrays.append(pa.DictionaryArray.from_arrays(indices, pa.array(values, type=pa.string())))
+        names.append(c)
+
+    return pa.Table.from_arrays(arrays, names=names)
+
+
+def _load_progress(output, source):
+    path = os.path.join(output, PROGRESS_FILE)
+    if not os.path.exists(path):
+        return None
+
+    with open(path) as f:
+        progress = json.load(f)
+
+    if progress["source"] != source:
+        raise ValueError("Output %s belongs to a different conversion, can not resume" % output)
+
+    return progress
+
+
+def _store_progress(output, progress):
+    path = os.path.join(output, PROGRESS_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(progress, f)
+
+    os.replace(path + ".tmp", path)
+
+
+def _remove_uncommitted(output, files):
+    """ Remove parquet files in the partition directories that have been written after the last checkpoint """
+    committed = set(files)
+    for dirpath, _, filenames in os.walk(output):
+        if not os.path.relpath(dirpath, output).startswith("type="):
+            continue
+
+        for name in filenames:
+            path = os.path.relpath(os.path.join(dirpath, name), output)
+            if (name.endswith(".parquet") or name.endswith(".tmp")) and path not in committed:
+                os.remove(os.path.join(dirpath, name))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(prog=METADATA[0], description=METADATA[1])
+
+    setup(parser)
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    Command line tool to summarize an events file. See help usage for details:
+    >> python3 -m matsim.cli.events_stats -h
+"""
+
+import json
+import os
+import re
+from argparse import ArgumentParser
+from collections import Counter
+from html import unescape
+
+import numpy as np
+
+METADATA = "events-stats", "Count events per type, time range and distinct persons, vehicles and links"
+
+# Attributes whose distinct values are counted
+DISTINCT = ("person", "vehicle", "link")
+
+# Number of uncompressed bytes scanned per task
+CHUNK_SIZE = 1 << 24
+
+# Patterns matching the layout MATSim writes, where time and type are the first attributes and attributes are
+# separated by a single space. They start with a literal, which is searched much faster by the regex engine.
+_PATTERNS = {
+    "xml": {
+        "event": re.compile(rb'<event time="([^"]*)" type="([^"]*)"'),
+        "sentinel": b'<event ',
+        **{a: re.compile(rb' ' + a.encode() + rb'="([^"]*)"') for a in DISTINCT}
+    },
+    "ndjson": {
+        "event": re.compile(rb'{"time":"([^"]*)","type":"([^"\\]*(?:\\.[^"\\]*)*)"'),
+        "sentinel": b'"type"',
+        **{a: re.compile(rb'"' + a.encode() + rb'":"([^"\\]*(?:\\.[^"\\]*)*)"') for a in DISTINCT}
+    }
+}
+
+# Slower patterns for files with a different layout
+_FALLBACK = {
+    "xml": (re.compile(rb'<event\s[^>]*>'), re.compile(rb'\stime="([^"]*)"'), re.compile(rb'\stype="([^"]*)"')),
+    "ndjson": (re.compile(rb'[^\n]+'), re.compile(rb'"time"\s*:\s*"?([^",}\s]+)'),
+               re.compile(rb'"type"\s*:\s*"((?:[^"\\]|\\.)*)"'))
+}
+
+
+def setup(parser: ArgumentParser):
+    parser.add_argument("input", help="Events file (xml or ndjson, pb is read without the byte-level scanner)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes, default is the number of cpus")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Uncompressed bytes scanned per task")
+    parser.add_argument("--precision", type=int, default=14,
+                        help="Precision of the distinct counters, the relative error is about 1.04 / sqrt(2^p)")
+    parser.add_argument("--json", action='store_true', default=False, help="Print the statistics as json")
+
+
+def main(args):
+    stats = event_stats(args.input, workers=args.workers, chunk_size=args.chunk_size, precision=args.precision)
+
+    if args.json:
+        print(json.dumps(stats, indent=2))
+        return
+
+    print("Events: %d" % stats["events"])
+    print("Time range: %s - %s" % tuple(stats["time_range"] or (None, None)))
+    for a in DISTINCT:
+        print("Distinct %s: ~%d" % (a, stats["distinct"][a]))
+
+    print("Events per type:")
+    for t, n in sorted(stats["types"].items(), key=lambda x: -x[1]):
+        print("  %-40s %d" % (t, n))
+
+
+def event_stats(filepath, workers=None, chunk_size=CHUNK_SIZE, precision=14, io_options=None):
+    """ Summarize an events file by scanning the raw bytes, without parsing the events.
+        Chunks are scanned in a process pool, distinct values are counted approximately with HyperLogLog.
+
+    :param io_options options of the decompression, see :func:`matsim.utils.open_file`
+    :returns dictionary with number of events, counts per type, time range and distinct counts of
+        persons, vehicles and links
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from ..utils import events_format, bounded_map
+
+    filepath = str(filepath)
+    workers = workers or os.cpu_count()
+
+    total = _Stats(precision)
+    fmt = events_format(filepath)
+    if fmt == "pb":
+        _scan_pb(filepath, total, io_options)
+        return total.to_dict()
+
+    if workers <= 1:
+        for chunk in _chunks(filepath, fmt, chunk_size, io_options):
+            total.merge(_scan_chunk(chunk, fmt, precision))
+        return total.to_dict()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunks = _chunks(filepath, fmt, chunk_size, io_options)
+        tasks = ((None, (chunk, fmt, precision)) for chunk in chunks)
+        for _, stats in bounded_map(pool, _scan_chunk, tasks, workers):
+            total.merge(stats)
+
+    return total.to_dict()
+
+
+class _Stats:
+    """ Partial statistics of a part of the file, which can be merged """
+
+    def __init__(self, precision):
+        from ..analysis.utils import HyperLogLog
+
+        self.types = Counter()
+        self.min_time = None
+        self.max_time = None
+        self.distinct = {a: HyperLogLog(precision) for a in DISTINCT}
+
+    def add_times(self, times):
+        if len(times):
+            lo, hi = float(np.min(times)), float(np.max(times))
+            self.min_time = lo if self.min_time is None else min(self.min_time, lo)
+            self.max_time = hi if self.max_time is None else max(self.max_time, hi)
+
+    def merge(self, other):
+        self.types.update(other.types)
+        if other.min_time is not None:
+            self.add_times([other.min_time, other.max_time])
+        for a in DISTINCT:
+            self.distinct[a].merge(other.distinct[a])
+
+    def to_dict(self):
+        return {
+            "events": sum(self.types.values()),
+            "types": dict(self.types),
+            "time_range": [self.min_time, self.max_time] if self.min_time is not None else None,
+            "distinct": {a: len(h) for a, h in self.distinct.items()}
+        }
+
+
+def _chunks(filepath, fmt, chunk_size, io_options):
+    from ..Events import _xml_chunks, _read_blocks
+    from ..utils import open_file
+
+    if fmt == "xml":
+        yield from _xml_chunks(filepath, chunk_size, io_options)
+        return
+
+    with open_file(filepath, io_options) as f:
+        yield from _read_blocks(f, b"\n", chunk_size)
+
+
+def _scan_chunk(chunk, fmt, precision):
+    """ Scan one chunk of bytes, or a (path, start, end) range of an uncompressed file """
+    if isinstance(chunk, tuple):
+        path, start, end = chunk
+        with open(path, "rb") as f:
+            f.seek(start)
+            chunk = f.read(end - start)
+
+    patterns = _PATTERNS[fmt]
+    decode = _decode_xml if fmt == "xml" else _decode_json
+
+    events = patterns["event"].findall(chunk)
+    if len(events) != chunk.count(patterns["sentinel"]):
+        events = _scan_fallback(chunk, fmt)
+
+    stats = _Stats(precision)
+    if events:
+        times, types = zip(*events)
+        stats.types.update({decode(t): n for t, n in Counter(types).items()})
+        stats.add_times(np.array(times).astype(np.float64))
+
+    for a in DISTINCT:
+        # raw values are hashed, which only differ from the decoded values if they contain escapes
+        stats.distinct[a].update(set(patterns[a].findall(chunk)))
+
+    return stats
+
+
+def _scan_fallback(chunk, fmt):
+    """ (time, type) of each event, independent of the order of the attributes """
+    element, time, ev_type = _FALLBACK[fmt]
+
+    events = []
+    for m in element.finditer(chunk):
+        t = ev_type.search(m.group(0))
+        if t is not None:
+            events.append((time.search(m.group(0)).group(1), t.group(1)))
+
+    return events
+
+
+def _decode_xml(raw):
+    return unescape(raw.decode("utf-8"))
+
+
+def _decode_json(raw):
+    return json.loads(b'"' + raw + b'"')
+
+
+def _scan_pb(filepath, stats, io_options):
+    """ Protobuf events can not be scanned on the byte level, they are decoded """
+    from ..Events import _convert_pb_event
+    from ..utils import read_pb
+
+    times = []
+    distinct = {a: set() for a in DISTINCT}
+    for ev in read_pb(filepath, io_options=io_options):
+        event = _convert_pb_event(ev)
+        stats.types[event["type"]] += 1
+        times.append(event["time"])
+        for a in DISTINCT:
+            v = event.get(a)
+            if v is not None:
+                distinct[a].add(v)
+
+        if len(times) >= 1 << 20:
+            _flush_pb(stats, times, distinct)
+
+    _flush_pb(stats, times, distinct)
+
+
+def _flush_pb(stats, times, distinct):
+    stats.add_times(times)
+    times.clear()
+    for a in DISTINCT:
+        stats.distinct[a].update(distinct[a])
+        distinct[a].clear()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(prog=METADATA[0], description=METADATA[1])
+
+    setup(parser)
+
+    args = parser.parse_args()
+    main(args)
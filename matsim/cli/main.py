@@ -4,6 +4,8 @@
 from argparse import ArgumentParser
 
 from . import clean_iters as ci
+from . import events_convert as ec
+from . import events_stats as es
 
 def main():
     """ Main entry point. """
@@ -15,6 +17,14 @@ def main():
     ci.setup(s1)
     s1.set_defaults(func=ci.main)
 
+    s2 = subparsers.add_parser(ec.METADATA[0], help=ec.METADATA[1])
+    ec.setup(s2)
+    s2.set_defaults(func=ec.main)
+
+    s3 = subparsers.add_parser(es.METADATA[0], help=es.METADATA[1])
+    es.setup(s3)
+    s3.set_defaults(func=es.main)
+
     args = parser.parse_args()
     args.func(args)
 
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+
+from .graph import Graph, SharedGraph
+from .router import Router, Routes
+from .ch import ContractionHierarchy, contraction_hierarchy
+from .skims import Skims, skims, zone_connectors
@@ -0,0 +1,517 @@
+# -*- coding: utf-8 -*-
+
+import math
+import os
+from heapq import heapify, heappush, heappop
+
+import numpy as np
+
+from .router import Routes, link_costs
+
+# Version of the stored hierarchy, older files are rebuilt
+CH_VERSION = 1
+
+# Suffix of the sidecar file, which is stored next to the network file
+CH_SUFFIX = '.ch.npz'
+
+# Maximum number of nodes settled by a witness search during the preprocessing
+WITNESS_LIMIT = 500
+
+
+class ContractionHierarchy:
+    """ Contraction hierarchy of a network graph, which answers least cost queries much faster than dijkstra.
+
+        The preprocessing contracts the nodes one by one, in the order of their importance. Shortcut edges are
+        inserted wherever a least cost path led through a contracted node. Queries then only need to follow edges
+        towards more important nodes, from both the origin and the destination. Shortcuts are unpacked into
+        the original links when paths are requested.
+
+        Costs are static, e.g. freespeed travel times. Build it with :meth:`build`, or use
+        :func:`contraction_hierarchy` to store and reuse it next to the network file.
+
+    :param graph the :class:`matsim.routing.Graph` the hierarchy was built for
+    :param rank contraction order of each node
+    :param edge_from, edge_to, edge_cost nodes and cost of each edge
+    :param edge_link link index of original edges, -1 for shortcuts
+    :param edge_children the two edges each shortcut consists of, -1 for original edges
+    :param meta dictionary of information on the origin of the hierarchy, used to validate stored files
+    """
+
+    def __init__(self, graph, rank, edge_from, edge_to, edge_cost, edge_link, edge_children, meta=None):
+        self.graph = graph
+        self.rank = np.asarray(rank, dtype=np.int32)
+        self.edge_from = np.asarray(edge_from, dtype=np.int32)
+        self.edge_to = np.asarray(edge_to, dtype=np.int32)
+        self.edge_cost = np.asarray(edge_cost, dtype=np.float64)
+        self.edge_link = np.asarray(edge_link, dtype=np.int32)
+        self.edge_children = np.asarray(edge_children, dtype=np.int32).reshape(-1, 2)
+        self.meta = meta or {}
+
+        if len(self.rank) != graph.n_nodes:
+            raise ValueError("The hierarchy does not belong to this graph")
+
+        self._lists = None
+
+    def __str__(self):
+        return 'ContractionHierarchy: {nodes} nodes, {edges} edges, {shortcuts} shortcuts'.format(
+            nodes=len(self.rank), edges=len(self.edge_from), shortcuts=int((self.edge_link < 0).sum()))
+
+    @classmethod
+    def build(cls, network, cost='freespeed', witness_limit=WITNESS_LIMIT):
+        """ Preprocess the graph of a network.
+
+        :param network :class:`matsim.Network.Network` or :class:`matsim.routing.Graph`
+        :param cost 'freespeed' travel time, 'length' or an array with the cost of each link
+        :param witness_limit maximum number of nodes settled by each witness search. Higher values insert
+            fewer unnecessary shortcuts, but take longer.
+        :rtype ContractionHierarchy
+        """
+        graph = network.to_graph() if hasattr(network, 'to_graph') else network
+        cost = link_costs(graph, cost)
+        if cost.ndim != 1:
+            raise ValueError("Contraction hierarchies require static costs")
+
+        # only the cheapest of parallel links is relevant, loops never are
+        order = np.lexsort((cost, graph.to_node, graph.from_node))
+        f, t = graph.from_node[order], graph.to_node[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (f[1:] != f[:-1]) | (t[1:] != t[:-1])
+        first &= f != t
+        links = order[first]
+
+        rank, edges = _contract(graph.n_nodes, graph.from_node[links].tolist(), graph.to_node[links].tolist(),
+                                cost[links].tolist(), witness_limit)
+
+        edge_from, edge_to, edge_cost, children = edges
+        children = np.array(children, dtype=np.int32).reshape(-1, 2)
+
+        # original edges may have been replaced by cheaper shortcuts
+        edge_link = np.full(len(edge_from), -1, dtype=np.int32)
+        edge_link[:len(links)] = links
+        edge_link[children[:, 0] >= 0] = -1
+
+        return cls(graph, rank, edge_from, edge_to, edge_cost, edge_link, children)
+
+    def save(self, path):
+        """ Store the hierarchy as npz file. The file is replaced atomically, so concurrent readers never
+            see a partial file. """
+        path = str(path)
+        tmp = '%s.%d.tmp' % (path, os.getpid())
+        meta = {k: np.asarray(v) for k, v in self.meta.items()}
+
+        with open(tmp, 'wb') as f:
+            np.savez(f, version=CH_VERSION, n_links=self.graph.n_links, rank=self.rank, edge_from=self.edge_from,
+                     edge_to=self.edge_to, edge_cost=self.edge_cost, edge_link=self.edge_link,
+                     edge_children=self.edge_children, **meta)
+
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, network):
+        """ Load a stored hierarchy.
+
+        :param path path to the npz file
+        :param network the :class:`matsim.Network.Network` or :class:`matsim.routing.Graph` it was built for
+        :rtype ContractionHierarchy
+        """
+        graph = network.to_graph() if hasattr(network, 'to_graph') else network
+
+        with np.load(str(path), allow_pickle=False) as data:
+            if int(data['version']) != CH_VERSION:
+                raise ValueError("Unsupported version of the contraction hierarchy")
+            if int(data['n_links']) != graph.n_links:
+                raise ValueError("The hierarchy does not belong to this graph")
+
+            meta = {k: data[k].item() for k in data.files if k.startswith('meta_')}
+            return cls(graph, data['rank'], data['edge_from'], data['edge_to'], data['edge_cost'], data['edge_link'],
+                       data['edge_children'], meta)
+
+    def route(self, origin, destination):
+        """ Least cost path between two nodes.
+
+        :param origin, destination node ids
+        :returns tuple of the cost, inf if not reachable, and the list of link ids
+        """
+        o, d = self._node_indices([origin, destination])
+        cost, path = self._query(o, d, True)
+        return cost, self.graph.link_ids[path].tolist()
+
+    def route_many(self, origins, destinations, paths=True):
+        """ Route many OD pairs with one bidirectional query each.
+
+        :param origins, destinations node ids, or node indices as integer array
+        :param paths whether to return the paths, otherwise only costs are computed
+        :rtype matsim.routing.Routes
+        """
+        origins = self._node_indices(origins)
+        destinations = self._node_indices(destinations)
+        if len(origins) != len(destinations):
+            raise ValueError("Origins and destinations must have the same length")
+
+        cost = np.empty(len(origins))
+        found = []
+        for i, (o, d) in enumerate(zip(origins.tolist(), destinations.tolist())):
+            cost[i], path = self._query(o, d, paths)
+            found.append(path)
+
+        if not paths:
+            return Routes(self.graph, cost)
+
+        offsets = np.zeros(len(found) + 1, dtype=np.int64)
+        np.cumsum([len(p) for p in found], out=offsets[1:])
+        links = np.fromiter((l for p in found for l in p), dtype=np.int32, count=int(offsets[-1]))
+        return Routes(self.graph, cost, offsets, links)
+
+    def matrix(self, origins, destinations):
+        """ Least costs between all origins and destinations, computed with buckets: the upward search space of
+            each destination is stored at its nodes, and the upward search of each origin only scans these buckets.
+
+        :param origins, destinations node ids, or node indices as integer array
+        :returns origins x destinations array of costs, inf if not reachable
+        """
+        origins = self._node_indices(origins)
+        destinations = self._node_indices(destinations)
+        up_offsets, up_edges, up_to, down_offsets, down_edges, down_from, cost = self._adjacency_lists()
+
+        buckets = {}
+        for j, d in enumerate(destinations.tolist()):
+            dist = _upward(d, down_offsets, down_edges, down_from, cost)
+            for v, c in dist.items():
+                b = buckets.get(v)
+                if b is None:
+                    buckets[v] = b = ([], [])
+                b[0].append(j)
+                b[1].append(c)
+
+        buckets = {v: (np.array(js, dtype=np.int64), np.array(cs)) for v, (js, cs) in buckets.items()}
+
+        result = np.full((len(origins), len(destinations)), np.inf)
+        for i, o in enumerate(origins.tolist()):
+            row = result[i]
+            dist = _upward(o, up_offsets, up_edges, up_to, cost)
+            for v, c in dist.items():
+                b = buckets.get(v)
+                if b is not None:
+                    # each destination has at most one entry per bucket
+                    row[b[0]] = np.minimum(row[b[0]], b[1] + c)
+
+        return result
+
+    def unpack(self, edges):
+        """ Original link indices of a sequence of edges, shortcuts are replaced recursively """
+        link = self.edge_link
+        children = self.edge_children
+        path = []
+        stack = list(reversed(edges))
+        while stack:
+            e = stack.pop()
+            if link[e] >= 0:
+                path.append(int(link[e]))
+            else:
+                stack.append(children[e, 1])
+                stack.append(children[e, 0])
+
+        return path
+
+    def _query(self, origin, destination, paths):
+        """ Bidirectional search on the upward edges, alternating between the directions.
+
+        :returns cost and the link indices of the path
+        """
+        up_offsets, up_edges, up_to, down_offsets, down_edges, down_from, cost = self._adjacency_lists()
+
+        labels = ({origin: 0.0}, {destination: 0.0})
+        pred = ({origin: -1}, {destination: -1})
+        settled = ({}, {})
+        heaps = ([(0.0, origin)], [(0.0, destination)])
+        graphs = ((up_offsets, up_edges, up_to), (down_offsets, down_edges, down_from))
+
+        best = math.inf
+        meet = -1
+        while True:
+            # a direction is finished once its smallest label can not improve the best path
+            fwd = heaps[0][0][0] if heaps[0] else math.inf
+            bwd = heaps[1][0][0] if heaps[1] else math.inf
+            if min(fwd, bwd) >= best:
+                break
+
+            side = 0 if fwd <= bwd else 1
+            d, u = heappop(heaps[side])
+            if u in settled[side]:
+                continue
+            settled[side][u] = d
+
+            other = labels[1 - side].get(u)
+            if other is not None and d + other < best:
+                best = d + other
+                meet = u
+
+            label = labels[side]
+            offsets, edges, targets = graphs[side]
+            for k in range(offsets[u], offsets[u + 1]):
+                e = edges[k]
+                v = targets[k]
+                nd = d + cost[e]
+                if nd < label.get(v, math.inf):
+                    label[v] = nd
+                    pred[side][v] = e
+                    heappush(heaps[side], (nd, v))
+
+        if meet < 0:
+            return math.inf, []
+        if not paths:
+            return best, []
+
+        edge_from, edge_to = self._endpoints
+        forward = []
+        e = pred[0][meet]
+        while e >= 0:
+            forward.append(e)
+            e = pred[0][edge_from[e]]
+
+        forward.reverse()
+        e = pred[1][meet]
+        while e >= 0:
+            forward.append(e)
+            e = pred[1][edge_to[e]]
+
+        return best, self.unpack(forward)
+
+    def _adjacency_lists(self):
+        """ Upward edges of each node in CSR format as lists. Backward searches use the edges from more
+            important nodes, in reverse direction. """
+        if self._lists is None:
+            n = len(self.rank)
+            upward = self.rank[self.edge_from] < self.rank[self.edge_to]
+
+            up_edges = np.flatnonzero(upward)
+            up_edges = up_edges[np.argsort(self.edge_from[up_edges], kind='stable')]
+            up_offsets = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.edge_from[up_edges], minlength=n), out=up_offsets[1:])
+
+            down_edges = np.flatnonzero(~upward)
+            down_edges = down_edges[np.argsort(self.edge_to[down_edges], kind='stable')]
+            down_offsets = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.edge_to[down_edges], minlength=n), out=down_offsets[1:])
+
+            self._lists = (up_offsets.tolist(), up_edges.tolist(), self.edge_to[up_edges].tolist(),
+                           down_offsets.tolist(), down_edges.tolist(), self.edge_from[down_edges].tolist(),
+                           self.edge_cost.tolist())
+            self._endpoints = self.edge_from.tolist(), self.edge_to.tolist()
+
+        return self._lists
+
+    def _node_indices(self, nodes):
+        nodes = np.asarray(nodes)
+        if nodes.dtype.kind in 'iu':
+            if len(nodes) and (nodes.min() < 0 or nodes.max() >= len(self.rank)):
+                raise ValueError("Node index out of range")
+            return nodes.astype(np.int32)
+
+        index = self.graph.node_indices(nodes)
+        if (index < 0).any():
+            raise ValueError("Unknown nodes: %s" % ", ".join(map(str, nodes[index < 0][:10])))
+        return index
+
+
+def contraction_hierarchy(filepath, cost='freespeed', network=None, rebuild=False, write=True):
+    """ Load the contraction hierarchy stored next to a network file, or build it if it does not exist,
+        is outdated or was built with other costs.
+
+    :param filepath path to the network file
+    :param cost 'freespeed' travel time, 'length' or an array with the cost of each link
+    :param network the network read from the file, otherwise it is read
+    :param rebuild always build a new hierarchy
+    :param write store a newly built hierarchy next to the network file. Failures to write are ignored.
+    :rtype ContractionHierarchy
+    """
+    filepath = str(filepath)
+    path = filepath + CH_SUFFIX
+
+    if network is None:
+        from ..Network import read_network
+        network = read_network(filepath)
+
+    stat = os.stat(filepath)
+    meta = {'meta_size': stat.st_size, 'meta_mtime': int(stat.st_mtime), 'meta_cost': _cost_key(cost)}
+
+    if not rebuild and os.path.exists(path):
+        try:
+            ch = ContractionHierarchy.load(path, network)
+            if ch.meta == meta:
+                return ch
+
+        except (OSError, ValueError, KeyError):
+            # unreadable or foreign hierarchies are rebuilt
+            pass
+
+    ch = ContractionHierarchy.build(network, cost)
+    ch.meta = meta
+
+    if write:
+        try:
+            ch.save(path)
+        except OSError:
+            pass
+
+    return ch
+
+
+def _cost_key(cost):
+    """ Identifier of the costs, arrays are identified by their hash """
+    if isinstance(cost, str):
+        return cost
+
+    from hashlib import blake2b
+    return 'array:' + blake2b(np.ascontiguousarray(cost, dtype=np.float64).tobytes(), digest_size=16).hexdigest()
+
+
+def _upward(origin, offsets, edges, targets, cost):
+    """ Complete search on the upward edges from one node """
+    dist = {}
+    labels = {origin: 0.0}
+    heap = [(0.0, origin)]
+    while heap:
+        d, u = heappop(heap)
+        if u in dist:
+            continue
+        dist[u] = d
+
+        for k in range(offsets[u], offsets[u + 1]):
+            v = targets[k]
+            nd = d + cost[edges[k]]
+            if nd < labels.get(v, math.inf):
+                labels[v] = nd
+                heappush(heap, (nd, v))
+
+    return dist
+
+
+def _witness(origin, via, targets, max_cost, out, cost, limit):
+    """ Dijkstra from origin avoiding the node via, limited by cost and number of settled nodes.
+        Stops once all targets are settled.
+
+    :returns labels of the reached nodes, which are upper bounds of their cost
+    """
+    labels = {origin: 0.0}
+    settled = set()
+    remaining = len(targets)
+    heap = [(0.0, origin)]
+    while heap and len(settled) < limit:
+        d, u = heappop(heap)
+        if u in settled:
+            continue
+        if d > max_cost:
+            break
+
+        settled.add(u)
+        if u in targets:
+            remaining -= 1
+            if remaining == 0:
+                break
+
+        for v, e in out[u].items():
+            if v == via:
+                continue
+            nd = d + cost[e]
+            if nd < labels.get(v, math.inf):
+                labels[v] = nd
+                heappush(heap, (nd, v))
+
+    return labels
+
+
+def _contract(n, edge_from, edge_to, edge_cost, witness_limit):
+    """ Contract all nodes, ordered lazily by edge difference and the number of contracted neighbours.
+
+    :returns rank of each node, and the lists (from, to, cost, children) of all remaining edges
+    """
+    children = [(-1, -1)] * len(edge_from)
+
+    # edges between uncontracted nodes, as node -> neighbour -> edge
+    out = [{} for _ in range(n)]
+    inc = [{} for _ in range(n)]
+    for e, (u, v) in enumerate(zip(edge_from, edge_to)):
+        out[u][v] = e
+        inc[v][u] = e
+
+    deleted = [0] * n
+    simulation_limit = max(1, witness_limit // 10)
+
+    def shortcuts(v, add, limit):
+        """ Number of shortcuts needed to contract v, which are inserted if add is set """
+        count = 0
+        outs = list(out[v].items())
+        if not outs:
+            return 0
+
+        for u, e_in in list(inc[v].items()):
+            c_in = edge_cost[e_in]
+            candidates = {w: c_in + edge_cost[e_out] for w, e_out in outs if w != u}
+            if not candidates:
+                continue
+
+            dist = _witness(u, v, candidates, max(candidates.values()), out, edge_cost, limit)
+            for w, c in candidates.items():
+                if dist.get(w, math.inf) <= c:
+                    continue
+
+                count += 1
+                if not add:
+                    continue
+
+                existing = out[u].get(w)
+                if existing is not None:
+                    # edges between uncontracted nodes are never part of a shortcut, so they can be replaced
+                    if edge_cost[existing] > c:
+                        edge_cost[existing] = c
+                        children[existing] = (e_in, out[v][w])
+                    continue
+
+                e = len(edge_from)
+                edge_from.append(u)
+                edge_to.append(w)
+                edge_cost.append(c)
+                children.append((e_in, out[v][w]))
+                out[u][w] = e
+                inc[w][u] = e
+
+        return count
+
+    def priority(v):
+        # shortcuts are estimated with smaller witness searches, which is much faster and hardly affects the order
+        return 2 * (shortcuts(v, False, simulation_limit) - len(out[v]) - len(inc[v])) + deleted[v]
+
+    heap = [(priority(v), v) for v in range(n)]
+    heapify(heap)
+
+    rank = [-1] * n
+    r = 0
+    while heap:
+        _, v = heappop(heap)
+        if rank[v] >= 0:
+            continue
+
+        # lazy update, the priority may have changed since it was queued
+        p = priority(v)
+        if heap and p > heap[0][0]:
+            heappush(heap, (p, v))
+            continue
+
+        shortcuts(v, True, witness_limit)
+        neighbours = set(out[v]) | set(inc[v])
+        for u in inc[v]:
+            del out[u][v]
+        for w in out[v]:
+            del inc[w][v]
+        out[v] = {}
+        inc[v] = {}
+
+        rank[v] = r
+        r += 1
+
+        # neighbours are only counted, their priority is updated lazily when they are dequeued
+        for u in neighbours:
+            deleted[u] += 1
+
+    return rank, (edge_from, edge_to, edge_cost, children)
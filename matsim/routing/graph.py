@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Arrays of a graph, which are stored in shared memory
+ARRAYS = ('node_ids', 'link_ids', 'x', 'y', 'from_node', 'to_node', 'length', 'freespeed', 'capacity',
+          'out_offsets', 'out_links', 'in_offsets', 'in_links')
+
+# Serializes attaching, so that concurrent calls restore the original registration function
+_ATTACH_LOCK = threading.Lock()
+
+
+class Graph:
+    """ Compact representation of a network for graph algorithms.
+
+        Nodes and links are identified by dense int32 indices, in the order of the network's data frames.
+        Outgoing links are stored in compressed sparse row format, the links leaving node i are
+        ``out_links[out_offsets[i]:out_offsets[i + 1]]``. Incoming links are stored the same way,
+        e.g. for backward searches.
+
+        Create it with :meth:`matsim.Network.Network.to_graph`, which caches it on the network.
+
+    :param node_ids id of each node index
+    :param link_ids id of each link index
+    :param x x coordinate of each node
+    :param y y coordinate of each node
+    :param from_node index of the node each link starts at
+    :param to_node index of the node each link ends at
+    :param length, freespeed, capacity link attributes
+    """
+
+    def __init__(self, node_ids, link_ids, x, y, from_node, to_node, length, freespeed, capacity,
+                 out_offsets=None, out_links=None, in_offsets=None, in_links=None):
+        self.node_ids = np.asarray(node_ids, dtype=str)
+        self.link_ids = np.asarray(link_ids, dtype=str)
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+
+        self.from_node = np.asarray(from_node, dtype=np.int32)
+        self.to_node = np.asarray(to_node, dtype=np.int32)
+        self.length = np.asarray(length, dtype=np.float32)
+        self.freespeed = np.asarray(freespeed, dtype=np.float32)
+        self.capacity = np.asarray(capacity, dtype=np.float32)
+
+        if out_offsets is None:
+            out_offsets, out_links = _csr(self.from_node, len(self.node_ids))
+            in_offsets, in_links = _csr(self.to_node, len(self.node_ids))
+
+        self.out_offsets = out_offsets
+        self.out_links = out_links
+        self.in_offsets = in_offsets
+        self.in_links = in_links
+
+        self._node_index = None
+        self._link_index = None
+        self._node_lookup = None
+        self._link_lookup = None
+        self._shm = None
+
+    @classmethod
+    def from_network(cls, network):
+        """ Build the graph of a :class:`matsim.Network.Network` """
+        nodes = network.nodes
+        links = network.links
+
+        index = pd.Index(nodes.node_id)
+        from_node = index.get_indexer(links.from_node)
+        to_node = index.get_indexer(links.to_node)
+
+        if (from_node < 0).any() or (to_node < 0).any():
+            missing = set(links.from_node[from_node < 0]) | set(links.to_node[to_node < 0])
+            raise ValueError("Links refer to unknown nodes: %s" % ", ".join(sorted(missing)[:10]))
+
+        return cls(nodes.node_id.to_numpy(), links.link_id.to_numpy(), nodes.x.to_numpy(), nodes.y.to_numpy(),
+                   from_node, to_node, links.length.to_numpy(), links.freespeed.to_numpy(),
+                   links.capacity.to_numpy())
+
+    def __str__(self):
+        return 'Graph: {nodes} nodes, {links} links'.format(nodes=self.n_nodes, links=self.n_links)
+
+    @property
+    def n_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def n_links(self):
+        return len(self.link_ids)
+
+    @property
+    def node_index(self):
+        """ Dictionary of node id to node index, created on first use """
+        if self._node_index is None:
+            self._node_index = {v: i for i, v in enumerate(self.node_ids.tolist())}
+        return self._node_index
+
+    @property
+    def link_index(self):
+        """ Dictionary of link id to link index, created on first use """
+        if self._link_index is None:
+            self._link_index = {v: i for i, v in enumerate(self.link_ids.tolist())}
+        return self._link_index
+
+    def node_indices(self, ids):
+        """ Array of node indices for an iterable of node ids, unknown ids are -1 """
+        if self._node_lookup is None:
+            self._node_lookup = pd.Index(self.node_ids)
+        return self._node_lookup.get_indexer(list(ids)).astype(np.int32)
+
+    def link_indices(self, ids):
+        """ Array of link indices for an iterable of link ids, unknown ids are -1 """
+        if self._link_lookup is None:
+            self._link_lookup = pd.Index(self.link_ids)
+        return self._link_lookup.get_indexer(list(ids)).astype(np.int32)
+
+    def outgoing(self, node):
+        """ Indices of the links leaving a node index """
+        return self.out_links[self.out_offsets[node]:self.out_offsets[node + 1]]
+
+    def incoming(self, node):
+        """ Indices of the links entering a node index """
+        return self.in_links[self.in_offsets[node]:self.in_offsets[node + 1]]
+
+    def travel_time(self):
+        """ Freespeed travel time of each link in seconds """
+        return self.length / self.freespeed
+
+    def share(self):
+        """ Copy the graph into shared memory, so that other processes can use it without copying it.
+
+            The returned handle is picklable and can be passed to worker processes, which call
+            :meth:`SharedGraph.attach` to obtain the graph. The creating process must call
+            :meth:`SharedGraph.unlink` when the graph is no longer needed, or use the handle as context manager.
+
+        :rtype SharedGraph
+        """
+        from multiprocessing.shared_memory import SharedMemory
+
+        layout = []
+        offset = 0
+        for name in ARRAYS:
+            a = getattr(self, name)
+            # keep all arrays aligned to 8 bytes
+            offset = (offset + 7) & ~7
+            layout.append((name, a.dtype.str, a.shape, offset))
+            offset += a.nbytes
+
+        shm = SharedMemory(create=True, size=max(offset, 1))
+        for (name, dtype, shape, start), a in zip(layout, (getattr(self, n) for n in ARRAYS)):
+            np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=start)[...] = a
+
+        return SharedGraph(shm, layout)
+
+
+class SharedGraph:
+    """ Picklable handle of a :class:`Graph` in shared memory, created by :meth:`Graph.share` """
+
+    def __init__(self, shm, layout):
+        self.name = shm.name
+        self.layout = layout
+        self._shm = shm
+
+    def __getstate__(self):
+        return {'name': self.name, 'layout': self.layout, '_shm': None}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.unlink()
+
+    def attach(self):
+        """ Graph whose arrays are read-only views of the shared memory. The memory stays mapped as long as the
+            graph is referenced. """
+        shm = self._shm if self._shm is not None else _attach(self.name)
+
+        arrays = {}
+        for name, dtype, shape, offset in self.layout:
+            a = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+            a.flags.writeable = False
+            arrays[name] = a
+
+        graph = Graph(**arrays)
+        graph._shm = shm
+        return graph
+
+    def unlink(self):
+        """ Release the shared memory, only possible in the creating process. Graphs attached in this process
+            must not be used afterwards. """
+        if self._shm is None:
+            raise ValueError("Shared memory can only be released by the process that created it")
+
+        self._shm.unlink()
+        try:
+            self._shm.close()
+        except BufferError:
+            # still referenced by attached graphs, it is unmapped once they are garbage collected
+            pass
+
+
+def _csr(index, n):
+    """ Offsets and stable order of the links grouped by a node index """
+    order = np.argsort(index, kind='stable').astype(np.int32)
+    offsets = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(np.bincount(index, minlength=n), out=offsets[1:])
+    return offsets, order
+
+
+def _attach(name):
+    """ Attach to existing shared memory, without registering it with the resource tracker of this process.
+        Otherwise, the memory would be released when a worker process exits. """
+    from multiprocessing.shared_memory import SharedMemory
+
+    try:
+        return SharedMemory(name, track=False)
+    except TypeError:
+        pass
+
+    # Python < 3.13 has no option. Only the registration of this segment is skipped, others are passed on.
+    # Unregistering afterwards is no alternative, workers share the tracker of the creating process.
+    from multiprocessing import resource_tracker
+
+    with _ATTACH_LOCK:
+        register = resource_tracker.register
+
+        def skip(resource, rtype):
+            if rtype != 'shared_memory' or resource.lstrip('/') != name.lstrip('/'):
+                register(resource, rtype)
+
+        resource_tracker.register = skip
+        try:
+            return SharedMemory(name)
+        finally:
+            resource_tracker.register = register
@@ -0,0 +1,493 @@
+# -*- coding: utf-8 -*-
+
+import math
+from heapq import heappush, heappop
+
+import numpy as np
+
+# Number of tree entries (origins x nodes) computed at once by the vectorized dijkstra, bounds the memory usage
+TREE_BLOCK_SIZE = 1 << 24
+
+
+class Routes:
+    """ Least cost paths of many OD pairs, returned by :meth:`Router.route_many`.
+        Paths are stored in compressed sparse row format, the link indices of route i are
+        ``links[offsets[i]:offsets[i + 1]]``.
+
+    :param graph the routed :class:`matsim.routing.Graph`
+    :param cost cost of each route, inf if the destination is not reachable
+    :param offsets start of each path in links, None if the paths were not computed
+    :param links link indices of all paths
+    """
+
+    def __init__(self, graph, cost, offsets=None, links=None):
+        self.graph = graph
+        self.cost = cost
+        self.offsets = offsets
+        self.links = links
+
+    def __len__(self):
+        return len(self.cost)
+
+    def path(self, i):
+        """ Link indices of route i """
+        if self.offsets is None:
+            raise ValueError("Paths were not computed")
+        return self.links[self.offsets[i]:self.offsets[i + 1]]
+
+    def link_ids(self, i):
+        """ Link ids of route i """
+        return self.graph.link_ids[self.path(i)].tolist()
+
+    def distance(self):
+        """ Network distance of each route, i.e. the sum of the link lengths """
+        if self.offsets is None:
+            raise ValueError("Paths were not computed")
+        total = np.concatenate(([0.0], np.cumsum(self.graph.length[self.links], dtype=np.float64)))
+        return total[self.offsets[1:]] - total[self.offsets[:-1]]
+
+
+def link_costs(graph, cost):
+    """ Validated cost of each link as float64 array.
+
+    :param graph :class:`matsim.routing.Graph`
+    :param cost 'freespeed' travel time, 'length', an array with the cost of each link,
+        or a links x bins matrix of time-dependent costs
+    """
+    if isinstance(cost, str):
+        if cost == 'freespeed':
+            cost = graph.travel_time()
+        elif cost == 'length':
+            cost = graph.length
+        else:
+            raise ValueError("Unknown cost: %s" % cost)
+
+    cost = np.asarray(cost, dtype=np.float64)
+    if cost.ndim == 0 or cost.ndim > 2 or cost.shape[0] != graph.n_links:
+        raise ValueError("Costs must have one entry or row per link")
+    if not np.isfinite(cost).all() or (cost < 0).any():
+        raise ValueError("Costs must be finite and not negative")
+
+    return cost
+
+
+class Router:
+    """ Least cost path router on the graph of a network.
+
+        Many OD pairs are routed with :meth:`route_many`, which builds one dijkstra tree per origin. With static
+        link costs and scipy installed, the trees are computed by :mod:`scipy.sparse.csgraph` and the paths
+        are extracted vectorized. Otherwise, a label-setting search in Python is used, which stops once all
+        destinations of an origin are reached.
+
+        Time-dependent costs are given as links x bins matrix of travel times, e.g.
+        :meth:`matsim.analysis.LinkTravelTimes.travel_time_matrix`. A link is traversed with the travel time of the
+        bin in which it is entered. Later times use the last bin.
+
+    :param network :class:`matsim.Network.Network` or :class:`matsim.routing.Graph`
+    :param cost link costs: 'freespeed' travel time, 'length', an array with the cost of each link,
+        or a links x bins matrix of time-dependent travel times
+    :param bin_size size of the time bins of time-dependent travel times in seconds
+    :param algorithm 'dijkstra' or 'astar'. A* guides each search by the euclidean distance to the destination,
+        scaled to a lower bound of the costs. It routes each OD pair individually, which pays off for
+        few pairs per origin.
+    """
+
+    def __init__(self, network, cost='freespeed', bin_size=None, algorithm='dijkstra'):
+        self.graph = network.to_graph() if hasattr(network, 'to_graph') else network
+
+        if algorithm not in ('dijkstra', 'astar'):
+            raise ValueError("Unknown algorithm: %s" % algorithm)
+
+        cost = link_costs(self.graph, cost)
+        if cost.ndim == 2 and not bin_size:
+            raise ValueError("Time-dependent costs require the bin size")
+
+        self.cost = cost
+        self.bin_size = bin_size
+        self.algorithm = algorithm
+        self.time_dependent = cost.ndim == 2
+
+        self._adjacency = None
+        self._matrix = None
+        self._scale = None
+        self._coordinates = None
+
+    def route(self, origin, destination, time=0):
+        """ Least cost path between two nodes.
+
+        :param origin, destination node ids
+        :param time departure time, only relevant for time-dependent costs
+        :returns tuple of the cost, inf if not reachable, and the list of link ids
+        """
+        o, d = self._node_indices([origin, destination])
+        cost, path = self._route_one(o, d, float(time))
+        return cost, self.graph.link_ids[path].tolist()
+
+    def tree(self, origin, time=0):
+        """ Least cost tree from one node to all nodes.
+
+        :param origin node id
+        :param time departure time, only relevant for time-dependent costs
+        :returns tuple of arrays with the cost to reach each node, inf if not reachable, and the index of the
+            link by which it is reached, -1 for the origin and unreachable nodes
+        """
+        cost, links = self.trees(self._node_indices([origin]), time)
+        return cost[0], links[0]
+
+    def trees(self, origins, time=0, links=True):
+        """ Least cost trees from several nodes, see :meth:`tree`.
+
+        :param origins node ids, or node indices as integer array
+        :param time departure time, only relevant for time-dependent costs
+        :param links whether to determine the incoming links, otherwise only costs are computed
+        :returns tuple of origins x nodes arrays with the costs and the incoming links, or None
+        """
+        origins = self._node_indices(origins)
+        if self._use_csgraph():
+            return self._trees(origins, links)
+
+        cost = np.full((len(origins), self.graph.n_nodes), np.inf)
+        incoming = np.full((len(origins), self.graph.n_nodes), -1, dtype=np.int32) if links else None
+        for i, o in enumerate(origins.tolist()):
+            dist, pred = self._search(o, float(time))
+            cost[i, list(dist)] = list(dist.values())
+            if links:
+                incoming[i, list(pred)] = list(pred.values())
+
+        return cost, incoming
+
+    def route_many(self, origins, destinations, times=None, paths=True, workers=1, chunk_size=10000):
+        """ Route many OD pairs, optionally in a process pool. The graph is passed to the workers in shared memory.
+
+        :param origins, destinations node ids, or node indices as integer array
+        :param times departure times, only relevant for time-dependent costs
+        :param paths whether to return the paths, otherwise only costs are computed
+        :param workers number of processes, 1 routes in this process and None uses the number of CPUs
+        :param chunk_size number of OD pairs routed per task
+        :rtype Routes
+        """
+        origins = self._node_indices(origins)
+        destinations = self._node_indices(destinations)
+        if len(origins) != len(destinations):
+            raise ValueError("Origins and destinations must have the same length")
+
+        times = np.zeros(len(origins)) if times is None else np.asarray(times, dtype=np.float64)
+
+        # pairs with the same origin (and departure time) share one tree
+        order = np.lexsort((times, origins)) if self.time_dependent else np.argsort(origins, kind='stable')
+        chunks = [order[i:i + chunk_size] for i in range(0, len(order), chunk_size)]
+
+        if workers == 1 or len(chunks) <= 1:
+            results = [(idx, self._route_chunk(origins[idx], destinations[idx], times[idx], paths))
+                       for idx in chunks]
+        else:
+            results = self._route_parallel(chunks, origins, destinations, times, paths, workers)
+
+        return self._assemble(results, len(origins), paths)
+
+    def _route_parallel(self, chunks, origins, destinations, times, paths, workers):
+        from concurrent.futures import ProcessPoolExecutor
+        from ..utils import bounded_map
+        import os
+
+        workers = workers or os.cpu_count()
+
+        with self.graph.share() as handle:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(handle, self.cost, self.bin_size, self.algorithm)) as pool:
+                tasks = ((idx, (origins[idx], destinations[idx], times[idx], paths)) for idx in chunks)
+                return list(bounded_map(pool, _route_worker, tasks, workers))
+
+    def _assemble(self, results, n, paths):
+        """ Combine the results of the chunks in the order of the OD pairs """
+        cost = np.full(n, np.inf)
+        if not paths:
+            for idx, (c, _, _) in results:
+                cost[idx] = c
+            return Routes(self.graph, cost)
+
+        lengths = np.zeros(n, dtype=np.int64)
+        starts = np.zeros(n, dtype=np.int64)
+        base = 0
+        for idx, (c, chunk_lengths, _) in results:
+            cost[idx] = c
+            lengths[idx] = chunk_lengths
+            starts[idx] = base + np.cumsum(chunk_lengths) - chunk_lengths
+            base += int(chunk_lengths.sum())
+
+        links = np.concatenate([r[2] for _, r in results]) if results else np.zeros(0, dtype=np.int32)
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        positions = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return Routes(self.graph, cost, offsets, links[positions])
+
+    def _route_chunk(self, origins, destinations, times, paths):
+        """ Route OD pairs ordered by origin.
+
+        :returns tuple of the costs, and the length of each path and all link indices of the paths
+        """
+        if self._use_csgraph() and self.algorithm == 'dijkstra':
+            return self._route_chunk_trees(origins, destinations, paths)
+
+        # pairs with the same origin, and departure time if relevant, are routed with one search
+        same = origins[1:] == origins[:-1]
+        if self.time_dependent:
+            same &= times[1:] == times[:-1]
+        if self.algorithm == 'astar':
+            same[:] = False
+
+        cost = np.full(len(origins), np.inf)
+        found = []
+        start = 0
+        for i in range(1, len(origins) + 1):
+            if i < len(origins) and same[i - 1]:
+                continue
+
+            o, t = int(origins[start]), float(times[start])
+            targets = destinations[start:i].tolist()
+            target = targets[0] if self.algorithm == 'astar' else None
+            dist, pred = self._search(o, t, targets, target)
+
+            for j, d in enumerate(targets, start):
+                cost[j] = dist.get(d, np.inf)
+                found.append(_walk(pred, self._adjacency_lists()[3], d) if paths else None)
+            start = i
+
+        if not paths:
+            return cost, None, None
+
+        lengths = np.array([len(p) for p in found], dtype=np.int64)
+        links = np.fromiter((l for p in found for l in p), dtype=np.int32, count=int(lengths.sum()))
+        return cost, lengths, links
+
+    def _route_chunk_trees(self, origins, destinations, paths):
+        """ Vectorized routing with dijkstra trees of blocks of origins """
+        unique, first = np.unique(origins, return_index=True)
+        bounds = np.append(first, len(origins))
+
+        block = max(1, TREE_BLOCK_SIZE // max(self.graph.n_nodes, 1))
+
+        cost = np.full(len(origins), np.inf)
+        lengths = []
+        links = []
+        for b in range(0, len(unique), block):
+            tree_cost, tree_pred = self._trees(unique[b:b + block])
+
+            for k in range(len(tree_cost)):
+                lo, hi = bounds[b + k], bounds[b + k + 1]
+                cost[lo:hi] = tree_cost[k][destinations[lo:hi]]
+                if paths:
+                    n, p = _tree_paths(tree_pred[k], self.graph.from_node, destinations[lo:hi])
+                    lengths.append(n)
+                    links.append(p)
+
+        if not paths:
+            return cost, None, None
+
+        return cost, np.concatenate(lengths), np.concatenate(links)
+
+    def _route_one(self, o, d, time):
+        target = d if self.algorithm == 'astar' else None
+        dist, pred = self._search(o, time, [d], target)
+        path = np.array(_walk(pred, self._adjacency_lists()[3], d), dtype=np.int32)
+        return dist.get(d, np.inf), path
+
+    def _use_csgraph(self):
+        if self.time_dependent:
+            return False
+
+        from importlib.util import find_spec
+
+        try:
+            return find_spec('scipy.sparse.csgraph') is not None
+        except ImportError:
+            # scipy itself is missing
+            return False
+
+    def _trees(self, origins, links=True):
+        """ Dijkstra trees of several origins, computed by scipy.
+
+        :returns cost of each node per origin, and the link index by which it is reached if requested
+        """
+        from scipy.sparse.csgraph import dijkstra
+
+        matrix, keys, best = self._csgraph_matrix()
+        if not links:
+            return dijkstra(matrix, indices=origins), None
+
+        cost, pred = dijkstra(matrix, indices=origins, return_predecessors=True)
+
+        # predecessor nodes are translated to the cheapest link between the node pair
+        n = self.graph.n_nodes
+        links = np.full(pred.shape, -1, dtype=np.int32)
+        valid = pred >= 0
+        nodes = np.broadcast_to(np.arange(n, dtype=np.int64), pred.shape)
+        links[valid] = best[np.searchsorted(keys, pred[valid].astype(np.int64) * n + nodes[valid])]
+
+        return cost, links
+
+    def _csgraph_matrix(self):
+        """ Sparse adjacency matrix with the cheapest link of each node pair """
+        if self._matrix is None:
+            from scipy.sparse import csr_matrix
+
+            g = self.graph
+            n = g.n_nodes
+            order = np.lexsort((self.cost, g.to_node, g.from_node))
+            f, t = g.from_node[order], g.to_node[order]
+
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = (f[1:] != f[:-1]) | (t[1:] != t[:-1])
+            best, f, t = order[first].astype(np.int32), f[first], t[first]
+
+            indptr = np.zeros(n + 1, dtype=np.int32)
+            np.cumsum(np.bincount(f, minlength=n), out=indptr[1:])
+
+            # explicit zeros are kept as edges by csgraph
+            matrix = csr_matrix((self.cost[best], t, indptr), shape=(n, n))
+            keys = f.astype(np.int64) * n + t
+            self._matrix = matrix, keys, best
+
+        return self._matrix
+
+    def _adjacency_lists(self):
+        """ Graph arrays as lists, which are much faster to access in Python loops """
+        if self._adjacency is None:
+            g = self.graph
+            cost = None if self.time_dependent else self.cost.tolist()
+            self._adjacency = (g.out_offsets.tolist(), g.out_links.tolist(), g.to_node.tolist(), g.from_node.tolist(),
+                               cost)
+        return self._adjacency
+
+    def _heuristic_scale(self):
+        """ Lower bound of the cost per unit of euclidean distance, which makes the heuristic admissible
+            even if link lengths are shorter than the distance of their nodes """
+        if self._scale is None:
+            g = self.graph
+            euclid = np.hypot(g.x[g.to_node] - g.x[g.from_node], g.y[g.to_node] - g.y[g.from_node])
+            cost = self.cost.min(axis=1) if self.time_dependent else self.cost
+            valid = euclid > 0
+            self._scale = float((cost[valid] / euclid[valid]).min()) if valid.any() else 0.0
+            self._coordinates = g.x.tolist(), g.y.tolist()
+        return self._scale
+
+    def _search(self, origin, time, targets=None, target=None):
+        """ Label-setting search from an origin, which stops once all targets are settled.
+            With a target, the search is guided by the A* heuristic.
+
+        :returns dictionaries of the final cost and the incoming link of the settled nodes
+        """
+        offsets, out_links, to_node, _, cost = self._adjacency_lists()
+
+        if self.time_dependent:
+            tt = self.cost
+            n_bins = tt.shape[1]
+            bin_size = self.bin_size
+
+        h = None
+        if target is not None:
+            scale = self._heuristic_scale()
+            if scale > 0:
+                x, y = self._coordinates
+                tx, ty = x[target], y[target]
+                h = lambda v: scale * math.hypot(x[v] - tx, y[v] - ty)
+
+        remaining = set(targets) if targets is not None else None
+        labels = {origin: 0.0}
+        pred = {origin: -1}
+        dist = {}
+        heap = [(0.0, 0.0, origin)]
+
+        while heap:
+            _, d, u = heappop(heap)
+            if u in dist:
+                continue
+
+            dist[u] = d
+            if remaining is not None:
+                remaining.discard(u)
+                if not remaining:
+                    break
+
+            for k in range(offsets[u], offsets[u + 1]):
+                l = out_links[k]
+                v = to_node[l]
+                if v in dist:
+                    continue
+
+                if cost is not None:
+                    nd = d + cost[l]
+                else:
+                    nd = d + tt[l, min(int((time + d) // bin_size), n_bins - 1)]
+
+                if nd < labels.get(v, math.inf):
+                    labels[v] = nd
+                    pred[v] = l
+                    heappush(heap, (nd + h(v) if h is not None else nd, nd, v))
+
+        return dist, {v: pred[v] for v in dist}
+
+    def _node_indices(self, nodes):
+        nodes = np.asarray(nodes)
+        if nodes.dtype.kind in 'iu':
+            if len(nodes) and (nodes.min() < 0 or nodes.max() >= self.graph.n_nodes):
+                raise ValueError("Node index out of range")
+            return nodes.astype(np.int32)
+
+        index = self.graph.node_indices(nodes)
+        if (index < 0).any():
+            raise ValueError("Unknown nodes: %s" % ", ".join(map(str, nodes[index < 0][:10])))
+        return index
+
+
+def _walk(pred, from_node, node):
+    """ Links of the path to a node, following the incoming links of the search """
+    path = []
+    link = pred.get(node, -1)
+    while link >= 0:
+        path.append(link)
+        link = pred[from_node[link]]
+
+    path.reverse()
+    return path
+
+
+def _tree_paths(pred, from_node, destinations):
+    """ Paths to several destinations of one tree. All paths are followed back at once, one link per step.
+
+    :returns length of each path and their concatenated link indices
+    """
+    steps = []
+    link = pred[destinations]
+    while True:
+        active = link >= 0
+        if not active.any():
+            break
+        steps.append(link)
+        link = np.where(active, pred[from_node[link]], -1)
+
+    if not steps:
+        return np.zeros(len(destinations), dtype=np.int64), np.zeros(0, dtype=np.int32)
+
+    # steps hold the paths backwards, padded with -1
+    steps = np.stack(steps)
+    lengths = (steps >= 0).sum(axis=0)
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+
+    column = np.repeat(np.arange(len(destinations)), lengths)
+    k = np.arange(offsets[-1]) - offsets[column]
+    return lengths, steps[lengths[column] - 1 - k, column].astype(np.int32)
+
+
+# Router of a worker process, created once by the initializer of the pool
+_worker_router = None
+
+
+def _init_worker(handle, cost, bin_size, algorithm):
+    global _worker_router
+    _worker_router = Router(handle.attach(), cost, bin_size, algorithm)
+
+
+def _route_worker(origins, destinations, times, paths):
+    return _worker_router._route_chunk(origins, destinations, times, paths)
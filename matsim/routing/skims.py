@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from .router import Router, TREE_BLOCK_SIZE
+
+# Metrics of a skim, each is summed along the least cost path
+METRICS = ('cost', 'time', 'distance')
+
+
+class Skims:
+    """ Zone to zone matrices, e.g. travel times and distances, created by :func:`skims`.
+
+    :param zones id of each row and column
+    :param matrices dictionary of metric name to zones x zones array, possibly memory mapped
+    """
+
+    def __init__(self, zones, matrices):
+        self.zones = list(zones)
+        self.matrices = matrices
+
+    def __str__(self):
+        return 'Skims: {n} zones, {metrics}'.format(n=len(self.zones), metrics=', '.join(self.matrices))
+
+    def __getitem__(self, metric):
+        return self.matrices[metric]
+
+    def to_dataframe(self):
+        """ Long DataFrame with one row per zone pair and one column per metric """
+        n = len(self.zones)
+        zones = np.asarray(self.zones, dtype=object)
+        df = pd.DataFrame({'from_zone': np.repeat(zones, n), 'to_zone': np.tile(zones, n)})
+        for metric, m in self.matrices.items():
+            df[metric] = np.asarray(m).ravel()
+        return df
+
+    def to_npy(self, directory):
+        """ Write each matrix as ``<metric>.npy`` and the zone ids as ``zones.npy`` into a directory """
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'zones.npy'), np.asarray(self.zones, dtype=str))
+        for metric, m in self.matrices.items():
+            np.save(os.path.join(directory, metric + '.npy'), m)
+
+    def to_parquet(self, path):
+        """ Write the skims in long format as Parquet file, requires pyarrow """
+        self.to_dataframe().to_parquet(path, index=False)
+
+    @staticmethod
+    def read(directory, mmap_mode='r'):
+        """ Read skims written by :meth:`to_npy`, by default memory mapped """
+        zones = np.load(os.path.join(directory, 'zones.npy')).tolist()
+        matrices = {}
+        for metric in METRICS:
+            path = os.path.join(directory, metric + '.npy')
+            if os.path.exists(path):
+                matrices[metric] = np.load(path, mmap_mode=mmap_mode)
+
+        return Skims(zones, matrices)
+
+
+def zone_connectors(network, zones, column=None, n_connectors=1):
+    """ Nodes connecting each zone to the network. For polygons, these are the nodes inside the zone closest to its
+        center, or the nearest node if none is inside. Only nodes with incoming and outgoing links are used.
+
+    :param network :class:`matsim.Network.Network`
+    :param zones GeoDataFrame of zone polygons in the coordinate system of the network,
+        or mapping of zone id to node id or list of node ids
+    :param column column of the zone ids, default uses the index of the GeoDataFrame
+    :param n_connectors maximum number of connector nodes per zone
+    :returns dictionary of zone id to list of node ids
+    """
+    if not hasattr(zones, 'geometry'):
+        return {z: [v] if isinstance(v, str) else list(v) for z, v in zones.items()}
+
+    import geopandas as gpd
+
+    links = network.links
+    connected = set(links.from_node) & set(links.to_node)
+    nodes = network.nodes[network.nodes.node_id.isin(connected)]
+    nodes = gpd.GeoDataFrame(nodes[['node_id']], geometry=gpd.points_from_xy(nodes.x, nodes.y), crs=zones.crs)
+
+    ids = zones[column] if column is not None else zones.index
+    zones = gpd.GeoDataFrame({'zone': ids.to_numpy()}, geometry=zones.geometry.to_numpy(), crs=zones.crs)
+    centers = zones.geometry.representative_point()
+
+    inside = gpd.sjoin(nodes, zones, predicate='within')
+    inside['distance'] = inside.geometry.distance(centers.iloc[inside.index_right].reset_index(drop=True)
+                                                  .set_axis(inside.index))
+
+    connectors = {}
+    for zone, group in inside.sort_values('distance').groupby('zone', sort=False):
+        connectors[zone] = group.node_id.iloc[:n_connectors].tolist()
+
+    # zones without nodes are connected to the nearest node
+    missing = zones[~zones.zone.isin(connectors.keys())]
+    if len(missing):
+        points = gpd.GeoDataFrame({'zone': missing.zone.to_numpy()},
+                                  geometry=centers[missing.index].to_numpy(), crs=zones.crs)
+        nearest = gpd.sjoin_nearest(points, nodes).drop_duplicates('zone')
+        for zone, node in zip(nearest.zone, nearest.node_id):
+            connectors[zone] = [node]
+
+    return {z: connectors[z] for z in zones.zone}
+
+
+def skims(network, zones, cost='freespeed', metrics=('cost', 'distance'), column=None, n_connectors=1, workers=1,
+          directory=None, dtype=np.float32):
+    """ Compute zone to zone skim matrices with least cost path trees from all connector nodes.
+
+        The value of a zone pair is the mean over all pairs of their connector nodes that are connected.
+        Zone pairs without any connected pair are inf. Within a zone, the mean over its connector pairs is used,
+        which is 0 for single connectors.
+
+    :param network :class:`matsim.Network.Network`
+    :param zones GeoDataFrame or mapping of zone id to nodes, see :func:`zone_connectors`
+    :param cost link costs minimized by the paths, see :class:`matsim.routing.Router`. Only static costs are supported.
+    :param metrics values summed along the least cost paths: 'cost', 'time' for the freespeed travel time
+        and 'distance'
+    :param column column of the zone ids in the GeoDataFrame
+    :param n_connectors maximum number of connector nodes per zone, only used for polygons
+    :param workers number of processes, 1 computes in this process and None uses the number of CPUs
+    :param directory write the matrices as memory mapped ``<metric>.npy`` files into this directory,
+        instead of holding them in memory. Workers write their rows directly.
+    :param dtype type of the matrix values
+    :rtype Skims
+    """
+    unknown = set(metrics) - set(METRICS)
+    if unknown:
+        raise ValueError("Unknown metrics: %s" % ", ".join(sorted(unknown)))
+
+    router = Router(network, cost)
+    if router.time_dependent:
+        raise ValueError("Skims require static costs")
+
+    connectors = zone_connectors(network, zones, column, n_connectors)
+    zone_ids = list(connectors)
+
+    nodes = [router.graph.node_indices(connectors[z]) for z in zone_ids]
+    for z, n in zip(zone_ids, nodes):
+        if len(n) == 0 or (n < 0).any():
+            raise ValueError("Zone %s has no or unknown connector nodes" % z)
+
+    counts = np.array([len(n) for n in nodes])
+    sources = np.concatenate(nodes)
+    starts = np.concatenate(([0], np.cumsum(counts)))
+
+    n = len(zone_ids)
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'zones.npy'), np.asarray(zone_ids, dtype=str))
+        matrices = {m: np.lib.format.open_memmap(os.path.join(directory, m + '.npy'), mode='w+', dtype=dtype,
+                                                 shape=(n, n)) for m in metrics}
+    else:
+        matrices = {m: np.empty((n, n), dtype=dtype) for m in metrics}
+
+    # blocks of origin zones, whose trees are computed at once
+    per_block = max(1, TREE_BLOCK_SIZE // max(router.graph.n_nodes, 1))
+    blocks = []
+    first = 0
+    for z in range(1, n + 1):
+        if z == n or (z > first and starts[z + 1] - starts[first] > per_block):
+            blocks.append((first, z))
+            first = z
+
+    # freespeed travel times are the costs themselves
+    same = {'cost', 'time'} if isinstance(cost, str) and cost == 'freespeed' else {'cost'}
+
+    args = (sources, starts, metrics, same, directory, dtype)
+    if workers == 1 or len(blocks) <= 1:
+        for block in blocks:
+            _write_rows(matrices, block, _skim_rows(router, block, *args))
+    else:
+        _skims_parallel(router, blocks, matrices, args, workers)
+
+    for m in matrices.values():
+        if isinstance(m, np.memmap):
+            m.flush()
+
+    return Skims(zone_ids, matrices)
+
+
+def _skims_parallel(router, blocks, matrices, args, workers):
+    from concurrent.futures import ProcessPoolExecutor
+    from ..utils import bounded_map
+
+    workers = workers or os.cpu_count()
+    with router.graph.share() as handle:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(handle, router.cost, args)) as pool:
+            # rows of the blocks in flight are held in memory, until they are written here
+            for block, rows in bounded_map(pool, _skim_worker, ((block, (block,)) for block in blocks), workers):
+                _write_rows(matrices, block, rows)
+
+
+def _write_rows(matrices, block, rows):
+    """ Store the rows of a block, which are None if a worker wrote them to the memory mapped files """
+    if rows is None:
+        return
+    for metric, values in rows.items():
+        matrices[metric][block[0]:block[1]] = values
+
+
+def _skim_rows(router, block, sources, starts, metrics, same, directory, dtype):
+    """ Skim rows of the zones in block, averaged over the connector nodes
+
+    :param same metrics equal to the cost
+    """
+    graph = router.graph
+    lo, hi = starts[block[0]], starts[block[1]]
+    # metrics other than the cost are summed along the paths, which requires the trees
+    weights = {m: graph.travel_time() if m == 'time' else graph.length for m in metrics if m not in same}
+    cost, pred = router.trees(sources[lo:hi], links=bool(weights))
+
+    # targets are the connectors of all zones
+    values = {}
+    for metric in metrics:
+        v = cost[:, sources]
+        if metric in weights:
+            v = np.where(np.isfinite(v), _path_sums(pred, sources, weights[metric].astype(np.float64),
+                                                    graph.from_node), np.inf)
+        values[metric] = v
+
+    # aggregation over the connectors of origins and destinations
+    origin_starts = starts[block[0]:block[1]] - lo
+    rows = {}
+    for metric, v in values.items():
+        finite = np.isfinite(v)
+        total = np.add.reduceat(np.add.reduceat(np.where(finite, v, 0), origin_starts, axis=0), starts[:-1], axis=1)
+        n = np.add.reduceat(np.add.reduceat(finite, origin_starts, axis=0), starts[:-1], axis=1)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rows[metric] = np.where(n > 0, total / n, np.inf).astype(dtype)
+
+    return rows
+
+
+def _path_sums(pred, targets, weights, from_node):
+    """ Sum of link weights along the paths of trees to the target nodes. The paths to all targets are followed
+        back at once, paths that reached their origin are dropped in each step.
+
+    :param pred origins x nodes array of the incoming link of each node, -1 for roots and unreachable nodes
+    :returns origins x targets array
+    """
+    k, n = pred.shape
+    flat = pred.ravel()
+
+    total = np.zeros(k * len(targets))
+    base = np.repeat(np.arange(k, dtype=np.int64) * n, len(targets))
+    position = np.arange(len(total))
+    link = flat[base + np.tile(targets, k)]
+
+    while True:
+        active = np.flatnonzero(link >= 0)
+        if len(active) == 0:
+            break
+        if len(active) < len(link):
+            base, position, link = base[active], position[active], link[active]
+
+        total[position] += weights[link]
+        link = flat[base + from_node[link]]
+
+    return total.reshape(k, len(targets))
+
+
+# Router and arguments of a worker process, created once by the initializer of the pool
+_worker = None
+
+
+def _init_worker(handle, cost, args):
+    global _worker
+    _worker = Router(handle.attach(), cost), args
+
+
+def _skim_worker(block):
+    router, (sources, starts, metrics, same, directory, dtype) = _worker
+    rows = _skim_rows(router, block, sources, starts, metrics, same, directory, dtype)
+    if directory is None:
+        return rows
+
+    for metric, values in rows.items():
+        m = np.load(os.path.join(directory, metric + '.npy'), mmap_mode='r+')
+        m[block[0]:block[1]] = values
+        m.flush()
+
+    return None
@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
 
+import io
+import queue
+import threading
+
 from google.protobuf.internal.encoder import _EncodeVarint
 
 from xopen import xopen
@@ -7,8 +11,23 @@ from xopen import xopen
 from .pb.Wireformat_pb2 import ContentType, PBFileHeader
 from .pb.Events_pb2 import EventBatch
 
+# Supported version, message class and repeated field with the elements of each content type
 PB_VERSION = {
-    ContentType.EVENTS: (1, EventBatch)
+    ContentType.EVENTS: (1, EventBatch, 'events')
+}
+
+# Default size of chunks read from compressed streams
+CHUNK_SIZE = 1 << 20
+
+# Default options of :func:`open_file`, used by all readers unless overwritten per call
+IO_OPTIONS = {
+    # decompress in a separate thread, while the caller parses. Opt-in, as it only pays off with free cores
+    'background': False,
+    # passed to xopen. 0 decompresses in-process, None lets xopen start an external pigz/igzip process,
+    # which costs about 10 ms to start, but can be faster for large files on machines with free cores
+    'threads': 0,
+    'chunk_size': CHUNK_SIZE,
+    'max_chunks': 8
 }
 
 # Parses attributes of an element and adds them to the given dictionary
@@ -18,20 +37,224 @@ def parse_attributes(elem, dict):
     return dict
 
 
-def read_pb(filepath):
-    """ Read MATSim protobuf file and yield each element """
-    with xopen(filepath, "rb") as f:
+def events_format(filepath):
+    """ Format of an events file, 'xml', 'pb' or 'ndjson', determined by its name """
+    filepath = str(filepath)
+    for fmt in ('xml', 'pb', 'ndjson'):
+        if '.' + fmt in filepath:
+            return fmt
+
+    raise ValueError('Format of %s unknown or not supported' % filepath)
+
+
+def bounded_map(pool, func, tasks, workers):
+    """ Apply func to the tasks in an executor and yield the results in the order they finish.
+        At most 2 * workers tasks are in flight, which bounds the memory of their arguments and results.
+
+    :param pool executor the tasks are submitted to
+    :param func function to apply, needs to be picklable for process pools
+    :param tasks iterable of (key, args) tuples. Only args are passed to func, the key is yielded with the result.
+    :param workers number of workers of the executor
+    :returns generator of (key, result) tuples
+    """
+    from concurrent.futures import wait, FIRST_COMPLETED
+
+    pending = {}
+    for key, args in tasks:
+        pending[pool.submit(func, *args)] = key
+
+        if len(pending) > 2 * workers:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                yield pending.pop(f), f.result()
+
+    for f in wait(pending).done:
+        yield pending[f], f.result()
+
+
+def open_file(filepath, io_options=None):
+    """ Open a possibly compressed file for binary reading. This is the common I/O layer of all readers.
+
+    :param filepath path to the file, the compression is determined by xopen
+    :param io_options dictionary overwriting the defaults in :data:`IO_OPTIONS`
+    :returns binary file object, which needs to be closed
+    """
+    options = dict(IO_OPTIONS, **io_options) if io_options else IO_OPTIONS
+
+    unknown = set(options) - set(IO_OPTIONS)
+    if unknown:
+        raise ValueError("Unknown io options: %s" % ", ".join(sorted(unknown)))
+
+    stream = xopen(filepath, "rb", threads=options['threads'])
+    if not options['background']:
+        return stream
+
+    raw = BackgroundReader(stream, options['chunk_size'], options['max_chunks'])
+    return io.BufferedReader(raw, buffer_size=1 << 16)
+
+
+class BackgroundReader(io.RawIOBase):
+    """ Raw stream reading (and decompressing) another stream in a separate thread.
+        The chunks are handed over via a bounded queue, so that reading ahead is limited to max_chunks. """
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE, max_chunks=8):
+        super().__init__()
+        self._stream = stream
+        self._chunks = _read_chunks_background(stream, chunk_size, max_chunks)
+        self._buf = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if not self._buf:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._buf = memoryview(chunk)
+
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            # stops the thread, before the stream is closed under it
+            self._chunks.close()
+            self._stream.close()
+        super().close()
+
+
+def read_pb(filepath, chunk_size=CHUNK_SIZE, background=None, io_options=None):
+    """ Read MATSim protobuf file and yield each element
+
+    :param filepath path to the file
+    :param chunk_size number of bytes read from the (decompressed) stream at once
+    :param background decompress the file in a separate thread, while the caller parses the messages.
+        Default None uses the io options.
+    :param io_options options of the decompression, see :func:`open_file`
+    """
+    for header, batch in read_pb_messages(filepath, chunk_size, background, io_options):
+        field = PB_VERSION[header.contentType][2]
+        yield from getattr(batch, field)
+
+
+def read_pb_messages(filepath, chunk_size=CHUNK_SIZE, background=None, io_options=None):
+    """ Read MATSim protobuf file and yield the file header together with each delimited message.
+        The message class is determined by the content type of the header, see :data:`PB_VERSION`. """
+    options = dict(IO_OPTIONS, **io_options) if io_options else IO_OPTIONS
+    if background is None:
+        background = options['background']
+
+    # the frames are read in the background directly, which avoids copying them into another buffer
+    with open_file(filepath, dict(options, background=False)) as f:
+        frames = read_frames(f, chunk_size, background)
+
         header = PBFileHeader()
-        offset, pos = _read_varint(f)
-        header.ParseFromString(f.read(offset))
+        header.ParseFromString(next(frames, b""))
+
+        if header.contentType not in PB_VERSION:
+            raise Exception("Unsupported protobuf content type: %d" % header.contentType)
 
-        supported, msg = PB_VERSION[header.contentType]
+        supported, msg, _ = PB_VERSION[header.contentType]
         if supported < header.version:
             raise Exception("Unsupported protobuf version: %d" % header.version)
 
-        for batch in read_delimited(msg, f):
-            for ev in batch.events:
-                yield ev
+        for frame in frames:
+            m = msg()
+            m.ParseFromString(frame)
+            yield header, m
+
+
+def read_frames(stream, chunk_size=CHUNK_SIZE, background=False, offsets=False):
+    """ Split a stream of length-delimited messages into frames.
+        The stream is read in large chunks and the varint prefixes are decoded in place.
+        Each frame is yielded as memoryview into the chunk, so it is not copied before parsing.
+
+    :param stream binary stream to read from
+    :param chunk_size number of bytes read at once
+    :param background read the stream in a separate thread
+    :param offsets yield tuples of (offset, frame), where offset is the position of the frame relative to
+        the start of the stream, including its length prefix
+    """
+    chunks = _read_chunks_background(stream, chunk_size) if background else _read_chunks(stream, chunk_size)
+
+    buf = b""
+    # offset of the buffer start in the stream
+    base = 0
+    for chunk in chunks:
+        buf = buf + chunk if buf else chunk
+        view = memoryview(buf)
+        end = len(buf)
+        pos = 0
+
+        while pos < end:
+            length, n = _decode_varint(view, pos, end)
+            if n == 0 or pos + n + length > end:
+                # frame is not complete yet
+                break
+
+            frame = view[pos + n:pos + n + length]
+            yield (base + pos, frame) if offsets else frame
+            pos += n + length
+
+        # keep the incomplete remainder for the next chunk
+        view.release()
+        buf = buf[pos:]
+        base += pos
+
+    if buf:
+        raise RuntimeError('Truncated message at end of stream.')
+
+
+def _read_chunks(stream, chunk_size):
+    while 1:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _read_chunks_background(stream, chunk_size, max_chunks=8):
+    """ Read chunks in a separate thread and hand them over via a bounded queue """
+    q = queue.Queue(maxsize=max_chunks)
+    stop = threading.Event()
+
+    def put(item):
+        """ Hand over an item, gives up if the consumer stopped. Returns whether the item was handed over. """
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read():
+        try:
+            for chunk in _read_chunks(stream, chunk_size):
+                if not put(chunk):
+                    return
+            put(None)
+        except Exception as e:
+            put(e)
+
+    t = threading.Thread(target=read, name="matsim-reader", daemon=True)
+    t.start()
+
+    try:
+        while 1:
+            chunk = q.get()
+            if chunk is None:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        # reader might still be blocked on the queue if the consumer stopped early
+        stop.set()
+        t.join()
 
 
 def write_delimited(msgs, write):
@@ -54,6 +277,28 @@ def read_delimited(msg_class, stream):
         yield m
 
 
+def _decode_varint(buf, pos, end):
+    """
+    decode a varint from a buffer in place
+    :returns (result, bytes read), bytes read is 0 if the buffer ends before the varint
+    """
+    result = 0
+    shift = 0
+    i = pos
+    while i < end:
+        b = buf[i]
+        result |= ((b & 0x7f) << shift)
+        i += 1
+        if not (b & 0x80):
+            # Mask for 32bit integer
+            return result & 0xffffffff, i - pos
+        shift += 7
+        if shift >= 64:
+            raise RuntimeError('Too many bytes when decoding varint.')
+
+    return 0, 0
+
+
 def _read_varint(stream):
     """
     read a varint from a stream
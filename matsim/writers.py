@@ -286,3 +286,219 @@ class FacilitiesWriter(XmlWriter):
         self._require_scope(self.FACILITY_SCOPE)
         self._write_line(f'<activity type="{purpose}" />')
 
+
+
+class EventsWriter:
+    """ Writes events to xml, ndjson or protobuf files, which can be read by MATSim and :func:`matsim.Events.event_reader`.
+        The format is determined by the file name, the compression by its extension (e.g. .gz or .zst).
+
+        Events are serialized in batches, which are compressed and written on a background thread.
+        The writer needs to be closed after use, or used as context manager::
+
+            with EventsWriter("filtered_events.xml.gz") as writer:
+                writer.write_events(event_reader("output_events.xml.gz", types="entered link"))
+
+    :param filepath path of the output file
+    :param batch_size number of events serialized together. For protobuf, this is the size of each EventBatch.
+    :param background compress and write in a separate thread
+    :param compresslevel compression level, default None uses the default of the compression format
+    """
+
+    def __init__(self, filepath, batch_size=10000, background=True, compresslevel=None):
+        from xopen import xopen
+        from .utils import events_format
+
+        filepath = str(filepath)
+        self.format = events_format(filepath)
+
+        self.batch_size = batch_size
+        self._encode = getattr(self, '_encode_' + self.format)
+        self._pending = []
+
+        # compression happens in-process, within the writing thread
+        stream = xopen(filepath, 'wb', compresslevel=compresslevel, threads=0)
+        self._out = _BackgroundWriter(stream) if background else stream
+
+        self._write_header()
+
+    def write_event(self, event: dict):
+        """ Write a single event, given as dictionary of its attributes including time and type """
+        self._pending.append(event)
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+
+    def write_events(self, events):
+        """ Write all events of an iterable of event dictionaries """
+        for event in events:
+            self.write_event(event)
+
+    def write_batch(self, batch):
+        """ Write a :class:`matsim.Events.EventColumns` batch, attributes with missing values are omitted """
+        columns = [c for c in batch.columns if c != 'time']
+        values = [batch.values(c) for c in columns]
+
+        for i, t in enumerate(batch.time.tolist()):
+            event = {'time': t}
+            for c, v in zip(columns, values):
+                if v[i] is not None:
+                    event[c] = v[i]
+            self.write_event(event)
+
+    def close(self):
+        """ Write remaining events and the end of the file """
+        if self._out is None:
+            return
+
+        out = self._out
+        self._out = None
+        try:
+            self._flush_to(out)
+            if self.format == 'xml':
+                out.write(b'</events>\n')
+        finally:
+            out.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _write_header(self):
+        if self.format == 'xml':
+            self._out.write(b'<?xml version="1.0" encoding="utf-8"?>\n<events version="1.0">\n')
+        elif self.format == 'pb':
+            from .pb.Wireformat_pb2 import ContentType, PBFileHeader
+            from .utils import PB_VERSION, write_delimited
+
+            version = PB_VERSION[ContentType.EVENTS][0]
+            write_delimited([PBFileHeader(version=version, contentType=ContentType.EVENTS)], self._out.write)
+
+    def _flush(self):
+        self._flush_to(self._out)
+
+    def _flush_to(self, out):
+        if self._pending:
+            out.write(self._encode(self._pending))
+            self._pending = []
+
+    @staticmethod
+    def _encode_xml(events):
+        from xml.sax.saxutils import escape
+
+        # always quote with ", as MATSim does and the pre-parse filters expect
+        entities = {'"': '&quot;', '\n': '&#10;', '\t': '&#9;'}
+
+        lines = []
+        for event in events:
+            attrs = ['time="%s"' % float(event['time']), 'type="%s"' % escape(event['type'], entities)]
+            attrs += ['%s="%s"' % (k, escape(str(v), entities)) for k, v in event.items() if k != 'time' and k != 'type']
+            lines.append('\t<event %s  />\n' % ' '.join(attrs))
+
+        return ''.join(lines).encode('utf-8')
+
+    @staticmethod
+    def _encode_ndjson(events):
+        import json
+
+        # MATSim writes all attributes, including time, as strings
+        lines = []
+        for event in events:
+            event = {k: str(float(v)) if k == 'time' else str(v) for k, v in event.items()}
+            lines.append(json.dumps(event, ensure_ascii=False, separators=(',', ':')))
+            lines.append('\n')
+
+        return ''.join(lines).encode('utf-8')
+
+    @staticmethod
+    def _encode_pb(events):
+        import io
+        from .pb.Events_pb2 import EventBatch
+        from .utils import write_delimited
+
+        batch = EventBatch()
+        for event in events:
+            _to_pb_event(event, batch.events.add())
+
+        buf = io.BytesIO()
+        write_delimited([batch], buf.write)
+        return buf.getvalue()
+
+
+def _to_pb_event(event, pb):
+    """ Fill a protobuf event from an event dictionary. Events of types without a dedicated message,
+        or with attributes the message can not hold, are stored as generic events. """
+    from .Events import PB_ATTRIBUTES, PB_TYPES
+
+    pb.time = float(event['time'])
+
+    x, y = event.get('x'), event.get('y')
+    if x is not None and y is not None:
+        pb.coords.x = float(x)
+        pb.coords.y = float(y)
+
+    case = PB_TYPES.get(event['type'])
+    fields = PB_ATTRIBUTES.get(case)
+    if fields is not None and all(k in fields for k in event if k not in ('time', 'type', 'x', 'y')):
+        msg = getattr(pb, case)
+        msg.SetInParent()
+        for k, v in event.items():
+            field = fields.get(k)
+            if field is None:
+                continue
+            elif field.endswith('Id'):
+                getattr(msg, field).id = str(v)
+            elif msg.DESCRIPTOR.fields_by_name[field].type == msg.DESCRIPTOR.fields_by_name[field].TYPE_DOUBLE:
+                setattr(msg, field, float(v))
+            else:
+                setattr(msg, field, str(v))
+        return
+
+    pb.generic.type = event['type']
+    for k, v in event.items():
+        if k not in ('time', 'type', 'x', 'y'):
+            pb.generic.attrs[k] = str(v)
+
+
+class _BackgroundWriter:
+    """ Writes to a stream in a separate thread, so that serializing the next data overlaps with
+        compressing and writing the previous. Errors of the thread are raised by the next call. """
+
+    def __init__(self, stream, max_chunks=8):
+        import queue
+        import threading
+
+        self.stream = stream
+        self.queue = queue.Queue(max_chunks)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                data = self.queue.get()
+                if data is None:
+                    return
+                self.stream.write(data)
+        except BaseException as e:
+            self.error = e
+            # keep consuming, so that the producer never blocks
+            while self.queue.get() is not None:
+                pass
+        finally:
+            try:
+                self.stream.close()
+            except BaseException as e:
+                self.error = self.error or e
+
+    def write(self, data):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(data)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
@@ -35,6 +35,8 @@ setup(
         # https://github.com/BayesWitnesses/m2cgen/issues/581
         'scenariogen': ["sumolib", "traci", "lxml", "optax", "requests", "tqdm", "scikit-learn", "xgboost==1.7.1", "lightgbm",
                         "sklearn-contrib-lightning", "numpy", "sympy", "m2cgen", "shapely", "optuna", "statsmodels"],
+        'events': ["pyarrow >= 10.0.0", "orjson >= 3.0.0"],
+        'routing': ["scipy >= 1.8.0"],
         'viz': ["dash", "plotly.express", "dash_cytoscape", "dash_bootstrap_components"]
     },
     tests_require=["assertpy", "pytest", "scipy"],
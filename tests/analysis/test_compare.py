@@ -0,0 +1,62 @@
+import pathlib
+
+from matsim import Events
+from matsim.analysis import compare_events, merge_events
+from matsim.writers import EventsWriter
+
+HERE = pathlib.Path(__file__).parent.parent
+
+
+def test_merge_events():
+    files = [HERE / 'output_events.xml.gz', HERE / 'output_events.pb.gz', HERE / 'output_events.ndjson.gz']
+    merged = list(merge_events(*files, types='actend'))
+
+    assert len(merged) == 3 * 201
+    assert [t for _, t, _ in merged] == sorted(t for _, t, _ in merged)
+    # same times are ordered by file
+    assert [i for i, _, _ in merged[:3]] == [0, 1, 2]
+
+
+def test_compare_identical():
+    c = compare_events(HERE / 'output_events.xml.gz', HERE / 'output_events.pb.gz')
+
+    assert c.identical
+    assert c.first_difference is None
+    assert c.summary()['base_events'] == 3008
+    assert (c.links()['diff'] == 0).all()
+    assert (c.persons()['diff_trav_time'] == 0).all()
+
+
+def test_compare_policy(tmp_path):
+    base = HERE / 'output_events.xml.gz'
+    policy = tmp_path / 'events.xml.gz'
+
+    events = list(Events.event_reader(base))
+    changed = []
+    for e in events:
+        # link 6 is used less, and person 2 arrives 10 seconds later
+        if e['type'] == 'entered link' and e['link'] == '6' and int(e['vehicle']) % 2 == 0:
+            continue
+        if e['type'] == 'arrival' and e['person'] == '2':
+            e = dict(e, time=e['time'] + 10)
+        changed.append(e)
+
+    with EventsWriter(policy) as writer:
+        writer.write_events(sorted(changed, key=lambda e: e['time']))
+
+    c = compare_events(base, policy)
+    removed = len(events) - len(changed)
+    arrivals = sum(1 for e in events if e['type'] == 'arrival' and e['person'] == '2')
+
+    assert not c.identical
+    assert c.n_different == removed + 2 * arrivals
+    assert c.first_difference is not None
+    assert len(c.examples) == 10
+
+    links = c.links().set_index('link_id')
+    assert links.loc['6', 'diff'] == -removed
+    assert links['diff'].drop('6').eq(0).all()
+
+    persons = c.persons().set_index('person')
+    assert persons.loc['2', 'diff_trav_time'] == 10 * arrivals
+    assert persons['diff_trav_time'].drop('2').eq(0).all()
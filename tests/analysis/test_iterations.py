@@ -0,0 +1,51 @@
+import os
+import pathlib
+import shutil
+
+import pytest
+
+from matsim.analysis import iteration_event_files, scan_iterations, iteration_aggregates, link_volumes
+
+HERE = pathlib.Path(__file__).parent.parent
+
+
+@pytest.fixture
+def run_dir(tmp_path):
+    for it, fmt in [(0, 'xml'), (1, 'pb'), (10, 'ndjson')]:
+        d = tmp_path / 'ITERS' / ('it.%d' % it)
+        d.mkdir(parents=True)
+        shutil.copy(HERE / ('output_events.%s.gz' % fmt), d / ('run.%d.events.%s.gz' % (it, fmt)))
+        (d / ('run.%d.legHistogram.txt' % it)).write_text('')
+
+    # pb is preferred over xml
+    shutil.copy(HERE / 'output_events.xml.gz', tmp_path / 'ITERS' / 'it.1' / 'run.1.events.xml.gz')
+    (tmp_path / 'ITERS' / 'it.5').mkdir()
+    (tmp_path / 'ITERS' / 'plots').mkdir()
+    return tmp_path
+
+
+def test_iteration_event_files(run_dir):
+    files = iteration_event_files(run_dir)
+    assert list(files) == [0, 1, 10]
+    assert files[1].endswith('run.1.events.pb.gz')
+
+    assert list(iteration_event_files(run_dir, iterations=[10])) == [10]
+
+    with pytest.raises(ValueError):
+        iteration_event_files(run_dir / 'ITERS')
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_iteration_aggregates(run_dir, workers):
+    shares, links = iteration_aggregates(run_dir, workers=workers)
+
+    assert list(shares.index) == [0, 1, 10]
+    assert (shares['car'] == 1.0).all()
+
+    volumes = link_volumes(HERE / 'output_events.xml.gz').sum(axis=1)
+    for it in (0, 1, 10):
+        assert links.loc[it][volumes.index[volumes > 0]].tolist() == volumes[volumes > 0].tolist()
+
+
+def test_scan_iterations(run_dir):
+    assert scan_iterations(run_dir, os.path.getsize, workers=1)[10] > 0
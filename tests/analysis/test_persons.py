@@ -0,0 +1,45 @@
+import pathlib
+from collections import defaultdict
+
+import pytest
+
+from matsim import Events
+from matsim.analysis import group_events_by_person
+
+HERE = pathlib.Path(__file__).parent.parent
+
+
+def _expected(filepath):
+    groups = defaultdict(list)
+    for e in Events.event_reader(filepath):
+        if 'person' in e:
+            groups[e['person']].append(e)
+    return groups
+
+
+def _n_departures(person, events):
+    return sum(1 for e in events if e['type'] == 'departure')
+
+
+@pytest.mark.parametrize('memory_budget', [1 << 30, 20000])
+def test_group_events_by_person(tmp_path, memory_budget):
+    filepath = HERE / 'output_events.xml.gz'
+    groups = list(group_events_by_person(filepath, memory_budget=memory_budget, n_shards=7, tmpdir=tmp_path))
+
+    assert dict(groups) == _expected(filepath)
+    assert len(groups) == len(set(p for p, _ in groups))
+    # temporary files are removed
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize('memory_budget', [1 << 30, 20000])
+def test_group_events_parallel(memory_budget):
+    filepath = HERE / 'output_events.pb.gz'
+    result = dict(group_events_by_person(filepath, types='departure,arrival', memory_budget=memory_budget,
+                                         func=_n_departures, workers=2))
+
+    expected = {p: _n_departures(p, e) for p, e in _expected(filepath).items()}
+    assert result == expected
+
+    with pytest.raises(ValueError):
+        next(group_events_by_person(filepath, workers=2))
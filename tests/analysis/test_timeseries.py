@@ -0,0 +1,55 @@
+import pathlib
+from collections import Counter, defaultdict
+
+import pytest
+
+from matsim import Events
+from matsim.analysis import TimeSeries, time_series
+from matsim.EventsManager import EventsManager
+
+HERE = pathlib.Path(__file__).parent.parent
+
+files = ['output_events.xml.gz', 'output_events.pb.gz', 'output_events.ndjson.gz']
+
+
+@pytest.mark.parametrize('filepath', files)
+def test_time_series(filepath):
+    result = time_series(HERE / filepath, {
+        'departures': {'types': 'departure', 'by': 'legMode'},
+        'activities': {'types': 'actstart,actend', 'by': ['type', 'actType']},
+        'position': {'types': 'vehicle enters traffic', 'value': 'relativePosition'},
+        'all': {}
+    }, bin_size=900, batch_size=100)
+
+    events = list(Events.event_reader(HERE / filepath))
+
+    def b(e):
+        return float(e['time']) // 900 * 900
+
+    departures = Counter((b(e), e['legMode']) for e in events if e['type'] == 'departure')
+    df = result['departures']
+    assert list(df.columns) == ['time', 'legMode', 'count']
+    assert {(r.time, r.legMode): r.count for r in df.itertuples()} == departures
+    assert df.time.is_monotonic_increasing
+
+    activities = Counter((b(e), e['type'], e['actType']) for e in events if e['type'] in ('actstart', 'actend'))
+    assert {(r.time, r.type, r.actType): r.count for r in result['activities'].itertuples()} == activities
+
+    position = defaultdict(float)
+    for e in events:
+        if e['type'] == 'vehicle enters traffic':
+            position[b(e)] += float(e['relativePosition'])
+    assert {r.time: r.relativePosition for r in result['position'].itertuples()} == pytest.approx(position)
+
+    assert result['all']['count'].sum() == len(events)
+
+
+def test_time_series_manager():
+    ts = TimeSeries(bin_size=3600).add('arrivals', types='arrival', by='legMode').add('stuck', types='stuck')
+    assert ts.types == {'arrival', 'stuck'}
+    assert ts.columns == ['legMode']
+
+    EventsManager().add_batch_handler(ts).run(HERE / 'output_events.xml.gz')
+
+    assert ts.to_dataframe('arrivals')['count'].sum() == 201
+    assert ts.to_dataframe('stuck').empty
@@ -0,0 +1,99 @@
+import pathlib
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from matsim import Events, Network
+from matsim.analysis import LinkTravelTimes, link_travel_times
+from matsim.EventsManager import EventsManager
+
+HERE = pathlib.Path(__file__).parent.parent
+
+files = ['output_events.xml.gz', 'output_events.pb.gz', 'output_events.ndjson.gz']
+
+
+def _expected(filepath, bin_size):
+    entered = {}
+    result = defaultdict(list)
+    for e in Events.event_reader(HERE / filepath, types=LinkTravelTimes.types):
+        t = float(e['time'])
+        if e['type'] == 'entered link':
+            entered[e['vehicle']] = (e['link'], t)
+        elif e['type'] == 'left link':
+            link, start = entered.pop(e['vehicle'], (None, None))
+            if link == e['link']:
+                result[(link, start // bin_size * bin_size)].append(t - start)
+        else:
+            entered.pop(e['vehicle'], None)
+
+    return result
+
+
+@pytest.mark.parametrize('filepath', files)
+def test_link_travel_times(filepath):
+    network = Network.read_network(HERE / 'test_network.xml.gz')
+
+    # small batches, so that vehicles are on a link across batch boundaries
+    tt = link_travel_times(HERE / filepath, network=network, percentiles=(50, 90), batch_size=50)
+    df = tt.to_dataframe()
+
+    expected = _expected(filepath, 900)
+    assert len(df) == len(expected)
+
+    for r in df.itertuples():
+        values = expected[(r.link_id, r.time)]
+        assert r.count == len(values)
+        assert r.mean == pytest.approx(np.mean(values))
+        assert r.min == min(values) and r.max == max(values)
+        assert r.p50 == pytest.approx(np.percentile(values, 50))
+        assert r.p90 == pytest.approx(np.percentile(values, 90))
+
+    assert (df.congestion > 0.99).all()
+    assert df.speed.to_numpy() == pytest.approx(network.links.set_index('link_id').length[df.link_id].to_numpy() / df['mean'].to_numpy())
+
+    matrix = tt.travel_time_matrix()
+    assert matrix.shape == (len(network.links), 120)
+    assert (matrix >= tt.freespeed_travel_time()[:, None].astype(np.float32) - 1e-3).all()
+
+
+def test_without_network():
+    tt = LinkTravelTimes(bin_size=3600, n_bins=30)
+    EventsManager().add_batch_handler(tt).run(HERE / 'output_events.xml.gz')
+
+    df = tt.to_dataframe()
+    assert df['count'].sum() == sum(len(v) for v in _expected('output_events.xml.gz', 3600).values())
+    assert 'congestion' not in df
+
+    with pytest.raises(ValueError):
+        tt.travel_time_matrix()
+
+
+def test_large_network():
+    import tracemalloc
+    from types import SimpleNamespace
+
+    import pandas as pd
+    from matsim.Events import BatchBuilder
+
+    n = 100000
+    network = SimpleNamespace(links=pd.DataFrame({'link_id': [str(i) for i in range(n)]}))
+    tt = LinkTravelTimes(network, n_bins=30)
+
+    builder = BatchBuilder(LinkTravelTimes.columns)
+    for i in range(50):
+        builder.append(100.0 * i, ['entered link', str(i * 997 % n), 'v%d' % i])
+        builder.append(100.0 * i + 10, ['left link', str(i * 997 % n), 'v%d' % i])
+    batch = builder.flush()
+
+    tracemalloc.start()
+    try:
+        tt.handle_batch(batch)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    # only the cells of the batch are updated, the links x bins matrices (24 MB each) are not copied
+    assert peak < 1 << 20
+    assert tt.count.sum() == 50
+    assert tt.sum.sum() == pytest.approx(500)
@@ -0,0 +1,79 @@
+import pathlib
+from collections import Counter
+
+import pytest
+
+from matsim import Events, Network, Vehicle
+from matsim.analysis import LinkVolumes, link_volumes
+from matsim.EventsManager import EventsManager
+
+HERE = pathlib.Path(__file__).parent.parent
+
+files = ['output_events.xml.gz', 'output_events.pb.gz', 'output_events.ndjson.gz']
+
+
+def _expected(filepath, bin_size):
+    return Counter((e['link'], float(e['time']) // bin_size * bin_size)
+                   for e in Events.event_reader(HERE / filepath, types='entered link'))
+
+
+@pytest.mark.parametrize('filepath', files)
+def test_link_volumes(filepath):
+    network = Network.read_network(HERE / 'test_network.xml.gz')
+
+    df = link_volumes(HERE / filepath, network=network, bin_size=900, n_bins=120, batch_size=100)
+
+    assert list(df.index) == list(network.links.link_id)
+    assert df.values.sum() == 700
+
+    tidy = LinkVolumes(bin_size=900, n_bins=120)
+    EventsManager().add_batch_handler(tidy).run(HERE / filepath)
+
+    result = {(r.link_id, r.time): r.count for r in tidy.tidy().itertuples()}
+    assert result == _expected(filepath, 900)
+
+
+def test_vehicle_filter():
+    vehicles = {'1': 'car', '2': 'truck', '3': 'car'}
+
+    df = link_volumes(HERE / 'output_events.xml.gz', vehicles=vehicles, vehicle_types=['car'])
+    expected = sum(1 for e in Events.event_reader(HERE / 'output_events.xml.gz', types='entered link')
+                   if e['vehicle'] in ('1', '3'))
+
+    assert df.values.sum() == expected
+
+    # all vehicle types in the file have network mode car
+    v = Vehicle.vehicle_reader(HERE / 'output_allVehicles.xml.gz')
+    assert link_volumes(HERE / 'output_events.xml.gz', vehicles=v, modes=['bike']).values.sum() == 0
+
+    with pytest.raises(ValueError):
+        LinkVolumes(modes=['car'])
+
+
+def test_large_network():
+    import tracemalloc
+    from types import SimpleNamespace
+
+    import pandas as pd
+    from matsim.Events import BatchBuilder
+
+    n = 100000
+    network = SimpleNamespace(links=pd.DataFrame({'link_id': [str(i) for i in range(n)]}))
+    volumes = LinkVolumes(network, bin_size=900, n_bins=30)
+
+    builder = BatchBuilder(LinkVolumes.columns)
+    for i in range(100):
+        builder.append(100.0 * i, ['entered link', str(i * 997 % n), 'v%d' % i])
+    batch = builder.flush()
+
+    tracemalloc.start()
+    try:
+        volumes.handle_batch(batch)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    # only the cells of the batch are updated, the links x bins matrix (24 MB) is not copied
+    assert peak < 1 << 20
+    assert volumes.counts.sum() == 100
+    assert volumes.counts[997, 0] == 1
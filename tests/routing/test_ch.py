@@ -0,0 +1,119 @@
+import pathlib
+import shutil
+
+import numpy as np
+import pytest
+
+from matsim import Network
+from matsim.routing import ContractionHierarchy, Router, contraction_hierarchy
+from matsim.routing.ch import CH_SUFFIX
+
+HERE = pathlib.Path(__file__).parent.parent
+
+
+@pytest.fixture(scope="module")
+def network():
+    return Network.read_network(HERE / 'test_network.xml.gz')
+
+
+@pytest.fixture(scope="module")
+def pairs(network):
+    n = len(network.nodes)
+    return np.repeat(np.arange(n), n), np.tile(np.arange(n), n)
+
+
+@pytest.mark.parametrize('cost', ['freespeed', 'length'])
+def test_route_many(network, pairs, cost):
+    graph = network.to_graph()
+    ch = ContractionHierarchy.build(network, cost)
+    expected = Router(network, cost).route_many(*pairs)
+
+    routes = ch.route_many(*pairs)
+    assert routes.cost == pytest.approx(expected.cost)
+
+    link_cost = graph.travel_time() if cost == 'freespeed' else graph.length
+    for i, (o, d) in enumerate(zip(*pairs)):
+        path = routes.path(i)
+        if o == d:
+            assert len(path) == 0
+            continue
+
+        assert graph.from_node[path[0]] == o and graph.to_node[path[-1]] == d
+        assert (graph.to_node[path[:-1]] == graph.from_node[path[1:]]).all()
+        assert link_cost[path].sum() == pytest.approx(routes.cost[i])
+
+    assert ch.route_many(*pairs, paths=False).cost == pytest.approx(expected.cost)
+
+
+def test_route(network):
+    ch = ContractionHierarchy.build(network)
+    cost, links = ch.route('1', '15')
+    expected, _ = Router(network).route('1', '15')
+
+    assert cost == pytest.approx(expected)
+    assert links[0] in set(network.links.link_id[network.links.from_node == '1'])
+    assert links[-1] in set(network.links.link_id[network.links.to_node == '15'])
+
+
+def test_matrix(network, pairs):
+    ch = ContractionHierarchy.build(network)
+    n = len(network.nodes)
+
+    matrix = ch.matrix(np.arange(n), np.arange(n))
+    assert matrix.shape == (n, n)
+    assert matrix.ravel() == pytest.approx(ch.route_many(*pairs, paths=False).cost)
+
+    assert ch.matrix(['1', '2'], ['15']).shape == (2, 1)
+
+
+def test_unreachable(network):
+    links = network.links[network.links.to_node != '1']
+    ch = ContractionHierarchy.build(Network.Network(network.nodes, links, None, None))
+
+    assert ch.route('2', '1') == (np.inf, [])
+    assert np.isinf(ch.matrix(['2'], ['1'])).all()
+
+
+def test_save_load(network, pairs, tmp_path):
+    ch = ContractionHierarchy.build(network)
+    ch.save(tmp_path / 'ch.npz')
+
+    loaded = ContractionHierarchy.load(tmp_path / 'ch.npz', network)
+    assert loaded.edge_children.tolist() == ch.edge_children.tolist()
+    assert loaded.route_many(*pairs).links.tolist() == ch.route_many(*pairs).links.tolist()
+
+    with pytest.raises(ValueError):
+        ContractionHierarchy.load(tmp_path / 'ch.npz', Network.Network(network.nodes, network.links.iloc[:5], None, None))
+
+
+def test_sidecar(network, tmp_path):
+    path = tmp_path / 'network.xml.gz'
+    shutil.copy(HERE / 'test_network.xml.gz', path)
+    sidecar = tmp_path / ('network.xml.gz' + CH_SUFFIX)
+
+    ch = contraction_hierarchy(path)
+    assert sidecar.exists()
+
+    mtime = sidecar.stat().st_mtime_ns
+    again = contraction_hierarchy(path, network=network)
+    assert sidecar.stat().st_mtime_ns == mtime
+    assert again.meta == ch.meta
+
+    # other costs lead to a new hierarchy
+    by_length = contraction_hierarchy(path, cost='length', network=network)
+    assert by_length.meta['meta_cost'] == 'length'
+    assert by_length.route('1', '15')[0] == pytest.approx(Router(network, 'length').route('1', '15')[0])
+
+    cost = np.ones(len(network.links))
+    assert contraction_hierarchy(path, cost=cost, network=network).route('1', '15')[0] == \
+           pytest.approx(Router(network, cost).route('1', '15')[0])
+
+    # broken files are rebuilt
+    sidecar.write_bytes(b'invalid')
+    contraction_hierarchy(path, network=network)
+    assert ContractionHierarchy.load(sidecar, network).meta['meta_cost'] == 'freespeed'
+
+
+def test_time_dependent(network):
+    with pytest.raises(ValueError):
+        ContractionHierarchy.build(network, np.ones((len(network.links), 2)))
@@ -0,0 +1,95 @@
+import pathlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from matsim import Network
+from matsim.routing import Graph
+
+HERE = pathlib.Path(__file__).parent.parent
+
+
+@pytest.fixture(scope="module")
+def network():
+    return Network.read_network(HERE / 'test_network.xml.gz')
+
+
+def test_to_graph(network):
+    graph = network.to_graph()
+    links = network.links
+
+    assert graph.n_nodes == len(network.nodes)
+    assert graph.n_links == len(links)
+    assert network.to_graph() is graph
+
+    assert graph.from_node.dtype == np.int32 and graph.out_links.dtype == np.int32
+    assert graph.length.dtype == np.float32
+
+    for i, link in enumerate(links.itertuples()):
+        assert graph.link_index[link.link_id] == i
+        assert graph.node_ids[graph.from_node[i]] == link.from_node
+        assert graph.node_ids[graph.to_node[i]] == link.to_node
+        assert graph.length[i] == pytest.approx(link.length)
+
+    for node, i in graph.node_index.items():
+        assert set(graph.link_ids[graph.outgoing(i)]) == set(links.link_id[links.from_node == node])
+        assert set(graph.link_ids[graph.incoming(i)]) == set(links.link_id[links.to_node == node])
+
+    assert graph.node_indices([graph.node_ids[3], 'unknown']).tolist() == [3, -1]
+
+
+def test_to_graph_rebuilt(network):
+    graph = network.to_graph()
+
+    net = Network.Network(network.nodes, network.links.iloc[:5], None, None)
+    assert net.to_graph().n_links == 5
+    assert network.to_graph() is graph
+
+
+def test_unknown_node(network):
+    links = network.links.copy()
+    links.loc[0, 'to_node'] = 'unknown'
+
+    with pytest.raises(ValueError):
+        Network.Network(network.nodes, links, None, None).to_graph()
+
+
+def _total_length(handle):
+    graph = handle.attach()
+    return float(graph.length.sum()), graph.link_ids[graph.out_links].tolist()
+
+
+def test_shared_graph(network):
+    graph = network.to_graph()
+
+    with graph.share() as handle:
+        attached = handle.attach()
+        assert isinstance(attached, Graph)
+        assert not attached.length.flags.writeable
+        for name in ('node_ids', 'out_offsets', 'in_links', 'capacity', 'x'):
+            assert np.array_equal(getattr(attached, name), getattr(graph, name))
+
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            results = list(pool.map(_total_length, [handle] * 3))
+
+        del attached
+
+    for length, order in results:
+        assert length == pytest.approx(float(graph.length.sum()))
+        assert order == graph.link_ids[graph.out_links].tolist()
+
+
+def test_attach_tracker(network):
+    import pickle
+    from multiprocessing import resource_tracker
+
+    register = resource_tracker.register
+    graph = network.to_graph()
+
+    with graph.share() as handle:
+        # a handle received from elsewhere attaches without registering the memory again
+        attached = pickle.loads(pickle.dumps(handle)).attach()
+        assert np.array_equal(attached.length, graph.length)
+        assert resource_tracker.register is register
+        del attached
@@ -0,0 +1,119 @@
+import pathlib
+
+import numpy as np
+import pytest
+
+from matsim import Network
+from matsim.routing import Router
+
+HERE = pathlib.Path(__file__).parent.parent
+
+
+@pytest.fixture(scope="module")
+def network():
+    return Network.read_network(HERE / 'test_network.xml.gz')
+
+
+@pytest.fixture(scope="module")
+def pairs(network):
+    n = len(network.nodes)
+    return np.repeat(np.arange(n), n), np.tile(np.arange(n), n)
+
+
+def _check_paths(graph, routes, origins, destinations, cost):
+    for i in range(len(routes)):
+        path = routes.path(i)
+        if len(path) == 0:
+            assert origins[i] == destinations[i] or np.isinf(routes.cost[i])
+            continue
+
+        assert graph.from_node[path[0]] == origins[i]
+        assert graph.to_node[path[-1]] == destinations[i]
+        assert (graph.to_node[path[:-1]] == graph.from_node[path[1:]]).all()
+        assert cost[path].sum() == pytest.approx(routes.cost[i])
+
+
+@pytest.mark.parametrize('algorithm', ['dijkstra', 'astar'])
+@pytest.mark.parametrize('csgraph', [True, False])
+def test_route_many(network, pairs, algorithm, csgraph, monkeypatch):
+    router = Router(network, algorithm=algorithm)
+    if not csgraph:
+        monkeypatch.setattr(router, '_use_csgraph', lambda: False)
+
+    routes = router.route_many(*pairs, chunk_size=50)
+    graph = network.to_graph()
+
+    assert len(routes) == len(pairs[0])
+    assert np.isfinite(routes.cost).all()
+    _check_paths(graph, routes, *pairs, graph.travel_time())
+
+    expected, _ = router.tree(graph.node_ids[3])
+    assert routes.cost[pairs[0] == 3] == pytest.approx(expected)
+    assert routes.distance() == pytest.approx([graph.length[routes.path(i)].sum() for i in range(len(routes))])
+
+
+def test_route(network):
+    router = Router(network, cost='length')
+    cost, links = router.route('1', '15')
+
+    assert links[0] in set(network.links.link_id[network.links.from_node == '1'])
+    assert cost == pytest.approx(network.links.set_index('link_id').length[links].sum())
+
+    assert router.route('1', '1') == (0, [])
+
+
+def test_unreachable(network):
+    links = network.links[network.links.to_node != '1']
+    router = Router(Network.Network(network.nodes, links, None, None))
+
+    routes = router.route_many(['2', '1'], ['1', '2'])
+    assert np.isinf(routes.cost[0])
+    assert len(routes.path(0)) == 0
+    assert np.isfinite(routes.cost[1])
+
+
+def test_time_dependent(network, pairs):
+    graph = network.to_graph()
+    tt = graph.travel_time()
+
+    # constant travel times give the static result
+    matrix = np.repeat(tt[:, None], 4, axis=1)
+    static = Router(network).route_many(*pairs)
+    dynamic = Router(network, cost=matrix, bin_size=900).route_many(*pairs, times=np.full(len(pairs[0]), 100))
+    assert dynamic.cost == pytest.approx(static.cost)
+
+    # a congested link after the first bin is avoided by later departures
+    path = static.path(np.flatnonzero((pairs[0] == 0) & (pairs[1] == 12))[0])
+    matrix[path[1], 1:] *= 100
+    router = Router(network, cost=matrix, bin_size=900)
+
+    early, early_path = router.route('1', '13', time=0)
+    late, late_path = router.route('1', '13', time=3600)
+
+    assert early == pytest.approx(static.cost[(pairs[0] == 0) & (pairs[1] == 12)][0])
+    assert late > early or graph.link_ids[path[1]] not in late_path
+
+    routes = router.route_many(*pairs, times=np.full(len(pairs[0]), 3600.0))
+    _check_paths(graph, routes, *pairs, matrix[:, -1])
+
+
+def test_parallel(network, pairs):
+    router = Router(network)
+    expected = router.route_many(*pairs)
+    routes = router.route_many(*pairs, workers=2, chunk_size=20)
+
+    assert routes.cost == pytest.approx(expected.cost)
+    assert routes.offsets.tolist() == expected.offsets.tolist()
+    assert routes.links.tolist() == expected.links.tolist()
+
+    costs = router.route_many(*pairs, paths=False, workers=2, chunk_size=20)
+    assert costs.cost == pytest.approx(expected.cost)
+
+
+def test_invalid(network):
+    with pytest.raises(ValueError):
+        Router(network, cost=np.ones(3))
+    with pytest.raises(ValueError):
+        Router(network, cost=np.ones((len(network.links), 2)))
+    with pytest.raises(ValueError):
+        Router(network).route('1', 'unknown')
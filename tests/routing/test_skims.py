@@ -0,0 +1,108 @@
+import importlib
+import pathlib
+
+import numpy as np
+import pytest
+
+from matsim import Network
+from matsim.routing import Router, Skims, skims, zone_connectors
+
+# the module is shadowed by the function of the same name
+skims_module = importlib.import_module('matsim.routing.skims')
+
+HERE = pathlib.Path(__file__).parent.parent
+
+ZONES = {'a': ['1', '2'], 'b': '5', 'c': ['10', '15'], 'd': ['13']}
+
+
+@pytest.fixture(scope="module")
+def network():
+    return Network.read_network(HERE / 'test_network.xml.gz')
+
+
+def _expected(network, zones, metric):
+    router = Router(network)
+    graph = network.to_graph()
+    weights = {'cost': graph.travel_time(), 'time': graph.travel_time(), 'distance': graph.length}[metric]
+
+    result = np.zeros((len(zones), len(zones)))
+    for i, o in enumerate(zones.values()):
+        for j, d in enumerate(zones.values()):
+            o, d = [o] if isinstance(o, str) else o, [d] if isinstance(d, str) else d
+            routes = router.route_many(np.repeat(o, len(d)), np.tile(d, len(o)))
+            result[i, j] = np.mean([weights[routes.path(k)].sum() for k in range(len(routes))])
+
+    return result
+
+
+def test_skims(network):
+    result = skims(network, ZONES, metrics=('cost', 'time', 'distance'))
+
+    assert result.zones == list(ZONES)
+    for metric in ('cost', 'time', 'distance'):
+        assert result[metric].dtype == np.float32
+        assert result[metric] == pytest.approx(_expected(network, ZONES, metric), rel=1e-5)
+
+    df = result.to_dataframe()
+    assert len(df) == 16
+    assert df.set_index(['from_zone', 'to_zone']).distance[('a', 'd')] == pytest.approx(result['distance'][0, 3])
+
+
+def test_parallel(network, tmp_path, monkeypatch):
+    expected = skims(network, ZONES)
+
+    # one zone per block
+    monkeypatch.setattr(skims_module, 'TREE_BLOCK_SIZE', len(network.nodes))
+    result = skims(network, ZONES, workers=2, directory=tmp_path)
+
+    for metric in ('cost', 'distance'):
+        assert np.array_equal(result[metric], expected[metric])
+
+    stored = Skims.read(tmp_path)
+    assert stored.zones == list(ZONES)
+    assert isinstance(stored['cost'], np.memmap)
+    assert np.array_equal(stored['cost'], expected['cost'])
+
+
+def test_unreachable(network):
+    links = network.links[network.links.to_node != '1']
+    result = skims(Network.Network(network.nodes, links, None, None), {'a': '1', 'b': '2'})
+
+    assert np.isinf(result['cost'][1, 0])
+    assert np.isfinite(result['cost'][0, 1])
+
+
+def test_to_files(network, tmp_path):
+    pytest.importorskip('pyarrow')
+    import pandas as pd
+
+    result = skims(network, ZONES)
+    result.to_parquet(tmp_path / 'skims.parquet')
+    result.to_npy(tmp_path / 'npy')
+
+    df = pd.read_parquet(tmp_path / 'skims.parquet')
+    assert df.cost.to_numpy() == pytest.approx(result['cost'].ravel())
+    assert Skims.read(tmp_path / 'npy', mmap_mode=None)['distance'].tolist() == result['distance'].tolist()
+
+
+def test_zone_connectors(network):
+    gpd = pytest.importorskip('geopandas')
+    from shapely.geometry import box
+
+    zones = gpd.GeoDataFrame({'id': ['west', 'center', 'empty']},
+                             geometry=[box(-21000, -1000, -14000, 1000), box(-1000, -1000, 6000, 1000),
+                                       box(-21000, -13000, -19000, -11000)])
+
+    connectors = zone_connectors(network, zones, column='id', n_connectors=2)
+    assert set(connectors['west']) == {'1', '2'}
+    assert connectors['center'] == ['12', '13']
+    assert connectors['empty'] == ['15']
+
+    assert skims(network, zones, column='id')['cost'].shape == (3, 3)
+
+
+def test_invalid(network):
+    with pytest.raises(ValueError):
+        skims(network, {'a': 'unknown'})
+    with pytest.raises(ValueError):
+        skims(network, ZONES, metrics=('speed',))
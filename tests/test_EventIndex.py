@@ -0,0 +1,66 @@
+import pathlib
+import shutil
+
+import pytest
+
+from matsim import Events, EventIndex
+
+HERE = pathlib.Path(__file__).parent
+
+files = ['output_events.xml.gz', 'output_events.pb.gz', 'output_events.ndjson.gz']
+
+
+@pytest.fixture(params=files)
+def events_file(request, tmp_path):
+    # copy so that the sidecar is written to a temporary directory
+    path = tmp_path / request.param
+    shutil.copy(HERE / request.param, path)
+    return path
+
+
+def test_build_index(events_file):
+    sidecar = pathlib.Path(str(events_file) + EventIndex.INDEX_SUFFIX)
+
+    # the sidecar is only written on request
+    EventIndex.event_index(events_file)
+    assert not sidecar.exists()
+
+    index = EventIndex.event_index(events_file, interval=600, write=True)
+
+    assert index.ordered
+    assert index.time_range == (21510.0, 48419.0)
+    assert index.counts['entered link'] == 700
+    assert sum(index.counts.values()) == 3008
+    assert index.checkpoints[0][0] == 21000
+
+    # sidecar is reused
+    assert sidecar.exists()
+    assert EventIndex.event_index(events_file).to_dict() == index.to_dict()
+
+
+@pytest.mark.parametrize('index', [True, False])
+def test_event_window(events_file, index):
+    expected = [e for e in Events.event_reader(events_file) if 25000 <= float(e['time']) < 30000]
+    events = list(Events.event_reader(events_file, start=25000, end=30000, index=index))
+    assert pathlib.Path(str(events_file) + EventIndex.INDEX_SUFFIX).exists() == index
+
+    assert len(events) == len(expected) > 0
+    assert events == expected
+
+    events = list(Events.event_reader(events_file, types='actend', start=40000))
+    assert len(events) > 0
+    assert all(e['type'] == 'actend' and float(e['time']) >= 40000 for e in events)
+
+
+def test_outdated_index(tmp_path):
+    path = tmp_path / 'events.ndjson'
+    path.write_text('{"time":"1.0","type":"a"}\n{"time":"2.0","type":"b"}\n')
+
+    assert EventIndex.event_index(path).counts == {'a': 1, 'b': 1}
+
+    with open(path, 'a') as f:
+        f.write('{"time":"3000.0","type":"c"}\n')
+
+    index = EventIndex.event_index(path)
+    assert index.counts == {'a': 1, 'b': 1, 'c': 1}
+    assert [e['type'] for e in Events.event_reader(path, start=2000)] == ['c']
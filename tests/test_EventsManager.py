@@ -0,0 +1,84 @@
+import pathlib
+from collections import defaultdict
+
+import pytest
+
+from matsim.EventsManager import EventsManager
+
+HERE = pathlib.Path(__file__).parent
+
+files = ['output_events.xml.gz', 'output_events.pb.gz', 'output_events.ndjson.gz']
+
+
+class LinkCounter:
+    types = {'entered link'}
+
+    def __init__(self):
+        self.counts = defaultdict(int)
+        self.finished = False
+
+    def handle_event(self, event):
+        self.counts[event['link']] += 1
+
+    def finish(self):
+        self.finished = True
+
+
+class TypeHandlers:
+
+    def __init__(self):
+        self.departures = 0
+        self.arrivals = 0
+        self.handlers = {'departure': self.on_departure, 'arrival': self.on_arrival}
+
+    def on_departure(self, time, event):
+        self.departures += 1
+
+    def on_arrival(self, time, event):
+        self.arrivals += 1
+
+
+class BatchCounter:
+    columns = ['link']
+
+    def __init__(self):
+        self.n = 0
+        self.links = None
+
+    def handle_batch(self, batch):
+        self.n += len(batch)
+        self.links = batch.dictionaries['link']
+
+
+@pytest.mark.parametrize('filepath', files)
+def test_events_manager(filepath):
+    links = LinkCounter()
+    typed = TypeHandlers()
+    batches = BatchCounter()
+    actend = []
+
+    manager = EventsManager()
+    manager.add_handler(links)
+    manager.add_handler(typed)
+    manager.add_handler(actend.append, types='actend')
+    manager.add_batch_handler(batches, types=['left link', 'entered link'])
+
+    assert manager.types() == {'entered link', 'departure', 'arrival', 'actend', 'left link'}
+
+    n = manager.run(HERE / filepath, batch_size=100)
+
+    assert n == 700 + 700 + 201 * 3
+    assert sum(links.counts.values()) == 700
+    assert links.finished
+    assert typed.departures == 201 and typed.arrivals == 201
+    assert len(actend) == 201
+    assert batches.n == 1400
+
+
+def test_batches_only():
+    batches = BatchCounter()
+    manager = EventsManager().add_batch_handler(batches)
+
+    assert manager.run(HERE / 'output_events.xml.gz') == 3008
+    assert batches.n == 3008
+    assert len(batches.links) == 9
@@ -0,0 +1,60 @@
+import pathlib
+
+import pytest
+
+from matsim import Events
+from matsim.writers import EventsWriter
+
+HERE = pathlib.Path(__file__).parent
+
+files = ['output_events.xml.gz', 'output_events.pb.gz', 'output_events.ndjson.gz']
+
+
+def _normalize(events):
+    # formats differ in whether time and numeric attributes are stored as numbers or strings,
+    # protobuf events have empty strings for attributes that were not set
+    return [{k: str(float(v)) if k in ('time', 'relativePosition') else str(v) for k, v in e.items() if v != ''}
+            for e in events]
+
+
+@pytest.mark.parametrize('source', files)
+@pytest.mark.parametrize('fmt', ['xml.gz', 'pb.gz', 'ndjson'])
+@pytest.mark.parametrize('background', [True, False])
+def test_events_writer(tmp_path, source, fmt, background):
+    events = list(Events.event_reader(HERE / source))
+    filepath = tmp_path / ('events.' + fmt)
+
+    with EventsWriter(filepath, batch_size=128, background=background) as writer:
+        writer.write_events(events)
+
+    assert _normalize(Events.event_reader(filepath)) == _normalize(events)
+
+
+@pytest.mark.parametrize('fmt', ['xml', 'pb', 'ndjson'])
+def test_events_writer_batches(tmp_path, fmt):
+    source = HERE / 'output_events.xml.gz'
+    filepath = tmp_path / ('events.' + fmt)
+
+    with EventsWriter(filepath) as writer:
+        for batch in Events.event_reader_batches(source, types='entered link,actend', batch_size=100):
+            writer.write_batch(batch)
+
+    expected = [{k: e[k] for k in ('time', 'type', 'link', 'person', 'vehicle') if k in e}
+                for e in Events.event_reader(source, types='entered link,actend')]
+
+    assert _normalize(Events.event_reader(filepath)) == _normalize(expected)
+
+
+def test_events_writer_special(tmp_path):
+    events = [{'time': 1.0, 'type': 'custom & "special"', 'person': '<1>', 'x': 1.5, 'y': 2.0, 'value': 'ä'},
+              {'time': 2.0, 'type': 'entered link', 'link': '1', 'vehicle': '2', 'extra': 'attr'}]
+
+    for fmt in ('xml', 'pb', 'ndjson'):
+        filepath = tmp_path / ('events.' + fmt)
+        with EventsWriter(filepath) as writer:
+            writer.write_events(events)
+
+        assert _normalize(Events.event_reader(filepath)) == _normalize(events)
+
+    with pytest.raises(ValueError):
+        EventsWriter(tmp_path / 'events.csv')
@@ -1,5 +1,8 @@
 import pytest
+import gzip
 import pathlib
+import numpy as np
+import pandas as pd
 
 from collections import defaultdict
 
@@ -66,3 +69,178 @@ def test_non_existent():
         events = Events.event_reader("not existing.xml")
         for _ in events:
             pass
+
+
+@pytest.mark.parametrize('filepath', files)
+def test_event_reader_batches(filepath):
+    batches = list(Events.event_reader_batches(HERE / filepath, batch_size=1000))
+
+    assert [len(b) for b in batches] == [1000, 1000, 1000, 8]
+    assert batches[0].time.dtype == np.float64
+    assert batches[0]['link'].dtype == np.int32
+
+    # codes are stable across batches
+    links = batches[-1].dictionaries['link']
+    assert all(b.dictionaries['link'] is links for b in batches)
+
+    df = pd.concat([b.to_pandas() for b in batches])
+    counts = df.type.value_counts()
+    assert counts['actend'] == 201
+    assert counts['entered link'] == 700
+
+    entered = df[df.type == 'entered link']
+    assert entered.link.notna().all()
+    assert entered.person.isna().all()
+
+
+def test_dictionary():
+    d = Events.Dictionary()
+    codes = np.array([d.encode(v) for v in ['a', 'b', None, 'a']])
+    assert d.decode(codes).tolist() == ['a', 'b', None, 'a']
+
+    categories = d.categories()
+    assert d.categories() is categories
+
+    # decoded values grow with the dictionary
+    for i in range(100):
+        d.encode(str(i))
+    assert d.decode(np.array([101, 0, -1])).tolist() == ['99', 'a', None]
+    assert list(d.categories()) == ['a', 'b'] + [str(i) for i in range(100)]
+    assert list(categories) == ['a', 'b']
+
+
+@pytest.mark.parametrize('filepath', files)
+def test_event_reader_batches_filter(filepath):
+    batches = Events.event_reader_batches(HERE / filepath, types='departure', columns=['person', 'legMode'])
+
+    df = pd.concat([b.to_pandas() for b in batches])
+    assert list(df.columns) == ['time', 'type', 'person', 'legMode']
+    assert len(df) == 201
+    assert (df.legMode == 'car').all()
+
+
+def test_pb_event_dispatch():
+    count = defaultdict(int)
+
+    def on_link_enter(time, ev):
+        count[ev.linkId.id] += 1
+
+    def on_departure(time, ev):
+        assert ev['legMode'] == 'car'
+        count['departure'] += 1
+
+    n = Events.pb_event_dispatch(HERE / 'output_events.pb.gz', {'linkEnter': on_link_enter})
+    assert n == 700
+    assert sum(count.values()) == 700
+
+    n = Events.pb_event_dispatch(HERE / 'output_events.pb.gz', {'departure': on_departure}, raw=False)
+    assert n == 201
+    assert count['departure'] == 201
+
+    with pytest.raises(ValueError):
+        Events.pb_event_dispatch(HERE / 'output_events.pb.gz', {'unknown': on_departure})
+
+
+def test_pb_conversion_matches_xml():
+    xml = Events.event_reader(HERE / 'output_events.xml.gz')
+    pb = Events.event_reader(HERE / 'output_events.pb.gz')
+
+    for x, p in zip(xml, pb):
+        assert x['type'] == p['type']
+        assert x['time'] == p['time']
+        for k in ('link', 'person', 'vehicle', 'actType', 'legMode', 'networkMode'):
+            assert x.get(k) == p.get(k)
+
+
+@pytest.mark.parametrize('compressed', [True, False])
+def test_event_reader_parallel(tmp_path, compressed):
+    filepath = HERE / 'output_events.xml.gz'
+    if not compressed:
+        filepath = tmp_path / 'output_events.xml'
+        with gzip.open(HERE / 'output_events.xml.gz') as f:
+            filepath.write_bytes(f.read())
+
+    expected = list(Events.event_reader(filepath))
+
+    # small chunks to test the splitting
+    events = list(Events._event_reader_xml_parallel(str(filepath), None, 2, chunk_size=2000))
+    assert events == expected
+
+    events = list(Events.event_reader(filepath, types='actend', workers=2))
+    assert events == [e for e in expected if e['type'] == 'actend']
+
+    counts = Events.event_partitions(filepath, len, types='left link', workers=2, chunk_size=2000)
+    assert sum(counts) == 700
+
+
+def test_event_prefilter_xml(tmp_path):
+    filepath = tmp_path / 'events.xml'
+    filepath.write_text('<?xml version="1.0" encoding="utf-8"?>\n<events version="1.0">\n'
+                        '\t<event time="1.0" type="actend" person="1" actType="h"  />\n'
+                        '\t<event time="2.0" type="other" subtype="actend" person="2"  />\n'
+                        '\t<event time="3.0"\n\t\ttype="a &amp; b" person="3"  />\n'
+                        '\t<event time="4.0" type="actend" person="4 &lt;5&gt;"  />\n'
+                        '</events>\n')
+
+    expected = [e for e in Events._event_reader_xml(str(filepath)) if e['type'] in ('actend', 'a & b')]
+    events = list(Events.event_reader(filepath, types=['actend', 'a & b']))
+
+    assert events == expected
+    assert [e['person'] for e in events] == ['1', '3', '4 <5>']
+
+
+@pytest.mark.parametrize('filepath', files)
+def test_event_prefilter(filepath):
+    types = {'actend', 'entered link'}
+    expected = [e for e in Events.event_reader(HERE / filepath) if e['type'] in types]
+
+    assert list(Events.event_reader(HERE / filepath, types=types)) == expected
+
+
+@pytest.mark.parametrize('orjson', [True, False])
+def test_event_reader_json_blocks(tmp_path, monkeypatch, orjson):
+    if not orjson:
+        import json
+        monkeypatch.setattr(Events, '_json_decoder', lambda: json.loads)
+
+    filepath = tmp_path / 'events.ndjson'
+    filepath.write_text('{"time":"1.0","type":"actend","person":"1"}\r\n'
+                        '\n'
+                        '{"time":"2.0","type":"left link","link":"1\\n2","vehicle":"1"}\n'
+                        '{"time":"3.0","type":"actend","person":"\\u00e4"}')
+
+    events = list(Events.event_reader(filepath))
+    assert [e['time'] for e in events] == ['1.0', '2.0', '3.0']
+    assert events[1]['link'] == '1\n2'
+
+    events = list(Events.event_reader(filepath, types='actend'))
+    assert [e['person'] for e in events] == ['1', 'ä']
+
+    monkeypatch.setattr(Events, 'FILTER_CHUNK_SIZE', 16)
+    assert [e['time'] for e in Events.event_reader(filepath)] == ['1.0', '2.0', '3.0']
+
+
+@pytest.mark.parametrize('filepath', files)
+@pytest.mark.parametrize('types', [None, 'entered link,actend,departure'])
+def test_event_reader_area(filepath, types):
+    from matsim import Network
+
+    network = Network.read_network(HERE / 'test_network.xml.gz')
+    area = [(-5000, 0), (5000, 0), (5000, 7000), (-5000, 7000)]
+    links = network.links_in_area(area)
+    assert 0 < len(links) < len(network.links)
+
+    # events without a link are kept
+    expected = [e for e in Events.event_reader(HERE / filepath, types=types) if 'link' not in e or e['link'] in links]
+
+    events = list(Events.event_reader(HERE / filepath, types=types, area=area, network=network))
+    assert events == expected
+    assert list(Events.event_reader(HERE / filepath, types=types, area=links)) == expected
+
+    # without index, nothing is written next to the fixtures
+    window = list(Events.event_reader(HERE / filepath, types=types, area=area, network=network, start=0, end=1e6,
+                                      index=False))
+    assert window == expected
+
+    with pytest.raises(ValueError):
+        next(Events.event_reader(HERE / filepath, area=area))
@@ -1,8 +1,13 @@
+import os
+import shutil
+import tempfile
+
 import pandas as pd
 from pandas.testing import assert_frame_equal
 from unittest import TestCase
 
 import matsim.Network
+from matsim.NetworkCache import NetworkCache
 
 
 class TestNetworkHandler(TestCase):
@@ -55,3 +60,86 @@ class TestNetworkHandler(TestCase):
 
         assert_frame_equal(node_attrs, pd.DataFrame(data=expected_node_attrs, columns=['node_id', 'name', 'value']))
         assert_frame_equal(link_attrs, pd.DataFrame(data=expected_link_attrs, columns=['link_id', 'name', 'value']))
+
+
+    def test_links_in_area(self):
+        network = matsim.Network.read_network('tests/test_network.xml.gz')
+
+        bbox = (-5001, -1, 5001, 7000)
+        square = [(-5001, -1), (5001, -1), (5001, 7000), (-5001, 7000)]
+        self.assertEqual(network.links_in_area(bbox), network.links_in_area(square))
+
+        inside = network.nodes_in_area(bbox)
+        self.assertEqual({'3', '4', '5', '6', '7', '12', '13'}, set(network.nodes.node_id[inside]))
+
+        # links with both nodes inside
+        links = network.links.set_index('link_id')
+        for link in network.links_in_area(bbox, how='all'):
+            self.assertTrue(inside[network.nodes.node_id == links.from_node[link]].all())
+            self.assertTrue(inside[network.nodes.node_id == links.to_node[link]].all())
+
+        # polygon with a hole around node 12, evaluated by the even-odd rule
+        hole = [(-100, -100), (100, -100), (100, 100), (-100, 100)]
+        points = matsim.Network.points_in_area([0, 0, -4000], [0, 200, 2000], square)
+        self.assertEqual([True, True, True], points.tolist())
+
+        try:
+            from shapely.geometry import Polygon
+        except ImportError:
+            return
+
+        polygon = Polygon(square, [hole])
+        self.assertEqual({'3', '4', '5', '6', '7', '13'}, set(network.nodes.node_id[network.nodes_in_area(polygon)]))
+
+        with self.assertRaises(ValueError):
+            network.links_in_area(bbox, how='none')
+
+    def test_cache(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+
+        path = os.path.join(tmp, 'network.xml.gz')
+        shutil.copy('tests/test_network_attrs.xml.gz', path)
+        cache = NetworkCache(os.path.join(tmp, 'cache'), max_entries=2)
+
+        expected = matsim.Network.read_network(path)
+        self.assertIsNone(cache.load(path))
+        matsim.Network.read_network(path, cache=cache)
+
+        network = cache.load(path)
+        self.assertIsNotNone(network)
+        for name in ('nodes', 'links', 'node_attrs', 'link_attrs'):
+            assert_frame_equal(getattr(expected, name), getattr(network, name))
+        self.assertEqual(expected.network_attrs, network.network_attrs)
+
+        # a new modification time alone does not invalidate the entry, as the content is the same
+        os.utime(path, (0, 0))
+        self.assertIsNotNone(cache.load(path))
+
+        # other content
+        shutil.copy('tests/test_network.xml.gz', path)
+        self.assertIsNone(cache.load(path))
+        self.assertEqual(23, len(matsim.Network.read_network(path, cache=cache).links))
+        self.assertEqual(23, len(cache.load(path).links))
+
+        # mixed attribute types are restored as python values
+        cache.store(path, matsim.Network.Network(expected.nodes, expected.links, expected.node_attrs,
+                                                 pd.DataFrame({'link_id': ['1', '2', '3'], 'name': ['a', 'b', 'c'],
+                                                               'value': ['x', 3, 2.5], 'value#kind': [1, 2, 3]})),
+                    skip_attributes=True)
+        link_attrs = cache.load(path, skip_attributes=True).link_attrs
+        self.assertEqual(['x', 3, 2.5], link_attrs.value.tolist())
+        # columns with names like the internal ones are kept
+        self.assertEqual(['link_id', 'name', 'value', 'value#kind'], list(link_attrs.columns))
+        self.assertEqual([1, 2, 3], link_attrs['value#kind'].tolist())
+
+        # least recently used entries are evicted
+        self.assertEqual(2, len(cache.entries()))
+        other = os.path.join(tmp, 'other.xml.gz')
+        shutil.copy(path, other)
+        matsim.Network.read_network(other, cache=cache)
+        self.assertEqual(2, len(cache.entries()))
+        self.assertIsNotNone(cache.load(other))
+
+        cache.clear()
+        self.assertEqual([], cache.entries())
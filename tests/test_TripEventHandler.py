@@ -0,0 +1,104 @@
+import pathlib
+
+import pytest
+
+from matsim import Events
+from matsim.EventsManager import EventsManager
+from matsim.TripEventHandler import TripEventHandler, default_main_mode
+
+HERE = pathlib.Path(__file__).parent
+
+files = ['output_events.xml.gz', 'output_events.pb.gz', 'output_events.ndjson.gz']
+
+
+@pytest.mark.parametrize('filepath', files)
+def test_trips(filepath):
+    handler = TripEventHandler(default_main_mode, person_filter=None)
+    EventsManager().add_handler(handler).run(HERE / filepath)
+
+    trips = handler.trips()
+    legs = handler.legs()
+
+    assert len(trips) == 201
+    assert len(legs) == 201
+    assert len(handler.persons) == 0
+
+    assert (trips.main_mode == 'car').all()
+    assert (trips.trav_time >= 0).all()
+    assert set(trips.start_activity_type) == {'h', 'w'}
+
+    t = trips[trips.trip_id == '3_1'].iloc[0]
+    assert t.dep_time == 21510
+    assert t.trav_time == 900
+    assert t.start_link == '1' and t.end_link == '20'
+    assert t.end_activity_type == 'w'
+
+    # car legs have no distance without network
+    assert (trips.traveled_distance == 0).all()
+
+
+@pytest.mark.parametrize('filepath', files)
+def test_network_distance(filepath):
+    from matsim.Network import read_network
+
+    network = read_network(HERE / 'test_network.xml.gz')
+    handler = TripEventHandler(network=network)
+    EventsManager().add_handler(handler).run(HERE / filepath)
+
+    trips = handler.trips().set_index('trip_id')
+    lengths = network.links.set_index('link_id').length
+
+    # sum of the links entered by the vehicle of each person
+    vehicles = {}
+    expected = {}
+    counts = {}
+    for e in Events.event_reader(HERE / filepath):
+        if e['type'] == 'actend' and e['actType'] in ('h', 'w'):
+            counts[e['person']] = counts.get(e['person'], 0) + 1
+            expected['%s_%d' % (e['person'], counts[e['person']])] = 0
+        elif e['type'] == 'PersonEntersVehicle':
+            vehicles[e['vehicle']] = e['person']
+        elif e['type'] == 'PersonLeavesVehicle':
+            vehicles.pop(e['vehicle'])
+        elif e['type'] == 'entered link' and e['vehicle'] in vehicles:
+            person = vehicles[e['vehicle']]
+            expected['%s_%d' % (person, counts[person])] += lengths[e['link']]
+
+    # only trips starting and ending on the same link have no distance
+    assert ((trips.traveled_distance > 0) | (trips.start_link == trips.end_link)).all()
+    assert trips.traveled_distance.to_dict() == pytest.approx({t: expected[t] for t in trips.index})
+    assert not handler.vehicles
+
+
+def test_stuck_in_vehicle():
+    handler = TripEventHandler(network={'1': 100.0, '2': 200.0})
+    for type, attrs in [('actend', {'person': 'p', 'actType': 'h', 'link': '1'}),
+                        ('departure', {'person': 'p', 'legMode': 'car', 'link': '1'}),
+                        ('PersonEntersVehicle', {'person': 'p', 'vehicle': 'v'}),
+                        ('stuck', {'person': 'p', 'link': '1'}),
+                        ('entered link', {'vehicle': 'v', 'link': '2'})]:
+        handler.on_event(0, type, attrs)
+
+    assert handler.stuck == {'p'}
+    assert not handler.persons
+    assert not handler.vehicles
+
+
+def test_batches_and_filter():
+    batches = []
+    handler = TripEventHandler(lambda modes: modes[0], lambda p: p in {'1', '2', '3'},
+                               batch_size=2, trip_sink=batches.append)
+
+    EventsManager().add_handler(handler).run(HERE / 'output_events.xml.gz')
+
+    expected = sum(1 for e in Events.event_reader(HERE / 'output_events.xml.gz', types='actstart')
+                   if e['person'] in {'1', '2', '3'})
+
+    assert sum(len(b) for b in batches) == expected
+    assert all(len(b) <= 2 for b in batches)
+    assert handler.trips().empty
+
+
+def test_main_mode():
+    assert default_main_mode(['walk', 'pt', 'walk']) == 'pt'
+    assert default_main_mode(['walk']) == 'walk'
@@ -0,0 +1,54 @@
+import pathlib
+
+import pytest
+
+from matsim.cli import events_convert
+
+pa = pytest.importorskip("pyarrow")
+ds = pytest.importorskip("pyarrow.dataset")
+
+HERE = pathlib.Path(__file__).parent
+
+
+def _read(path):
+    return ds.dataset(path, partitioning='hive').to_table().to_pandas()
+
+
+@pytest.mark.parametrize('filepath', ['output_events.xml.gz', 'output_events.pb.gz'])
+def test_convert(tmp_path, filepath):
+    n = events_convert.convert(str(HERE / filepath), str(tmp_path), buffer_rows=1000)
+    assert n == 3008
+
+    df = _read(tmp_path)
+    assert len(df) == 3008
+    assert (df.type == 'entered link').sum() == 700
+    assert (df.hour == (df.time // 3600)).all()
+    assert df[df.type == 'entered link'].link.notna().all()
+
+    table = ds.dataset(tmp_path, partitioning='hive').to_table(columns=['person'])
+    assert pa.types.is_dictionary(table.schema.field('person').type)
+
+
+def test_resume(tmp_path, monkeypatch):
+    store = events_convert._store_progress
+    calls = []
+
+    def interrupt(output, progress):
+        store(output, progress)
+        calls.append(progress['events'])
+        if len(calls) == 2:
+            # simulate a file written after the last checkpoint
+            (tmp_path / 'type=actend' / 'hour=5' / 'part-00099.parquet').write_bytes(b'broken')
+            raise KeyboardInterrupt()
+
+    monkeypatch.setattr(events_convert, '_store_progress', interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        events_convert.convert(str(HERE / 'output_events.xml.gz'), str(tmp_path), buffer_rows=1000)
+
+    monkeypatch.setattr(events_convert, '_store_progress', store)
+    n = events_convert.convert(str(HERE / 'output_events.xml.gz'), str(tmp_path), buffer_rows=1000, resume=True)
+    assert n == 3008
+
+    df = _read(tmp_path)
+    assert len(df) == 3008
+    assert not df.duplicated().any()
@@ -0,0 +1,72 @@
+import pathlib
+
+import pytest
+
+from matsim import Events
+from matsim.analysis.utils import HyperLogLog
+from matsim.cli import events_stats
+from matsim.writers import EventsWriter
+
+HERE = pathlib.Path(__file__).parent
+
+files = ['output_events.xml.gz', 'output_events.pb.gz', 'output_events.ndjson.gz']
+
+
+def _expected(filepath):
+    events = list(Events.event_reader(filepath))
+    types = {}
+    for e in events:
+        types[e['type']] = types.get(e['type'], 0) + 1
+
+    return {
+        'events': len(events), 'types': types,
+        'time_range': [min(float(e['time']) for e in events), max(float(e['time']) for e in events)],
+        'distinct': {a: len({e[a] for e in events if a in e}) for a in events_stats.DISTINCT}
+    }
+
+
+@pytest.mark.parametrize('filepath', files)
+@pytest.mark.parametrize('workers', [1, 2])
+def test_event_stats(filepath, workers):
+    stats = events_stats.event_stats(HERE / filepath, workers=workers, chunk_size=10000)
+    assert stats == _expected(HERE / filepath)
+
+
+@pytest.mark.parametrize('filepath', files)
+def test_event_stats_io_options(filepath):
+    stats = events_stats.event_stats(HERE / filepath, workers=1, io_options={'background': True})
+    assert stats == _expected(HERE / filepath)
+
+    with pytest.raises(ValueError):
+        events_stats.event_stats(HERE / filepath, workers=1, io_options={'compression': 'gz'})
+
+
+@pytest.mark.parametrize('fmt', ['xml', 'ndjson'])
+def test_event_stats_layout(tmp_path, fmt):
+    """ Files that are not written by MATSim, with a different attribute order """
+    events = [{'type': 'a & b', 'time': 1.0, 'person': 'p1'}, {'link': 'l"1', 'type': 'x', 'time': 5.5},
+              {'type': 'x', 'time': 3.0, 'person': 'p2', 'vehicle': 'v'}]
+
+    filepath = tmp_path / ('events.' + fmt)
+    with EventsWriter(filepath) as writer:
+        writer.write_events(events)
+
+    # reorder the attributes
+    filepath.write_text(filepath.read_text().replace('time="1.0" type="a &amp; b"', 'type="a &amp; b" time="1.0"')
+                        .replace('{"time":"1.0","type":"a & b"', '{"type":"a & b","time":"1.0"'))
+
+    stats = events_stats.event_stats(filepath, workers=1)
+    assert stats == _expected(filepath)
+
+
+def test_hyperloglog():
+    h = HyperLogLog(12)
+    h.update(str(i) for i in range(50000))
+    assert abs(len(h) - 50000) < 50000 * 0.05
+
+    other = HyperLogLog(12)
+    other.update(str(i).encode() for i in range(25000, 100000))
+    assert abs(len(h.merge(other)) - 100000) < 100000 * 0.05
+
+    with pytest.raises(ValueError):
+        h.merge(HyperLogLog(10))
@@ -0,0 +1,155 @@
+import io
+import pathlib
+
+import pytest
+
+from matsim import utils
+from matsim.pb.Events_pb2 import EventBatch
+
+HERE = pathlib.Path(__file__).parent
+
+
+def _batches(n):
+    for i in range(n):
+        batch = EventBatch()
+        for j in range(i % 50):
+            ev = batch.events.add()
+            ev.time = i * 100 + j
+            ev.linkEnter.linkId.id = "link_%d" % j
+        yield batch
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 64, 1 << 20])
+@pytest.mark.parametrize('background', [False, True])
+def test_read_frames(chunk_size, background):
+    buf = io.BytesIO()
+    utils.write_delimited(_batches(200), buf.write)
+    buf.seek(0)
+
+    frames = list(utils.read_frames(buf, chunk_size, background))
+    assert len(frames) == 200
+
+    for frame, expected in zip(frames, _batches(200)):
+        batch = EventBatch()
+        batch.ParseFromString(frame)
+        assert batch == expected
+
+
+def test_read_frames_truncated():
+    buf = io.BytesIO()
+    utils.write_delimited(_batches(10), buf.write)
+
+    with pytest.raises(RuntimeError):
+        list(utils.read_frames(io.BytesIO(buf.getvalue()[:-1])))
+
+
+@pytest.mark.parametrize('background', [False, True])
+def test_read_pb(background):
+    events = list(utils.read_pb(HERE / 'output_events.pb.gz', chunk_size=128, background=background))
+    assert len(events) == 3008
+
+
+@pytest.mark.parametrize('options', [None, {'background': True}, {'background': True, 'chunk_size': 7, 'max_chunks': 1},
+                                     {'threads': None}])
+def test_open_file(options):
+    import gzip
+
+    expected = gzip.decompress((HERE / 'output_events.xml.gz').read_bytes())
+
+    with utils.open_file(HERE / 'output_events.xml.gz', options) as f:
+        data = b''.join(iter(lambda: f.read(1000), b''))
+
+    assert data == expected
+
+
+def test_open_file_unknown_option():
+    with pytest.raises(ValueError):
+        utils.open_file(HERE / 'output_events.xml.gz', {'compression': 'gz'})
+
+
+def test_events_format():
+    assert utils.events_format(HERE / 'output_events.xml.gz') == 'xml'
+    assert utils.events_format('output_events.pb') == 'pb'
+    assert utils.events_format('output_events.ndjson.gz') == 'ndjson'
+
+    with pytest.raises(ValueError):
+        utils.events_format('output_events.csv')
+
+
+def test_bounded_map():
+    from concurrent.futures import ThreadPoolExecutor
+
+    submitted = []
+
+    def tasks():
+        for i in range(20):
+            submitted.append(i)
+            yield i, (i, 2)
+
+    results = []
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        for key, result in utils.bounded_map(pool, pow, tasks(), 2):
+            # tasks are only submitted as results are consumed
+            assert len(submitted) - len(results) <= 5
+            results.append((key, result))
+
+    assert sorted(results) == [(i, i ** 2) for i in range(20)]
+
+
+def test_readers_io_options():
+    from matsim import Events, Network
+
+    options = {'background': True}
+    for f in ('output_events.xml.gz', 'output_events.pb.gz', 'output_events.ndjson.gz'):
+        assert list(Events.event_reader(HERE / f, io_options=options)) == list(Events.event_reader(HERE / f))
+
+    net = Network.read_network(HERE / 'test_network.xml.gz', io_options=options)
+    assert len(net.links) > 0
+
+
+def _closes(gen, timeout=10):
+    """ Whether closing a generator returns within the timeout """
+    import threading
+
+    t = threading.Thread(target=gen.close, daemon=True)
+    t.start()
+    t.join(timeout)
+    return not t.is_alive()
+
+
+def test_read_chunks_background_close():
+    # the reader finishes while the queue is full, and has to give up handing over the end of the stream
+    chunks = utils._read_chunks_background(io.BytesIO(b'x' * 20), 10, max_chunks=1)
+    assert next(chunks) == b'x' * 10
+
+    import time
+    time.sleep(0.2)
+    assert _closes(chunks)
+
+
+@pytest.mark.parametrize('f', ['output_events.xml.gz', 'output_events.ndjson.gz'])
+def test_event_reader_close(f):
+    import gzip
+    import time
+    from matsim import Events
+
+    # two chunks, so that the whole file is read while the consumer is still at the first event
+    size = len(gzip.decompress((HERE / f).read_bytes()))
+    options = {'background': True, 'chunk_size': size // 2 + 1, 'max_chunks': 1}
+
+    events = Events.event_reader(HERE / f, io_options=options)
+    next(events)
+    time.sleep(0.2)
+    assert _closes(events)
+
+
+def test_plan_reader_close():
+    import threading
+    from matsim import Plans
+
+    plans = Plans.plan_reader(HERE / 'plans_full.xml.gz', io_options={'background': True})
+    next(plans)
+    plans.close()
+
+    # closing the generator closes the file and stops its reader thread
+    assert not any(t.name == 'matsim-reader' for t in threading.enumerate())